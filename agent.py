@@ -3,14 +3,25 @@
 SceneCraftエージェントのコアロジックを実装するモジュール
 論文の Figure 2, 3 に示されたワークフロー全体を統括する。
 """
-from typing import List, Dict, Any
-import inspect
+from typing import List, Dict, Any, Optional
 from collections import Counter # Counterをインポート
+from concurrent.futures import ThreadPoolExecutor
 
-from modules import asset_retriever, decomposer, planner, coder, reviewer
+from modules import asset_retriever, decomposer, planner, coder, reviewer, fused_planner
 from utils.llm_utils import call_llm, extract_python_code
-from utils.config import LEARNER_MODEL
-from library import spatial_skill_library
+from utils.config import (LEARNER_MODEL, SOLVER_SEED, SOLVER_MAX_ITER, SOLVER_WARM_START_MAX_ITER, SOLVER_WARM_START_PATIENCE,
+                          SOLVER_MAX_CLUSTER_SIZE, SOLVER_WORKERS, PROGRESSIVE_COMPOSITION, CAMERA_SOLVER_ENABLED, CAMERA_LLM_HINTS,
+                          FUSED_PLANNING, HISTORY_STORE_ENABLED, LEARNING_MAX_SKILLS_PER_RUN, LEARNING_MAX_PARALLEL,
+                          LEARNING_MIN_NEW_FIXES, LEARNING_FEEDBACK_EXAMPLES)
+from library import spatial_skill_library, layout_store, history_store, solver, camera_solver
+from library.layout import Layout
+from utils.checkpoint import StageCheckpoint, NullCheckpoint
+
+def _encode_layout(layout: Dict[str, Layout]) -> Dict[str, Dict]:
+    return {name: l.to_dict() for name, l in layout.items()}
+
+def _decode_layout(data: Dict[str, Dict]) -> Dict[str, Layout]:
+    return {name: Layout.from_dict(d) for name, d in data.items()}
 
 class SceneCraftAgent:
     def __init__(self):
@@ -44,81 +55,149 @@ class SceneCraftAgent:
             print("    [Warning] カメラ設定の予測に失敗しました。デフォルト設定を使用します。")
             return {"location": [15, -20, 15], "look_at": "center"}
 
-    def run_inner_loop(self, user_query: str) -> Dict[str, Any]:
-        # Step 1: Asset Retrieval
-        assets_info = asset_retriever.retrieve_assets(user_query)
-        
-        # Step 2: Scene Decomposition
-        asset_list = list(assets_info.keys())
-        sub_scenes = decomposer.decompose_query(user_query, asset_list)
+    def _solve_sub_scene(self, scene_graph: Dict, asset_list: List[str], frozen_layout: Dict[str, Layout]) -> Dict[str, Layout]:
+        """
+        サブシーンのレイアウトを解く。
+        frozen_layout (前のステップまでに解いたアセット) があれば、その配置は固定して新しいアセットだけを動かし、
+        新しいアセットが関与する関係だけで評価する。
+        """
+        if not frozen_layout:
+            return layout_store.solve_with_store(scene_graph, asset_list, seed=SOLVER_SEED, max_iter=SOLVER_MAX_ITER,
+                                                 warm_max_iter=SOLVER_WARM_START_MAX_ITER, warm_patience=SOLVER_WARM_START_PATIENCE)
+        # 固定したアセットの配置はステップごとに異なるため、構造だけをキーにするレイアウトストアは使わない
+        return solver.solve_scene_graph(scene_graph, asset_list, seed=SOLVER_SEED, max_iter=SOLVER_MAX_ITER, previous_layout=frozen_layout,
+                                        max_cluster_size=SOLVER_MAX_CLUSTER_SIZE, workers=SOLVER_WORKERS)
+
+    def run_inner_loop(self, user_query: str, checkpoint: Optional[StageCheckpoint] = None,
+                       progressive: bool = PROGRESSIVE_COMPOSITION) -> Dict[str, Any]:
+        """
+        アセット選定からBlenderに渡すペイロードの作成までを実行する。
+        checkpoint を渡すと各ステージの結果を保存し、保存済みのステージはLLMを呼ばずに再利用する。
+        progressive なら、各ステップは前のステップまでのアセットとその配置を引き継ぎ、追加されたアセットだけを解く。
+        FUSED_PLANNING なら、Step 1-3 (とカメラのヒント) を1回の問い合わせでまとめて計画し、不正な項目だけを個別に問い合わせる。
+        """
+        checkpoint = checkpoint or NullCheckpoint()
+        needs_camera_hint = not CAMERA_SOLVER_ENABLED or CAMERA_LLM_HINTS
+        camera_hint = None
+
+        if FUSED_PLANNING:
+            plan = checkpoint.stage("fused_plan", lambda: fused_planner.plan_query(user_query, progressive, include_camera=needs_camera_hint))
+            assets_info, sub_scenes, camera_hint = plan["assets"], plan["sub_scenes"], plan["camera"]
+            asset_list = list(assets_info.keys())
+        else:
+            # Step 1: Asset Retrieval
+            assets_info = checkpoint.stage("assets", lambda: asset_retriever.retrieve_assets(user_query))
 
-        # 【追加】LLMによるカメラワークの決定
-        camera_settings = self.predict_camera_work(user_query, asset_list)
+            # Step 2: Scene Decomposition
+            asset_list = list(assets_info.keys())
+            sub_scenes = checkpoint.stage("decomposition", lambda: decomposer.decompose_query(user_query, asset_list))
+
+        # カメラはレイアウトを解いた後にサブシーンごとに計算する。LLMの提案は設定で有効にした場合のみ、ヒントとして使う
+        if needs_camera_hint and camera_hint is None:
+            camera_hint = checkpoint.stage("camera", lambda: self.predict_camera_work(user_query, asset_list))
         
         processed_sub_scenes = []
+        frozen_layout: Dict[str, Layout] = {} # 前のステップまでに解いたアセットの配置
+        frozen_relations: List[Dict] = [] # 前のステップまでのシーングラフの関係
         for i, sub_scene in enumerate(sub_scenes):
             print(f"\n>>> サブシーン {i+1}/{len(sub_scenes)}: '{sub_scene['title']}' の処理を開始")
-            
-            scene_graph = planner.plan_scene_graph(sub_scene['description'], sub_scene['asset_list'])
 
-            assets_for_coder = {name: assets_info[name] for name in sub_scene['asset_list']}
+            new_assets = [name for name in sub_scene['asset_list'] if name not in frozen_layout]
+            asset_list = list(frozen_layout) + new_assets
+            if frozen_layout:
+                print(f"  [Composer] 前のステップの{len(frozen_layout)}アセットを固定し、追加された{len(new_assets)}アセットだけを配置します。")
+
+            def plan() -> Dict:
+                # 一括計画で正しいシーングラフが得られたステップは、planner に問い合わせない
+                planned_relations = sub_scene.get('relations')
+                if not frozen_layout:
+                    if planned_relations is not None:
+                        return {"relations": planned_relations}
+                    return planner.plan_scene_graph(sub_scene['description'], sub_scene['asset_list'])
+                if planned_relations is None:
+                    step_graph = planner.plan_scene_graph(sub_scene['description'], new_assets, context_assets=list(frozen_layout))
+                    planned_relations = step_graph.get("relations", [])
+                return {"relations": frozen_relations + planned_relations}
+            scene_graph = checkpoint.stage(f"scene_graph_{i+1}", plan)
+
+            assets_for_coder = {name: assets_info[name] for name in asset_list}
             
+            # レイアウトはBlenderを起動する前にホスト側で解き、ペイロードには解いた結果を持たせる
+            layout = checkpoint.stage(f"layout_{i+1}", lambda: self._solve_sub_scene(scene_graph, asset_list, frozen_layout),
+                                      encode=_encode_layout, decode=_decode_layout)
+
+            camera_settings = camera_hint
+            if CAMERA_SOLVER_ENABLED:
+                camera_settings = camera_solver.solve_camera(layout, assets_for_coder, camera_hint)
+
             # 【変更】coderにカメラ設定も渡す
-            script = coder.generate_script_with_solver(scene_graph, assets_for_coder, camera_settings)
+            payload = checkpoint.stage(f"payload_{i+1}",
+                                       lambda: coder.build_scene_payload(scene_graph, assets_for_coder, camera_settings, presolved_layout=layout))
 
             processed_sub_scenes.append({
                 "title": sub_scene['title'],
-                "script": script,
+                "payload": payload,
                 "scene_graph": scene_graph,
-                "asset_list": sub_scene['asset_list'],
-                "assets_info": assets_for_coder
+                "asset_list": asset_list,
+                "frozen_assets": list(frozen_layout), # 自己改善ループでも動かさない
+                "assets_info": assets_for_coder,
+                "camera_settings": camera_settings,
+                "camera_hint": camera_hint,
+                "layout": layout
             })
+            if progressive:
+                frozen_layout = {name: l.copy() for name, l in layout.items()}
+                frozen_relations = scene_graph.get("relations", [])
         
         return {"query": user_query, "processed_sub_scenes": processed_sub_scenes}
 
-    def run_outer_loop(self, refinement_history: List[Dict]):
+    def _select_skills_to_improve(self, refinement_history: List[Dict]) -> List[Dict[str, Any]]:
         """
-        (Outer-Loop) 修正履歴から汎用的なスキルを学習し、ライブラリを更新する。
-        論文の Section 2.4 に対応。
+        学習対象のスキルと、その学習プロンプトに含めるレビューコメントを選ぶ。
+        履歴ストアが有効なら実行をまたいで集計した件数を使い、無効なら今回の refinement_history だけを集計する。
         """
-        print("\n--- [Outer-Loop] 🎓 スキルライブラリの自己進化 ---")
-        
-        if not refinement_history:
-            print("  [Info] 修正履歴がないため、スキル学習をスキップします。")
-            return
+        if HISTORY_STORE_ENABLED:
+            store = history_store.get_history_store()
+            pending = store.pending_skills("update_args", LEARNING_MIN_NEW_FIXES, LEARNING_MAX_SKILLS_PER_RUN)
+            return [
+                {"skill": p["skill"], "count": p["pending"], "feedback": store.recent_feedback(p["skill"], LEARNING_FEEDBACK_EXAMPLES)}
+                for p in pending if p["skill"] in spatial_skill_library.SKILLS
+            ]
 
-        # --- 【改善点】修正履歴から学習すべきスキルを動的に特定 ---
         # 修正されたリレーションのタイプを集計
         fixed_relation_types = []
+        feedback_by_type: Dict[str, List[str]] = {}
         for revision in refinement_history:
             # 'change' と 'action' の存在を確認
-            change_info = revision.get("change", {})
+            change_info = revision.get("change") or {}
             if change_info.get("action") == "update_args":
                 # 'target_relation' と 'type' の存在を確認
-                target_relation = revision.get("target_relation", {})
-                target_type = target_relation.get("type")
-                if target_type:
+                target_type = (revision.get("target_relation") or {}).get("type")
+                if target_type in spatial_skill_library.SKILLS:
                     fixed_relation_types.append(target_type)
-        
-        if not fixed_relation_types:
-            print("  [Info] 有効な修正履歴（update_argsアクション）がないため、スキル学習をスキップします。")
-            return
-
-        # 最も頻繁に修正されたスキルを学習対象とする
-        skill_to_improve = Counter(fixed_relation_types).most_common(1)[0][0]
-        
-        print(f"  🔥 最も頻繁に修正されたスキル '{skill_to_improve}' を学習対象として特定しました。")
+                    if revision.get("feedback"):
+                        feedback_by_type.setdefault(target_type, []).append(revision["feedback"])
+        return [
+            {"skill": skill, "count": count, "feedback": feedback_by_type.get(skill, [])[-LEARNING_FEEDBACK_EXAMPLES:]}
+            for skill, count in Counter(fixed_relation_types).most_common(LEARNING_MAX_SKILLS_PER_RUN)
+            if count >= LEARNING_MIN_NEW_FIXES
+        ]
 
+    def _learn_skill(self, skill_to_improve: str, feedback_examples: List[str]) -> str:
+        """1つのスキルについて、改善した関数のソースコードをLLMに生成させる。"""
         original_function_code = spatial_skill_library.get_skill_source(skill_to_improve)
         
         # 論文 Figure 4 の例を再現
-        improved_function_example = inspect.getsource(spatial_skill_library.SKILLS[skill_to_improve])
+        improved_function_example = original_function_code
+        feedback_str = "\n".join(f"        - {feedback}" for feedback in feedback_examples) or "        - (なし)"
         
         prompt = f"""
         あなたは、3Dシーン生成エージェントのスキルを進化させる役割を担っています。
         以下の関数は、シーン内のオブジェクトの '{skill_to_improve}' 関係を評価するものですが、これまでの利用でいくつかの問題点が発見されました。
 
         - **改善の方向性**: これまでのシーン生成過程で、このスキルは何度も修正が必要でした。より堅牢で汎用的な関数へと進化させる必要があります。
+        - **レビューで指摘された問題の例**:
+{feedback_str}
 
         この学習結果を元に、元の関数を改善し、より堅牢な新しい `{skill_to_improve}` 関数を生成してください。
         
@@ -136,10 +215,35 @@ class SceneCraftAgent:
         """
         
         learned_function_code = call_llm(LEARNER_MODEL, prompt, is_json=False)
-        learned_function_code = extract_python_code(learned_function_code)
+        return extract_python_code(learned_function_code)
 
-        print("\n  LLMによる学習の結果、新しい関数が生成されました:")
-        print(learned_function_code)
-        
-        # スキルライブラリを動的に更新
-        spatial_skill_library.update_skill(skill_to_improve, learned_function_code)
\ No newline at end of file
+    def run_outer_loop(self, refinement_history: Optional[List[Dict]] = None):
+        """
+        (Outer-Loop) 修正履歴から汎用的なスキルを学習し、ライブラリを更新する。
+        論文の Section 2.4 に対応。
+        頻繁に修正されたスキルを最大 LEARNING_MAX_SKILLS_PER_RUN 個選び、LLMへの問い合わせは並列に行う。
+        """
+        print("\n--- [Outer-Loop] 🎓 スキルライブラリの自己進化 ---")
+
+        targets = self._select_skills_to_improve(refinement_history or [])
+        if not targets:
+            print(f"  [Info] 学習に十分な修正履歴（{LEARNING_MIN_NEW_FIXES}件以上のupdate_argsアクション）がないため、スキル学習をスキップします。")
+            return
+
+        for target in targets:
+            print(f"  🔥 頻繁に修正されたスキル '{target['skill']}' ({target['count']}件) を学習対象として特定しました。")
+
+        # スキルごとのLLM呼び出しは独立しているため並列に送り、スキルの更新は1つずつ行う
+        with ThreadPoolExecutor(max_workers=min(LEARNING_MAX_PARALLEL, len(targets))) as executor:
+            learned_codes = list(executor.map(lambda t: self._learn_skill(t["skill"], t["feedback"]), targets))
+
+        for target, learned_function_code in zip(targets, learned_codes):
+            if not learned_function_code:
+                print(f"  [Warning] スキル '{target['skill']}' の改善案を取得できませんでした。")
+                continue
+            print(f"\n  LLMによる学習の結果、スキル '{target['skill']}' の新しい関数が生成されました:")
+            print(learned_function_code)
+
+            # スキルライブラリを動的に更新
+            if spatial_skill_library.update_skill(target["skill"], learned_function_code) and HISTORY_STORE_ENABLED:
+                history_store.get_history_store().mark_learned(target["skill"], "update_args")
@@ -0,0 +1,237 @@
+# batch.py
+"""
+JSONLファイルに並んだ大量のシーンクエリを、上限付きのワーカープールで順に処理する。
+各クエリのステージ出力 (アセット・分解結果・シーングラフ・ペイロード・画像) はチェックポイントとして保存され、
+途中で落ちたバッチは完了済みのLLM呼び出しやレンダリングをやり直さずに再開できる。
+
+使い方:
+    python batch.py queries.jsonl --output results.jsonl --workers 4
+入力の各行は {"id": "...", "query": "..."} 形式 ("query" の代わりに "prompt" / "body" も可)。
+"""
+import argparse
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from agent import SceneCraftAgent
+from library import spatial_skill_library
+from library.layout import Layout
+from pipeline import RefinementPipeline
+from utils import config
+from utils.checkpoint import StageCheckpoint, StageTimings
+from utils.render_cache import RenderCache
+from utils.scheduler import JobContext, JobScheduler
+
+def read_queries(path: str) -> Iterator[Tuple[str, str]]:
+    """JSONLファイルを1行ずつ読み、(クエリID, クエリ文) を返す。ファイル全体をメモリに載せない。"""
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            query = record.get("query") or record.get("prompt") or record.get("body")
+            if not query:
+                print(f"  [Batch] [Warning] {line_number}行目にクエリがないためスキップします。")
+                continue
+            query_id = str(record.get("id") or record.get("request_id") or f"line{line_number:06d}")
+            yield re.sub(r"[^\w.-]", "_", query_id), query
+
+def load_finished_ids(output_path: str) -> set:
+    """
+    結果ファイルに成功 (status: "ok") として書き出されたクエリID。再開時にはこれらを丸ごとスキップする。
+    失敗したクエリは、一時的なLLMやBlenderのエラーの可能性があるため再実行する。
+    """
+    if not os.path.exists(output_path):
+        return set()
+    finished = set()
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+                if record.get("status") == "ok":
+                    finished.add(record["id"])
+            except (json.JSONDecodeError, KeyError, AttributeError):
+                continue # 書き込み途中で落ちた最終行
+    return finished
+
+def drop_failed_results(output_path: str, finished_ids: set) -> int:
+    """
+    再実行するクエリの失敗の行 (と書き込み途中の行) を結果ファイルから取り除き、取り除いた行数を返す。
+    再実行の結果は追記されるため、同じクエリが結果ファイルに二重に数えられないようにする。
+    """
+    if not os.path.exists(output_path):
+        return 0
+    kept, dropped = [], 0
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                keep = json.loads(line).get("id") in finished_ids
+            except (json.JSONDecodeError, AttributeError):
+                keep = False
+            if keep:
+                kept.append(line if line.endswith("\n") else line + "\n")
+            else:
+                dropped += 1
+    if dropped:
+        tmp_path = output_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.writelines(kept)
+        os.replace(tmp_path, output_path)
+    return dropped
+
+class BatchRunner:
+    """クエリごとに Inner-Loop を実行し、サブシーンの自己改善はスケジューラとパイプラインを全クエリで共有する。"""
+    def __init__(self, output_path: str, checkpoint_dir: str, workers: int, num_refinement_steps: int):
+        self.output_path = output_path
+        self.checkpoint_dir = checkpoint_dir
+        self.workers = workers
+        self.agent = SceneCraftAgent()
+        # ジョブの作業ディレクトリをチェックポイントの中に置き、レンダリング画像も再開時に残るようにする
+        self.scheduler = JobScheduler(scratch_root=checkpoint_dir)
+        self.pipeline = RefinementPipeline(self.scheduler, RenderCache(), num_refinement_steps)
+        self.timings = StageTimings()
+        self.refinement_history: List[Dict] = []
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.failed = 0
+
+    def _write_result(self, result: Dict):
+        with self._lock:
+            with open(self.output_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(result, ensure_ascii=False) + "\n")
+                f.flush()
+
+    def _refine(self, query_id: str, checkpoint: StageCheckpoint, processed_sub_scenes: List[Dict]) -> List[Dict]:
+        """未完了のサブシーンだけを自己改善し、完了したものはチェックポイントから復元する。"""
+        history = []
+        jobs = []
+        for i, data in enumerate(processed_sub_scenes):
+            name = f"refined_{i+1}"
+            if checkpoint.has(name):
+                saved = checkpoint.load(name)
+                data.update(saved["state"])
+                data["layout"] = {n: Layout.from_dict(d) for n, d in saved["layout"].items()}
+                history.extend(saved["history"])
+                continue
+
+            def job(ctx: JobContext, data=data, name=name) -> List[Dict]:
+                started = time.monotonic()
+                sub_history = self.pipeline.refine(ctx, data)
+                self.timings.record("refinement", time.monotonic() - started)
+                checkpoint.save(name, {
+                    "state": {key: data[key] for key in ("scene_graph", "payload", "final_image_path") if key in data},
+                    "layout": {n: l.to_dict() for n, l in data["layout"].items()},
+                    "history": sub_history,
+                })
+                return sub_history
+            jobs.append((f"{query_id}/subscene{i+1}", job))
+
+        for sub_history in self.scheduler.run(jobs, monitor=False):
+            history.extend(sub_history)
+        return history
+
+    def process(self, query_id: str, query: str):
+        started = time.monotonic()
+        checkpoint = StageCheckpoint(os.path.join(self.checkpoint_dir, query_id), self.timings)
+        try:
+            run_result = self.agent.run_inner_loop(query, checkpoint)
+            processed_sub_scenes = run_result["processed_sub_scenes"]
+            history = self._refine(query_id, checkpoint, processed_sub_scenes)
+            result = {
+                "id": query_id,
+                "query": query,
+                "status": "ok",
+                "sub_scenes": [
+                    {"title": data["title"], "scene_graph": data["scene_graph"], "final_image_path": data.get("final_image_path")}
+                    for data in processed_sub_scenes
+                ],
+                "num_revisions": len(history),
+            }
+            with self._lock:
+                # 履歴ストアが有効なら修正は発生時に追記済みなので、メモリには溜めない
+                if not config.HISTORY_STORE_ENABLED:
+                    self.refinement_history.extend(history)
+                self.completed += 1
+        except Exception as e:
+            print(f"  [Batch] ❌ クエリ '{query_id}' の処理に失敗しました - {e}")
+            result = {"id": query_id, "query": query, "status": "error", "error": str(e)}
+            with self._lock:
+                self.failed += 1
+        elapsed = time.monotonic() - started
+        self.timings.record("query", elapsed)
+        result["elapsed_seconds"] = round(elapsed, 2)
+        self._write_result(result)
+
+    def run(self, queries: Iterator[Tuple[str, str]]):
+        finished_ids = load_finished_ids(self.output_path)
+        if finished_ids:
+            print(f"[Batch] ♻️ 結果が書き出し済みの {len(finished_ids)}件のクエリをスキップします。")
+        dropped = drop_failed_results(self.output_path, finished_ids)
+        if dropped:
+            print(f"[Batch] ♻️ 失敗していた {dropped}件のクエリを再実行します。")
+
+        started = time.monotonic()
+        # ファイルが巨大でも投入済みのクエリが増えすぎないよう、同時に抱えるクエリ数を制限する
+        slots = threading.BoundedSemaphore(self.workers * 2)
+        done = threading.Event()
+
+        def report_periodically():
+            while not done.wait(config.SCHEDULER_REPORT_INTERVAL):
+                self.report(time.monotonic() - started)
+
+        reporter = threading.Thread(target=report_periodically, daemon=True)
+        reporter.start()
+
+        def task(query_id: str, query: str):
+            try:
+                self.process(query_id, query)
+            finally:
+                slots.release()
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                for query_id, query in queries:
+                    if query_id in finished_ids:
+                        continue
+                    slots.acquire()
+                    executor.submit(task, query_id, query)
+        finally:
+            done.set()
+            reporter.join()
+            self.pipeline.shutdown()
+        self.report(time.monotonic() - started)
+
+    def report(self, elapsed: float):
+        scenes_per_hour = self.completed / (elapsed / 3600) if elapsed > 0 else 0.0
+        print(f"\n[Batch] 📊 完了 {self.completed}件 / 失敗 {self.failed}件 | 経過 {elapsed:.0f}s | {scenes_per_hour:.1f} scenes/hour")
+        for stage, stats in self.timings.summary().items():
+            print(f"    - {stage}: p50 {stats['p50']:.2f}s, p95 {stats['p95']:.2f}s (n={stats['count']})")
+        self.scheduler.report()
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="JSONLのクエリをまとめてシーン生成する")
+    parser.add_argument("queries", help="クエリのJSONLファイル")
+    parser.add_argument("--output", default="output/batch_results.jsonl", help="結果を書き出すJSONLファイル")
+    parser.add_argument("--checkpoint-dir", default=config.BATCH_CHECKPOINT_DIR, help="ステージ出力の保存先")
+    parser.add_argument("--workers", type=int, default=config.BATCH_MAX_WORKERS, help="同時に処理するクエリ数")
+    parser.add_argument("--refinement-steps", type=int, default=2, help="サブシーンごとの改善試行の最大回数")
+    parser.add_argument("--skip-learning", action="store_true", help="最後にOuter-Loopのスキル学習を行わない")
+    args = parser.parse_args(argv)
+
+    print("============== SceneCraft Batch Runner ==============")
+    spatial_skill_library.initialize_skills()
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+
+    runner = BatchRunner(args.output, args.checkpoint_dir, args.workers, args.refinement_steps)
+    runner.run(read_queries(args.queries))
+
+    if not args.skip_learning:
+        runner.agent.run_outer_loop(runner.refinement_history)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,4 @@
+"""
+ネットワーク・GPU・Blenderなしで実行できるベンチマーク群
+使い方は benchmarks/run.py を参照。
+"""
@@ -0,0 +1,52 @@
+"""
+ベンチマークの計測と結果の保存に使う共通処理
+"""
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import time
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+
+def time_call(fn: Callable[[], Any], min_seconds: float = 0.2, max_calls: int = 100000) -> Dict[str, float]:
+    """fn を min_seconds 以上 (最低1回) 繰り返し実行し、1回あたりの所要時間を返す。"""
+    fn() # ウォームアップ
+    calls = 0
+    started = time.perf_counter()
+    elapsed = 0.0
+    while calls < max_calls and (calls == 0 or elapsed < min_seconds):
+        fn()
+        calls += 1
+        elapsed = time.perf_counter() - started
+    return {"calls": calls, "seconds_per_call": elapsed / calls}
+
+@contextlib.contextmanager
+def quiet():
+    """計測対象が出力するログを捨てる。"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def environment() -> Dict[str, Any]:
+    return {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+def save_results(path: str, results: Dict[str, Any]):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=4, ensure_ascii=False)
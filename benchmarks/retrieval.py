@@ -0,0 +1,37 @@
+"""
+アセット検索 (library/asset_index.AssetIndex.search) のベンチマーク
+CLIPの代わりに、正規化した乱数ベクトルで合成したカタログを使う。
+"""
+from typing import Dict, List
+
+import numpy as np
+
+from library.asset_index import AssetIndex
+from .common import time_call
+
+EMBEDDING_DIM = 512 # clip-ViT-B-32 の次元数
+
+def synthetic_index(size: int, rng: np.random.Generator, dim: int = EMBEDDING_DIM) -> AssetIndex:
+    def unit_vectors():
+        vectors = rng.standard_normal((size, dim), dtype=np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    assets = [{"file_path": f"assets/synthetic_{i}.glb"} for i in range(size)]
+    return AssetIndex(assets, unit_vectors(), unit_vectors())
+
+def run(sizes: List[int], top_k: int = 10, seed: int = 0) -> List[Dict]:
+    rng = np.random.default_rng(seed)
+    results = []
+    for size in sizes:
+        index = synthetic_index(size, rng)
+        query = rng.standard_normal(EMBEDDING_DIM).astype(np.float32)
+        timing = time_call(lambda: index.search(query, top_k), max_calls=1000)
+        results.append({
+            "name": f"retrieval/search/{size}",
+            "catalog_size": size,
+            "top_k": top_k,
+            "seconds_per_query": timing["seconds_per_call"],
+            "queries_per_sec": 1 / timing["seconds_per_call"],
+        })
+        print(f"  [retrieval] {size:>8}件: {timing['seconds_per_call'] * 1000:.3f} ms/query")
+        del index
+    return results
@@ -0,0 +1,97 @@
+"""
+ベンチマークを実行し、結果をJSONに保存する。ネットワーク・GPU・Blenderは不要。
+
+使い方:
+    python -m benchmarks.run                       # 全ベンチマーク (検索は1k〜100k件)
+    python -m benchmarks.run --full                # 検索カタログを1M件まで広げる (約4GBのメモリを使う)
+    python -m benchmarks.run --suite solver --compare benchmarks/results/abc1234.json
+結果は benchmarks/results/<コミット>.json に保存され、--compare で別のコミットの結果と比較できる。
+"""
+import argparse
+import json
+import os
+from typing import Dict, List, Optional
+
+from library import spatial_skill_library
+from . import common, retrieval, skills, solver
+
+SUITES = ("retrieval", "skills", "solver")
+
+# 指標名の接尾辞と、その値が大きい方が良いかどうか
+HIGHER_IS_BETTER = ("_per_sec", "score")
+LOWER_IS_BETTER = ("seconds", "seconds_per_call", "seconds_per_query")
+
+def compare(current: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """同じ名前の計測どうしを比べ、threshold (比率) を超えて悪化した指標を返す。"""
+    previous = {entry["name"]: entry for suite in SUITES for entry in baseline.get(suite, [])}
+    regressions = []
+    for suite in SUITES:
+        for entry in current.get(suite, []):
+            before = previous.get(entry["name"])
+            if not before:
+                continue
+            for metric, value in entry.items():
+                old = before.get(metric)
+                if not isinstance(value, (int, float)) or not isinstance(old, (int, float)) or not old:
+                    continue
+                change = (value - old) / abs(old)
+                if metric.endswith(HIGHER_IS_BETTER):
+                    worse = change < -threshold
+                elif metric.endswith(LOWER_IS_BETTER):
+                    worse = change > threshold
+                else:
+                    continue
+                marker = "❌" if worse else ("✅" if abs(change) > threshold else "  ")
+                print(f"  {marker} {entry['name']:<32} {metric:<32} {old:.6g} -> {value:.6g} ({change * 100:+.1f}%)")
+                if worse:
+                    regressions.append(f"{entry['name']}:{metric}")
+    return regressions
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="SceneCraftのベンチマークを実行する")
+    parser.add_argument("--suite", choices=SUITES, action="append", help="実行するベンチマーク (複数指定可。省略時はすべて)")
+    parser.add_argument("--full", action="store_true", help="検索カタログを1M件まで計測する")
+    parser.add_argument("--quick", action="store_true", help="小さい規模だけを計測する (動作確認用)")
+    parser.add_argument("--solver-workers", type=int, default=1, help="クラスタ分割ソルバーのプロセス数")
+    parser.add_argument("--output", help="結果の保存先 (省略時は benchmarks/results/<コミット>.json)")
+    parser.add_argument("--compare", help="比較対象の結果JSON")
+    parser.add_argument("--threshold", type=float, default=0.1, help="悪化とみなす変化率 (既定 10%%)")
+    args = parser.parse_args(argv)
+    suites = args.suite or list(SUITES)
+
+    if args.quick:
+        catalog_sizes, skill_counts, solver_counts = [1_000], [2, 10], [5, 50]
+    else:
+        catalog_sizes = [1_000, 10_000, 100_000] + ([1_000_000] if args.full else [])
+        skill_counts = [2, 10, 100, 1000]
+        solver_counts = [5, 10, 50, 100, 500, 1000]
+
+    # 学習済みスキルがあれば、実際に使われるバージョンを計測する
+    with common.quiet():
+        spatial_skill_library.initialize_skills()
+
+    results = {"environment": common.environment()}
+    print("============== SceneCraft Benchmarks ==============")
+    if "retrieval" in suites:
+        results["retrieval"] = retrieval.run(catalog_sizes)
+    if "skills" in suites:
+        results["skills"] = skills.run(skill_counts)
+    if "solver" in suites:
+        results["solver"] = solver.run(solver_counts, workers=args.solver_workers)
+
+    output = args.output or os.path.join("benchmarks", "results", f"{results['environment']['commit'] or 'latest'}.json")
+    common.save_results(output, results)
+    print(f"\n✔️ 結果を '{output}' に保存しました。")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"\n--- '{args.compare}' (commit {baseline.get('environment', {}).get('commit')}) との比較 ---")
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n❌ {len(regressions)}件の指標が {args.threshold * 100:.0f}% 以上悪化しました。")
+            raise SystemExit(1)
+        print("\n✅ 悪化した指標はありません。")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""
+スキル関数 (library/spatial_skill_library.SKILLS) のベンチマーク
+複数アセットを受け取るスキルはアセット数を変えて、2アセットのスキルは2アセットで計測する。
+"""
+import random
+from typing import Dict, List
+
+from library import spatial_skill_library
+from library.solver import MULTI_ASSET_SKILLS, random_initial_layout, score_relation
+from .common import time_call
+
+# スキルごとの引数 (score_relation にシーングラフの関係として渡す)
+SKILL_ARGS = {
+    "proximity": {"min_dist": 1.0, "max_dist": 5.0},
+    "alignment": {"axis": "x"},
+    "symmetry": {"axis": "x"},
+}
+
+def run(asset_counts: List[int], seed: int = 0) -> List[Dict]:
+    rng = random.Random(seed)
+    results = []
+    for skill_name in sorted(spatial_skill_library.SKILLS):
+        counts = asset_counts if skill_name in MULTI_ASSET_SKILLS else [2]
+        for count in counts:
+            names = [f"asset_{i}" for i in range(count)]
+            layout = random_initial_layout(names, rng)
+            relation = {"type": skill_name, "involved_assets": names, "args": SKILL_ARGS.get(skill_name, {})}
+            timing = time_call(lambda: score_relation(relation, layout))
+            results.append({
+                "name": f"skills/{skill_name}/{count}",
+                "skill": skill_name,
+                "asset_count": count,
+                "seconds_per_call": timing["seconds_per_call"],
+                "score": score_relation(relation, layout),
+            })
+            print(f"  [skills] {skill_name:>16} x{count:<5}: {timing['seconds_per_call'] * 1e6:.1f} µs/call")
+    return results
@@ -0,0 +1,64 @@
+"""
+レイアウトソルバー (library/solver.py) のベンチマーク
+「通り沿いに並ぶ家」のような5アセットずつのグループと、隣り合うグループをつなぐ関係からなる
+合成シーングラフを、全体を1つの問題として解く場合とクラスタに分けて解く場合で比較する。
+"""
+import random
+import time
+from typing import Dict, List, Tuple
+
+from library import solver
+from .common import quiet
+
+def synthetic_scene_graph(asset_count: int, group_size: int = 5) -> Tuple[Dict, List[str]]:
+    names = [f"house_{i}" for i in range(asset_count)]
+    relations = []
+    for start in range(0, asset_count, group_size):
+        group = names[start:start + group_size]
+        if len(group) > 1:
+            relations.append({"type": "alignment", "involved_assets": group, "args": {"axis": "x"}})
+        for a, b in zip(group, group[1:]):
+            relations.append({"type": "proximity", "involved_assets": [a, b], "args": {"min_dist": 1.0, "max_dist": 4.0}})
+        if start:
+            relations.append({"type": "proximity", "involved_assets": [names[start - group_size], group[0]],
+                              "args": {"min_dist": 1.0, "max_dist": 4.0}})
+    return {"relations": relations}, names
+
+def run(asset_counts: List[int], max_iter: int = 200, seed: int = 0, workers: int = 1) -> List[Dict]:
+    results = []
+    for count in asset_counts:
+        scene_graph, names = synthetic_scene_graph(count)
+        relations = scene_graph["relations"]
+
+        # 全体を1つの問題として解く (反復速度の計測)
+        progress = []
+        rng = random.Random(seed)
+        initial = solver.random_initial_layout(names, rng)
+        started = time.perf_counter()
+        with quiet():
+            layout = solver.constraint_based_search(initial, lambda l: solver.evaluate_relations(l, relations), max_iter, rng,
+                                                    progress=lambda i, score: progress.append(i), progress_interval=max_iter)
+        joint_seconds = time.perf_counter() - started
+        joint_score = solver.evaluate_relations(layout, relations) / len(relations)
+
+        # クラスタに分けて解く (実際に使われる経路)
+        started = time.perf_counter()
+        with quiet():
+            layout = solver.solve_scene_graph(scene_graph, names, seed=seed, max_iter=max_iter, workers=workers)
+        clustered_seconds = time.perf_counter() - started
+        clustered_score = solver.evaluate_relations(layout, relations) / len(relations)
+
+        results.append({
+            "name": f"solver/{count}",
+            "asset_count": count,
+            "relation_count": len(relations),
+            "max_iter": max_iter,
+            "joint_seconds": joint_seconds,
+            "joint_iterations_per_sec": progress[-1] / joint_seconds,
+            "joint_mean_relation_score": joint_score,
+            "clustered_seconds": clustered_seconds,
+            "clustered_mean_relation_score": clustered_score,
+        })
+        print(f"  [solver] {count:>5}アセット: 全体 {progress[-1] / joint_seconds:,.0f} it/s (平均スコア {joint_score:.3f}), "
+              f"クラスタ分割 {clustered_seconds:.2f}s (平均スコア {clustered_score:.3f})")
+    return results
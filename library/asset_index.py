@@ -0,0 +1,41 @@
+"""
+アセットデータベースの埋め込みベクトルを検索するためのインデックス
+論文で言及されている2段階の検索 (テキスト類似度で候補を絞り、画像類似度で再ランク付け) を、
+全アセットの埋め込みをまとめた行列に対する演算で行う。CLIPモデルには依存しない。
+"""
+from typing import Dict, List, Optional
+
+import numpy as np
+
+class AssetIndex:
+    """アセットのテキスト埋め込みと画像埋め込みを、それぞれ1つの行列として保持する。"""
+    def __init__(self, assets: List[Dict], text_embeddings: np.ndarray, image_embeddings: np.ndarray):
+        self.assets = assets
+        self.text_embeddings = np.asarray(text_embeddings, dtype=np.float32)
+        self.image_embeddings = np.asarray(image_embeddings, dtype=np.float32)
+
+    @classmethod
+    def from_database(cls, asset_database: List[Dict]) -> "AssetIndex":
+        """asset_database.json の形式 (各アセットが text_embedding / image_embedding を持つ) から作る。"""
+        if not asset_database:
+            return cls([], np.zeros((0, 0)), np.zeros((0, 0)))
+        return cls(asset_database,
+                   np.array([asset["text_embedding"] for asset in asset_database]),
+                   np.array([asset["image_embedding"] for asset in asset_database]))
+
+    def __len__(self) -> int:
+        return len(self.assets)
+
+    def search(self, query_embedding: np.ndarray, top_k: int = 10) -> Optional[int]:
+        """
+        テキスト類似度の上位 top_k 件から、画像類似度が最も高いアセットの番号を返す。アセットがなければ None。
+        上位 top_k 件の抽出は全件のソートではなく argpartition で行う。
+        """
+        if not len(self.assets):
+            return None
+        query = np.asarray(query_embedding, dtype=np.float32)
+        text_scores = self.text_embeddings @ query
+        k = min(top_k, len(text_scores))
+        candidates = np.argpartition(-text_scores, k - 1)[:k] if k < len(text_scores) else np.arange(len(text_scores))
+        image_scores = self.image_embeddings[candidates] @ query
+        return int(candidates[np.argmax(image_scores)])
@@ -0,0 +1,158 @@
+"""
+解いたレイアウトからカメラの位置と注視点を決めるソルバー
+アセットの大きさ (高さから見積もったバウンディングボックス) と最終的な配置を使い、
+注視点の周りに並べたカメラ候補を、視錐台に収まるアセットの割合・画面の占有率・遮蔽の少なさでまとめて採点する。
+候補の採点は全候補・全アセットに対する行列演算で行い、LLMには問い合わせない。
+"""
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from utils import config
+from .layout import Layout
+
+DEFAULT_CAMERA = {"location": [15, -20, 15], "look_at": "center"}
+# バウンディングボックスの8頂点の符号
+_CORNER_SIGNS = np.array([[sx, sy, sz] for sx in (-1, 1) for sy in (-1, 1) for sz in (-1, 1)], dtype=float)
+# 遮蔽の計算で一度に扱う (候補数 x アセット数 x アセット数) の要素数の上限
+_MAX_PAIRWISE_ELEMENTS = 4_000_000
+
+def asset_boxes(layout: Dict[str, Layout], heights: Dict[str, float], footprint_ratio: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    各アセットのバウンディングボックスを、中心と半径 (各軸の半分の長さ) の配列で返す。
+    高さは正規化後の高さにスケールを掛けたもの、設置面の半径は高さの footprint_ratio 倍と見積もる。
+    """
+    names = list(layout.keys())
+    locations = np.array([layout[n].location for n in names], dtype=float)
+    scales = np.array([layout[n].scale for n in names], dtype=float)
+    base = np.array([heights.get(n, 1.0) for n in names], dtype=float)
+    height = base * scales[:, 2]
+    radius = base * footprint_ratio * np.maximum(scales[:, 0], scales[:, 1])
+    centers = locations + np.stack([np.zeros_like(height), np.zeros_like(height), height / 2], axis=1)
+    half_extents = np.stack([radius, radius, height / 2], axis=1)
+    return centers, half_extents
+
+def candidate_poses(target: np.ndarray, distance: float, azimuths: int, elevations, distance_scales) -> np.ndarray:
+    """注視点を中心に、方位角・仰角・距離の組み合わせで並べたカメラ位置 (候補数 x 3)。"""
+    az = np.radians(np.arange(azimuths) * 360.0 / azimuths)
+    el = np.radians(np.asarray(elevations, dtype=float))
+    scale = np.asarray(distance_scales, dtype=float)
+    az, el, scale = (grid.ravel() for grid in np.meshgrid(az, el, scale, indexing="ij"))
+    directions = np.stack([np.cos(el) * np.cos(az), np.cos(el) * np.sin(az), np.sin(el)], axis=1)
+    return target + directions * (distance * scale)[:, None]
+
+def camera_frames(cameras: np.ndarray, target: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """各候補の前方・右・上方向の単位ベクトル (Blenderのカメラを注視点に向けた場合と同じく、上方向はZ軸側)。"""
+    forward = target - cameras
+    forward /= np.linalg.norm(forward, axis=1, keepdims=True)
+    right = np.cross(forward, [0.0, 0.0, 1.0])
+    norms = np.linalg.norm(right, axis=1, keepdims=True)
+    right = np.where(norms > 1e-9, right / np.maximum(norms, 1e-9), [1.0, 0.0, 0.0])
+    up = np.cross(right, forward)
+    return forward, right, up
+
+def _occlusion(u: np.ndarray, v: np.ndarray, depth: np.ndarray, projected_radius: np.ndarray) -> np.ndarray:
+    """
+    各候補について、手前のアセットに隠される割合の平均を返す。
+    アセットを画面上の円とみなし、手前にある円との重なりの深さを自分の直径で割ったものを、隠される割合とする。
+    """
+    du = u[:, :, None] - u[:, None, :]
+    dv = v[:, :, None] - v[:, None, :]
+    distance = np.hypot(du, dv)
+    overlap = (projected_radius[:, :, None] + projected_radius[:, None, :] - distance) / (2 * projected_radius[:, :, None])
+    in_front = depth[:, None, :] < depth[:, :, None] # [n, i, j]: j が i より手前
+    occluded = np.where(in_front, np.clip(overlap, 0.0, 1.0), 0.0).max(axis=2)
+    return occluded.mean(axis=1)
+
+def score_poses(cameras: np.ndarray, target: np.ndarray, centers: np.ndarray, half_extents: np.ndarray,
+                tan_half_x: float, tan_half_y: float, preferred_direction: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+    """
+    全候補をまとめて採点する。
+
+    Returns:
+        "score": 総合スコア (大きいほど良い)
+        "coverage": 視錐台に入るバウンディングボックスの頂点の割合
+        "fill": 全アセットが画面に占める範囲を、目標の占有率で割ったもの (1で頭打ち)
+        "occlusion": アセットが手前のアセットに隠される割合の平均
+    """
+    weights = config.CAMERA_SOLVER_WEIGHTS
+    forward, right, up = camera_frames(cameras, target)
+    corners = (centers[:, None, :] + half_extents[:, None, :] * _CORNER_SIGNS[None]).reshape(-1, 3)
+
+    offsets = corners[None, :, :] - cameras[:, None, :]
+    depth = np.einsum("npk,nk->np", offsets, forward)
+    safe_depth = np.maximum(depth, 1e-6)
+    x = np.einsum("npk,nk->np", offsets, right) / safe_depth / tan_half_x
+    y = np.einsum("npk,nk->np", offsets, up) / safe_depth / tan_half_y
+    inside = (depth > 0) & (np.abs(x) <= 1) & (np.abs(y) <= 1)
+    coverage = inside.mean(axis=1)
+
+    # 画面内に切り詰めた頂点の範囲を、画面全体 (-1〜1 の正方形) に対する割合にする
+    x_in, y_in = np.clip(x, -1, 1), np.clip(y, -1, 1)
+    area = (x_in.max(axis=1) - x_in.min(axis=1)) * (y_in.max(axis=1) - y_in.min(axis=1)) / 4
+    fill = np.minimum(area / config.CAMERA_SOLVER_TARGET_FILL, 1.0)
+
+    center_offsets = centers[None, :, :] - cameras[:, None, :]
+    center_depth = np.maximum(np.einsum("nak,nk->na", center_offsets, forward), 1e-6)
+    u = np.einsum("nak,nk->na", center_offsets, right) / center_depth
+    v = np.einsum("nak,nk->na", center_offsets, up) / center_depth
+    projected_radius = np.maximum(np.linalg.norm(half_extents, axis=1)[None, :] / center_depth, 1e-6)
+    occlusion = np.zeros(len(cameras))
+    if len(centers) > 1:
+        chunk = max(1, _MAX_PAIRWISE_ELEMENTS // (len(centers) ** 2))
+        for start in range(0, len(cameras), chunk):
+            part = slice(start, start + chunk)
+            occlusion[part] = _occlusion(u[part], v[part], center_depth[part], projected_radius[part])
+
+    score = weights["coverage"] * coverage + weights["fill"] * fill - weights["occlusion"] * occlusion
+    if preferred_direction is not None:
+        directions = cameras - target
+        directions /= np.linalg.norm(directions, axis=1, keepdims=True)
+        score = score + weights["hint"] * (directions @ preferred_direction + 1) / 2
+    return {"score": score, "coverage": coverage, "fill": fill, "occlusion": occlusion}
+
+def solve_camera(layout: Dict[str, Layout], assets_info: Dict[str, Dict], hint: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    レイアウト全体を最もよく映すカメラの位置と注視点を返す (look_at は座標)。
+
+    Args:
+        assets_info: アセット名 -> アセット情報 (正規化後の高さ height を使う)
+        hint: LLMが提案したカメラ設定 (任意)。look_at がアセット名ならそのアセットを注視し、
+            location の方向から撮る候補ほど高く採点する。
+    """
+    print("\n--- [Camera Solver] 📸 レイアウトからカメラの位置を決定しています ---")
+    if not layout:
+        print("    [Warning] アセットがないため、デフォルトのカメラ設定を使用します。")
+        return dict(DEFAULT_CAMERA)
+
+    names = list(layout.keys())
+    heights = {name: float((assets_info.get(name) or {}).get("height", 1.0) or 1.0) for name in names}
+    centers, half_extents = asset_boxes(layout, heights, config.VERIFIER_FOOTPRINT_RATIO)
+    corners = (centers[:, None, :] + half_extents[:, None, :] * _CORNER_SIGNS[None]).reshape(-1, 3)
+    target = (corners.min(axis=0) + corners.max(axis=0)) / 2
+    hint = hint or {}
+    if isinstance(hint.get("look_at"), str) and hint["look_at"] in layout:
+        target = centers[names.index(hint["look_at"])]
+    radius = max(float(np.linalg.norm(corners - target, axis=1).max()), 1e-3)
+
+    # Blenderの既定カメラ (センサー幅に合わせた画角) と最終レンダリングの縦横比
+    tier = config.RENDER_TIERS[config.FINAL_RENDER_TIER]
+    tan_half_x = (config.CAMERA_SENSOR_MM / 2) / config.CAMERA_LENS_MM
+    tan_half_y = tan_half_x * tier["resolution_y"] / tier["resolution_x"]
+    # 距離の倍率 1.0 で、全アセットを囲む球がちょうど狭い方の画角に収まる
+    distance = radius / np.sin(np.arctan(min(tan_half_x, tan_half_y)))
+
+    preferred_direction = None
+    if hint.get("location") is not None:
+        direction = np.asarray(hint["location"], dtype=float) - target
+        if np.linalg.norm(direction) > 1e-9:
+            preferred_direction = direction / np.linalg.norm(direction)
+
+    cameras = candidate_poses(target, distance, config.CAMERA_SOLVER_AZIMUTHS, config.CAMERA_SOLVER_ELEVATIONS,
+                              config.CAMERA_SOLVER_DISTANCE_SCALES)
+    results = score_poses(cameras, target, centers, half_extents, tan_half_x, tan_half_y, preferred_direction)
+    best = int(np.argmax(results["score"]))
+    camera_settings = {"location": [round(float(c), 4) for c in cameras[best]], "look_at": [round(float(c), 4) for c in target]}
+    print(f"    ✔️ {len(cameras)}個の候補から決定しました: 位置={camera_settings['location']} "
+          f"(視錐台内 {results['coverage'][best]:.0%}, 占有率 {results['fill'][best]:.2f}, 遮蔽 {results['occlusion'][best]:.2f})")
+    return camera_settings
@@ -0,0 +1,163 @@
+# library/history_store.py
+"""
+自己改善ループの修正履歴を永続化するためのモジュール (SQLite)
+Inner-Loop で発生した修正はその場でイベントとして追記され、スキルごとの件数は挿入時に集計表へ加算される。
+Outer-Loop は実行をまたいで蓄積された集計表から学習対象のスキルを選ぶため、
+履歴が何百万件になっても全件をメモリに読み込む必要がない。
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+from utils import config
+from .layout_store import asset_role
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    skill TEXT,
+    action TEXT,
+    sub_scene TEXT,
+    feedback TEXT,
+    payload TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_events_skill_time ON events (skill, created_at);
+CREATE INDEX IF NOT EXISTS idx_events_time ON events (created_at);
+CREATE TABLE IF NOT EXISTS event_assets (
+    event_id INTEGER NOT NULL,
+    role TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_event_assets_role ON event_assets (role, event_id);
+CREATE TABLE IF NOT EXISTS skill_stats (
+    skill TEXT NOT NULL,
+    action TEXT NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0,
+    learned_at_total INTEGER NOT NULL DEFAULT 0,
+    last_event_at REAL,
+    PRIMARY KEY (skill, action)
+);
+"""
+
+class HistoryStore:
+    """
+    修正イベントの保存先。複数のワーカースレッドから同時に追記できる。
+    集計 (count_by_skill) と走査 (iter_events) はSQL側で行い、結果は少しずつ取り出す。
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def record(self, revision: Dict[str, Any]):
+        """自己改善ループの修正履歴1件をイベントとして追記し、スキルごとの集計を更新する。"""
+        target = revision.get("target_relation") or {}
+        change = revision.get("change") or {}
+        skill = target.get("type")
+        action = change.get("action") or "unknown"
+        created_at = revision.get("timestamp") or time.time()
+        payload = json.dumps({"target_relation": target, "change": change}, ensure_ascii=False)
+        roles = sorted({asset_role(name) for name in target.get("involved_assets", [])})
+
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                cursor = self._conn.execute(
+                    "INSERT INTO events (created_at, skill, action, sub_scene, feedback, payload) VALUES (?, ?, ?, ?, ?, ?)",
+                    (created_at, skill, action, revision.get("sub_scene"), revision.get("feedback"), payload))
+                self._conn.executemany("INSERT INTO event_assets (event_id, role) VALUES (?, ?)",
+                                       [(cursor.lastrowid, role) for role in roles])
+                if skill:
+                    self._conn.execute(
+                        "INSERT INTO skill_stats (skill, action, total, last_event_at) VALUES (?, ?, 1, ?) "
+                        "ON CONFLICT (skill, action) DO UPDATE SET total = total + 1, last_event_at = excluded.last_event_at",
+                        (skill, action, created_at))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _filters(self, skill: Optional[str], action: Optional[str], since: Optional[float],
+                 until: Optional[float], role: Optional[str]):
+        clauses, params = [], []
+        if skill:
+            clauses.append("e.skill = ?"); params.append(skill)
+        if action:
+            clauses.append("e.action = ?"); params.append(action)
+        if since is not None:
+            clauses.append("e.created_at >= ?"); params.append(since)
+        if until is not None:
+            clauses.append("e.created_at < ?"); params.append(until)
+        if role:
+            clauses.append("e.id IN (SELECT event_id FROM event_assets WHERE role = ?)"); params.append(asset_role(role))
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def count_by_skill(self, action: Optional[str] = None, since: Optional[float] = None,
+                       until: Optional[float] = None, role: Optional[str] = None) -> Dict[str, int]:
+        """期間・アセットの種類で絞り込んだ、スキルごとの修正件数。"""
+        where, params = self._filters(None, action, since, until, role)
+        with self._lock:
+            rows = self._conn.execute(f"SELECT e.skill, COUNT(*) FROM events e{where} GROUP BY e.skill", params).fetchall()
+        return {skill: count for skill, count in rows if skill}
+
+    def iter_events(self, skill: Optional[str] = None, action: Optional[str] = None, since: Optional[float] = None,
+                    until: Optional[float] = None, role: Optional[str] = None, batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """条件に合うイベントを古い順に返す。batch_size 件ずつ読み出すため、件数によらずメモリ使用量は一定。"""
+        where, params = self._filters(skill, action, since, until, role)
+        last_id = 0
+        while True:
+            page_where = f"{where} AND e.id > ?" if where else " WHERE e.id > ?"
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT e.id, e.created_at, e.skill, e.action, e.sub_scene, e.feedback, e.payload FROM events e"
+                    f"{page_where} ORDER BY e.id LIMIT ?", params + [last_id, batch_size]).fetchall()
+            if not rows:
+                return
+            for event_id, created_at, skill_name, action_name, sub_scene, feedback, payload in rows:
+                yield {"id": event_id, "timestamp": created_at, "skill": skill_name, "action": action_name,
+                       "sub_scene": sub_scene, "feedback": feedback, **json.loads(payload)}
+            last_id = rows[-1][0]
+
+    def recent_feedback(self, skill: str, limit: int) -> List[str]:
+        """学習プロンプトの例として使う、そのスキルに対する最近のレビューコメント。"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT feedback FROM events WHERE skill = ? AND feedback IS NOT NULL ORDER BY created_at DESC LIMIT ?",
+                (skill, limit)).fetchall()
+        return [feedback for (feedback,) in rows]
+
+    def pending_skills(self, action: str, min_new_events: int, limit: int) -> List[Dict[str, Any]]:
+        """前回の学習以降に修正が多く溜まったスキルを、新しい修正の件数が多い順に返す。"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT skill, total, total - learned_at_total AS pending FROM skill_stats "
+                "WHERE action = ? AND total - learned_at_total >= ? ORDER BY pending DESC, last_event_at DESC LIMIT ?",
+                (action, min_new_events, limit)).fetchall()
+        return [{"skill": skill, "total": total, "pending": pending} for skill, total, pending in rows]
+
+    def mark_learned(self, skill: str, action: str):
+        """スキルを学習し直したことを記録する。以降はそれより後の修正だけが学習のきっかけになる。"""
+        with self._lock:
+            self._conn.execute("UPDATE skill_stats SET learned_at_total = total WHERE skill = ? AND action = ?", (skill, action))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+_store: Optional[HistoryStore] = None
+_store_lock = threading.Lock()
+
+def get_history_store() -> HistoryStore:
+    """プロセス全体で共有するストアを返す。"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = HistoryStore(config.HISTORY_STORE_PATH)
+        return _store
@@ -2,8 +2,10 @@
 3Dシーン内のアセットのレイアウト情報を定義するモジュール
 """
 from dataclasses import dataclass
-from typing import Tuple
+from typing import Dict, Tuple
 from copy import deepcopy
+import json
+import os
 
 @dataclass
 class Layout:
@@ -16,4 +18,28 @@ class Layout:
     scale: Tuple[float, float, float]     # スケール (sx, sy, sz)
     
     def copy(self):
-        return deepcopy(self)
\ No newline at end of file
+        return deepcopy(self)
+
+    def to_dict(self) -> dict:
+        """JSONに保存できる形式に変換する。"""
+        return {"location": list(self.location), "orientation": list(self.orientation), "scale": list(self.scale)}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Layout":
+        return cls(location=tuple(data["location"]), orientation=tuple(data["orientation"]), scale=tuple(data["scale"]))
+
+
+def save_layouts(path: str, layouts: Dict[str, Layout], **extra):
+    """アセット名→レイアウトの辞書をJSONファイルに保存する。extra は同じファイルに一緒に保存する追加情報。"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    data = dict(extra, layouts={name: layout.to_dict() for name, layout in layouts.items()})
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=4, ensure_ascii=False)
+
+def load_layouts(path: str) -> Dict[str, Layout]:
+    """save_layouts で保存したレイアウトを読み込む。ファイルがなければ空の辞書を返す。"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return {name: Layout.from_dict(d) for name, d in data.get("layouts", {}).items()}
@@ -0,0 +1,269 @@
+"""
+解いたレイアウトを正規化したシーングラフをキーに保存するストア
+「通り沿いに並ぶ家」「家の近くのランプ」のような同じ種類のサブシーンはクエリをまたいで何度も現れる。
+アセット名を役割 (role) に抽象化し、関係と引数を正規化したシーングラフが完全に一致すれば
+保存済みのレイアウトをそのまま返し、部分的に一致すればウォームスタートの初期配置として使う。
+"""
+import atexit
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Tuple
+
+from utils import config
+from .layout import Layout
+from . import solver
+
+# 関与するアセットの順序がスコアに影響するスキル (それ以外は順序を無視して正規化する)
+ORDERED_SKILLS = ("parallelism",)
+
+def asset_role(name: str) -> str:
+    """アセット名から番号などを取り除いた役割名を返す (例: "Slum house_2" -> "slum house")。"""
+    return re.sub(r"[\s_\-]*\d+$", "", name).strip().lower() or name.lower()
+
+def _normalize_args(args: Dict) -> Dict:
+    normalized = {}
+    for key, value in sorted((args or {}).items()):
+        if isinstance(value, bool) or value is None:
+            normalized[key] = value
+        elif isinstance(value, (int, float)):
+            normalized[key] = round(float(value), 2)
+        else:
+            normalized[key] = str(value).strip().lower()
+    return normalized
+
+def _digest(value) -> str:
+    return hashlib.sha1(json.dumps(value, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+
+def _wl_colors(asset_names: List[str], relations: List[Dict], directed: bool) -> Dict[str, str]:
+    """
+    役割名を初期の色として、隣接する関係の情報で2回色を細分化する (Weisfeiler-Lehman法)。
+    directed が False なら、順序のあるスキルでも関与するアセットの順序を無視する。
+    """
+    colors = {name: asset_role(name) for name in asset_names}
+    for _ in range(2):
+        signatures = {}
+        for name in asset_names:
+            neighbourhood = []
+            for r in relations:
+                involved = r.get("involved_assets", [])
+                if name in involved:
+                    position = involved.index(name) if directed and r.get("type", "").lower() in ORDERED_SKILLS else -1
+                    neighbourhood.append([r.get("type", "").lower(), _normalize_args(r.get("args")), position,
+                                          sorted(colors[o] for o in involved if o != name)])
+            signatures[name] = [colors[name], sorted(neighbourhood, key=json.dumps)]
+        colors = {name: _digest(signatures[name]) for name in asset_names}
+    return colors
+
+def canonicalize(scene_graph: Dict, asset_names: List[str]) -> Tuple[str, List[str], List[str], List[str], List[List[str]]]:
+    """
+    シーングラフを正規化する。
+
+    Returns:
+        (キー, 正規化した順序のアセット名, 各スロットの役割名, 類似検索用のトークン, 各スロットの色)
+        同じ構造のシーングラフは、アセット名が違っても同じキーと同じスロットの並びになる。
+        色は [関係の向きまで区別した色, 向きを無視した色] の組で、部分一致の際にスロットを対応付けるのに使う。
+    """
+    relations = [r for r in scene_graph.get("relations", []) if set(r.get("involved_assets", [])) <= set(asset_names)]
+    colors = _wl_colors(asset_names, relations, directed=True)
+    loose_colors = _wl_colors(asset_names, relations, directed=False)
+
+    order = sorted(asset_names, key=lambda name: (colors[name], name))
+    slot = {name: i for i, name in enumerate(order)}
+    roles = [asset_role(name) for name in order]
+
+    canonical_relations = []
+    for r in relations:
+        rel_type = r.get("type", "").lower()
+        slots = [slot[name] for name in r.get("involved_assets", [])]
+        if rel_type not in ORDERED_SKILLS:
+            slots = sorted(slots)
+        canonical_relations.append([rel_type, slots, _normalize_args(r.get("args"))])
+    canonical_relations.sort(key=json.dumps)
+
+    key = _digest({"roles": roles, "relations": canonical_relations})
+    role_counts = Counter()
+    tokens = []
+    for role in roles:
+        role_counts[role] += 1
+        tokens.append(f"role:{role}#{role_counts[role]}")
+    for rel_type, slots, _ in canonical_relations:
+        tokens.append(f"rel:{rel_type}:{'|'.join(sorted(roles[s] for s in slots))}")
+    return key, order, roles, sorted(set(tokens)), [[colors[name], loose_colors[name]] for name in order]
+
+def match_slots(order: List[str], roles: List[str], colors: List[List[str]], entry: Dict) -> Dict[str, int]:
+    """
+    部分一致したエントリのスロットに、アセットを対応付ける (アセット名 -> スロット番号)。
+    関係の構造まで同じ (向きを区別した色が一致する) スロット、向きを無視した色が一致するスロット、
+    役割だけが一致するスロットの順に対応付ける。色を持たない古いエントリは役割だけで対応付ける。
+    """
+    stored_colors = entry.get("colors") or [[None, None]] * len(entry["roles"])
+    used, matched = set(), {}
+    for level in (0, 1, None):
+        for name, role, color in zip(order, roles, colors):
+            if name in matched:
+                continue
+            for i, (stored_role, stored_color) in enumerate(zip(entry["roles"], stored_colors)):
+                if i not in used and stored_role == role and (level is None or stored_color[level] == color[level]):
+                    used.add(i)
+                    matched[name] = i
+                    break
+    return matched
+
+class LayoutStore:
+    """
+    正規化したシーングラフ -> レイアウトの保存先。
+    完全一致は辞書で、部分一致はトークンの転置インデックスで検索する。エントリ数には上限がありLRUで削除する。
+    """
+    def __init__(self, path: str, max_entries: int, min_similarity: float):
+        self.path = path
+        self.max_entries = max_entries
+        self.min_similarity = min_similarity
+        self.stats = Counter()
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict] = {}
+        self._inverted: Dict[str, set] = {}
+        self._dirty = False
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except json.JSONDecodeError:
+            print(f"[LayoutStore] [Warning] '{self.path}' を読み込めなかったため、空のストアで開始します。")
+            return
+        for key, entry in entries.items():
+            self._add(key, entry)
+
+    def _add(self, key: str, entry: Dict):
+        self._entries[key] = entry
+        for token in entry["tokens"]:
+            self._inverted.setdefault(token, set()).add(key)
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        for token in entry["tokens"]:
+            keys = self._inverted.get(token)
+            if keys:
+                keys.discard(key)
+                if not keys:
+                    del self._inverted[token]
+
+    def flush(self):
+        """変更があればファイルに書き出す。"""
+        with self._lock:
+            if not self._dirty:
+                return
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+
+    def lookup(self, scene_graph: Dict, asset_names: List[str], exact_only: bool = False) -> Tuple[str, Optional[Dict[str, Layout]]]:
+        """
+        exact_only が True なら部分一致の検索は行わない。
+
+        Returns:
+            ("exact", レイアウト) / ("near", 一部のアセットの初期配置) / ("miss", None)
+        """
+        key, order, roles, tokens, colors = canonicalize(scene_graph, asset_names)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                entry["last_used"] = time.time()
+                self._dirty = True
+                self.stats["exact"] += 1
+                return "exact", {name: Layout.from_dict(entry["layouts"][i]) for i, name in enumerate(order)}
+            if exact_only:
+                self.stats["miss"] += 1
+                return "miss", None
+
+            # 共通するトークンを持つエントリだけを候補にして、Jaccard係数が最大のものを探す
+            overlap = Counter()
+            for token in tokens:
+                for candidate in self._inverted.get(token, ()):
+                    overlap[candidate] += 1
+            best_key, best_similarity = None, 0.0
+            for candidate, shared in overlap.items():
+                similarity = shared / (len(tokens) + len(self._entries[candidate]["tokens"]) - shared)
+                if similarity > best_similarity:
+                    best_key, best_similarity = candidate, similarity
+            if best_key is None or best_similarity < self.min_similarity:
+                self.stats["miss"] += 1
+                return "miss", None
+
+            entry = self._entries[best_key]
+            entry["last_used"] = time.time()
+            self._dirty = True
+            warm = {name: Layout.from_dict(entry["layouts"][i]) for name, i in match_slots(order, roles, colors, entry).items()}
+            self.stats["near"] += 1
+            self.stats["near_similarity"] += best_similarity
+            self.stats["near_matched_slots"] += len(warm)
+            self.stats["near_slots"] += len(order)
+            return "near", warm
+
+    def put(self, scene_graph: Dict, asset_names: List[str], layout: Dict[str, Layout]):
+        key, order, roles, tokens, colors = canonicalize(scene_graph, asset_names)
+        if any(name not in layout for name in order):
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._add(key, {
+                "roles": roles,
+                "colors": colors,
+                "tokens": tokens,
+                "layouts": [layout[name].to_dict() for name in order],
+                "last_used": time.time(),
+            })
+            while len(self._entries) > self.max_entries:
+                oldest = min(self._entries, key=lambda k: self._entries[k]["last_used"])
+                self._remove(oldest)
+            self._dirty = True
+
+_store: Optional[LayoutStore] = None
+_store_lock = threading.Lock()
+
+def get_layout_store() -> LayoutStore:
+    """プロセス全体で共有するストアを返す。終了時に自動で書き出す。"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = LayoutStore(config.LAYOUT_STORE_PATH, config.LAYOUT_STORE_MAX_ENTRIES, config.LAYOUT_STORE_NEAR_MATCH_MIN_SIMILARITY)
+            atexit.register(_store.flush)
+        return _store
+
+def solve_with_store(scene_graph: Dict, asset_names: List[str], seed: Optional[int] = None, max_iter: int = 100,
+                     warm_max_iter: int = 40, warm_patience: Optional[int] = None,
+                     progress: Optional[Callable[[int, float], None]] = None, progress_interval: int = 10) -> Dict[str, Layout]:
+    """
+    ストアを参照してからシーングラフを解く。
+    完全一致ならソルバーを実行せず、部分一致なら保存済みの配置から全アセットを再最適化する。
+    progress はソルバーを実行した場合だけ呼ばれる (solver.solve_scene_graph)。
+    """
+    solver_options = {"max_cluster_size": config.SOLVER_MAX_CLUSTER_SIZE, "workers": config.SOLVER_WORKERS,
+                      "progress": progress, "progress_interval": progress_interval}
+    if not config.LAYOUT_STORE_ENABLED:
+        return solver.solve_scene_graph(scene_graph, asset_names, seed=seed, max_iter=max_iter, **solver_options)
+
+    store = get_layout_store()
+    kind, stored = store.lookup(scene_graph, asset_names)
+    if kind == "exact":
+        print("  [LayoutStore] ⚡ 同じ構造のシーングラフの解を再利用します。")
+        return stored
+    if kind == "near":
+        layout = solver.solve_scene_graph(scene_graph, asset_names, seed=seed, max_iter=warm_max_iter,
+                                          previous_layout=stored, changed_assets=asset_names, patience=warm_patience, **solver_options)
+    else:
+        layout = solver.solve_scene_graph(scene_graph, asset_names, seed=seed, max_iter=max_iter, **solver_options)
+    store.put(scene_graph, asset_names, layout)
+    return layout
@@ -0,0 +1,288 @@
+"""
+シーングラフの制約を満たすレイアウトを探索するソルバー
+論文の Section 2.2 の constraint-based search に対応。
+Blender内のランナーと、Blenderを起動する前のホスト側の両方から利用される。
+"""
+import atexit
+import multiprocessing
+import random
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from .layout import Layout
+from . import spatial_skill_library
+from .spatial_skill_library import SKILLS
+
+# アセットのリストをまとめて受け取るスキル。それ以外は先頭2つのアセットを個別の引数として受け取る
+MULTI_ASSET_SKILLS = ("alignment", "parallelism", "symmetry")
+# これより少ないアセット数のシーンは、プロセスを起動するコストの方が大きいため並列に解かない
+PARALLEL_MIN_ASSETS = 60
+
+def score_relation(relation: Dict, layout: Dict[str, Layout]) -> float:
+    """
+    1つのリレーションをスキル関数で評価する。
+    relation は coder.compile_relations の形式で、Blender内で解く場合 (utils/blender_runner.solve_layout) も同じ関数で評価する。
+    """
+    rel_type = relation.get("type", "").lower()
+    skill = SKILLS.get(rel_type)
+    involved = relation.get("involved_assets", [])
+    if not skill or any(name not in layout for name in involved):
+        return 0.0
+    args = relation.get("args", {}) or {}
+    assets = [layout[name] for name in involved]
+    try:
+        if len(assets) > 1 and rel_type not in MULTI_ASSET_SKILLS:
+            return float(skill(assets[0], assets[1], **args))
+        return float(skill(assets, **args))
+    except (TypeError, ValueError):
+        # LLMが生成した引数がスキルの引数と合わない場合は、その関係を評価対象外とする
+        return 0.0
+
+def evaluate_relations(layout: Dict[str, Layout], relations: List[Dict]) -> float:
+    """シーングラフの全リレーションのスコアの合計を返す。"""
+    return sum(score_relation(relation, layout) for relation in relations)
+
+def random_initial_layout(asset_names: List[str], rng: random.Random) -> Dict[str, Layout]:
+    return {name: Layout(location=(rng.uniform(-10, 10), rng.uniform(-10, 10), 0), orientation=(0, 0, 0), scale=(1, 1, 1))
+            for name in asset_names}
+
+def constraint_based_search(initial_assets: Dict[str, Layout], evaluate: Callable[[Dict[str, Layout]], float],
+                            max_iter: int = 100, rng: Optional[random.Random] = None,
+                            movable: Optional[Iterable[str]] = None, patience: Optional[int] = None,
+                            verbose: bool = True, progress: Optional[Callable[[int, float], None]] = None,
+                            progress_interval: int = 10) -> Dict[str, Layout]:
+    """
+    ランダムに1アセットずつ動かし、評価値が改善した場合のみ採用する山登り法。
+
+    Args:
+        movable: 動かしてよいアセット名。省略時は全アセットが対象。
+        patience: この回数続けて改善しなければ打ち切る。省略時は max_iter 回まで探索する。
+        verbose: False ならスコアを表示しない (クラスタごとの求解で使う)。
+        progress: 指定すると progress_interval 回ごとと終了時に (反復数, 最良スコア) を渡して呼び出す。
+    """
+    rng = rng or random.Random()
+    best_layout = {k: v.copy() for k, v in initial_assets.items()}
+    best_score = evaluate(best_layout)
+    if verbose:
+        print(f'  [Solver] 初期スコア: {best_score:.4f}')
+    candidates = sorted(best_layout.keys() if movable is None else set(movable) & set(best_layout.keys()))
+    if not candidates:
+        return best_layout
+    iterations = 0
+    since_improvement = 0
+    for iterations in range(1, max_iter + 1):
+        # 動かすアセットだけを複製し、それ以外は最良解のオブジェクトを共有する (アセット数に比例したコピーを避ける)
+        asset_to_move = rng.choice(candidates)
+        current_layout = dict(best_layout)
+        current_layout[asset_to_move] = best_layout[asset_to_move].copy()
+        loc = list(current_layout[asset_to_move].location)
+        ori = list(current_layout[asset_to_move].orientation)
+        # 位置は水平方向にだけ動かす (z は初期配置のままにし、地面や支えの上から浮かせない)
+        loc[rng.randint(0, 1)] += rng.uniform(-0.5, 0.5)
+        axis = rng.randint(0, 2)
+        ori[axis] = (ori[axis] + rng.uniform(-5, 5)) % 360
+        current_layout[asset_to_move].location = tuple(loc)
+        current_layout[asset_to_move].orientation = tuple(ori)
+        current_score = evaluate(current_layout)
+        if current_score > best_score:
+            best_score = current_score
+            best_layout = current_layout
+            since_improvement = 0
+        else:
+            since_improvement += 1
+            if patience and since_improvement >= patience:
+                break
+        if progress and iterations % progress_interval == 0:
+            progress(iterations, best_score)
+    if progress and iterations % progress_interval != 0:
+        progress(iterations, best_score)
+    if verbose:
+        print(f'  [Solver] 最適化後のスコア: {best_score:.4f} ({iterations}回の反復, 対象 {len(candidates)}アセット)')
+    return best_layout
+
+def connected_components(asset_names: List[str], relations: List[Dict]) -> List[List[str]]:
+    """関係でつながったアセットの集合 (連結成分) を、Union-Findで求める。"""
+    parent = {name: name for name in asset_names}
+
+    def find(name: str) -> str:
+        while parent[name] != name:
+            parent[name] = parent[parent[name]]
+            name = parent[name]
+        return name
+
+    for relation in relations:
+        involved = [name for name in relation.get("involved_assets", []) if name in parent]
+        for other in involved[1:]:
+            root_a, root_b = find(involved[0]), find(other)
+            if root_a != root_b:
+                parent[root_b] = root_a
+
+    components: Dict[str, List[str]] = {}
+    for name in asset_names:
+        components.setdefault(find(name), []).append(name)
+    return list(components.values())
+
+def partition_clusters(asset_names: List[str], relations: List[Dict], max_cluster_size: int) -> List[List[str]]:
+    """
+    アセットを、互いの関係が密なクラスタに分割する。
+    連結成分ごとに分け、max_cluster_size を超える成分は、関係の多いアセットから幅優先で
+    上限まで広げたクラスタに切り分ける。クラスタをまたぐ関係は結合パスで解く。
+    """
+    neighbours: Dict[str, List[str]] = {name: [] for name in asset_names}
+    for relation in relations:
+        involved = [name for name in relation.get("involved_assets", []) if name in neighbours]
+        for name in involved:
+            neighbours[name].extend(other for other in involved if other != name)
+
+    clusters = []
+    for component in connected_components(asset_names, relations):
+        if len(component) <= max_cluster_size:
+            clusters.append(component)
+            continue
+        unassigned = set(component)
+        for seed_name in sorted(component, key=lambda name: (-len(neighbours[name]), name)):
+            if seed_name not in unassigned:
+                continue
+            cluster, frontier = [], deque([seed_name])
+            unassigned.discard(seed_name)
+            while frontier and len(cluster) < max_cluster_size:
+                name = frontier.popleft()
+                cluster.append(name)
+                for other in neighbours[name]:
+                    if other in unassigned and len(cluster) + len(frontier) < max_cluster_size:
+                        unassigned.discard(other)
+                        frontier.append(other)
+            clusters.append(cluster)
+    return clusters
+
+def _solve_cluster(task: Tuple) -> Dict[str, Layout]:
+    """1つのクラスタを解く。別プロセスからも呼べるよう、引数はまとめてタプルで受け取る。"""
+    initial, relations, max_iter, seed, movable, patience = task
+    return constraint_based_search(initial, lambda layout: evaluate_relations(layout, relations), max_iter,
+                                   random.Random(seed), movable=movable, patience=patience, verbose=False)
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_skills: Optional[Dict[str, str]] = None # プールを作成した時点の学習済みスキル
+_executor_lock = threading.Lock()
+
+def _init_worker(learned_sources: Dict[str, str]):
+    """ワーカープロセスに、親プロセスと同じ学習済みスキルを読み込む。"""
+    spatial_skill_library.load_learned_skills(learned_sources, verbose=False)
+
+def _get_executor(workers: int) -> ProcessPoolExecutor:
+    """
+    クラスタを解くプロセスプールを返す。
+    スレッドから作成されることがあるため fork ではなく spawn で起動し、学習済みスキルは initializer で渡す。
+    プールの作成後にスキルが学習し直されていたら、プールを作り直す。
+    """
+    global _executor, _executor_skills
+    with _executor_lock:
+        learned_sources = dict(spatial_skill_library.LEARNED_SOURCES)
+        if _executor is not None and _executor_skills != learned_sources:
+            _executor.shutdown(wait=True)
+            _executor = None
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                            initializer=_init_worker, initargs=(learned_sources,))
+            _executor_skills = learned_sources
+        return _executor
+
+@atexit.register
+def shutdown_executor():
+    """クラスタを解くプロセスプールを終了させる。"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+
+def _solve_clusters(tasks: List[Tuple], workers: int) -> List[Dict[str, Layout]]:
+    """クラスタを並列に解く。プロセスプールが使えない環境 (Blender内など) では順に解く。"""
+    if workers > 1 and len(tasks) > 1 and sum(len(task[0]) for task in tasks) >= PARALLEL_MIN_ASSETS:
+        try:
+            return list(_get_executor(workers).map(_solve_cluster, tasks, chunksize=max(1, len(tasks) // (workers * 4))))
+        except Exception as e:
+            print(f'  [Solver] [Warning] クラスタの並列求解に失敗したため、順に解きます - {e}')
+    return [_solve_cluster(task) for task in tasks]
+
+def solve_scene_graph(scene_graph: Dict, asset_names: List[str], seed: Optional[int] = None, max_iter: int = 100,
+                      previous_layout: Optional[Dict[str, Layout]] = None, changed_assets: Optional[Iterable[str]] = None,
+                      patience: Optional[int] = None, max_cluster_size: int = 12, workers: int = 1,
+                      progress: Optional[Callable[[int, float], None]] = None, progress_interval: int = 10) -> Dict[str, Layout]:
+    """
+    シーングラフを解き、各アセットのレイアウトを返す。
+    seed を固定すると同じシーングラフからは常に同じレイアウトが得られる (workers の数にはよらない)。
+
+    previous_layout を渡すとウォームスタートになり、前回の最適解から探索を始める。
+    その場合に動かすのは changed_assets (修正された関係に含まれるアセット) と、
+    前回のレイアウトにない新しいアセットだけで、それ以外の配置は変わらない。
+
+    関係のグラフが複数のクラスタに分かれる場合は、クラスタごとに max_iter 回ずつ独立に
+    (workers > 1 なら別プロセスで並列に) 解き、クラスタをまたぐ関係だけを最後の結合パスで解く。
+
+    progress は constraint_based_search と同じく (反復数, スコア) を受け取る。クラスタに分けた場合は、
+    クラスタの求解後に (max_iter, 全リレーションのスコア) を1回渡し、結合パスの反復数はその続きとして数える。
+    """
+    rng = random.Random(seed)
+    relations = scene_graph.get("relations", [])
+    initial = random_initial_layout(asset_names, rng)
+    movable = None
+    if previous_layout:
+        new_assets = {name for name in asset_names if name not in previous_layout}
+        movable = new_assets | set(changed_assets or [])
+        for name in asset_names:
+            if name in previous_layout:
+                initial[name] = previous_layout[name].copy()
+        # 動かないアセット同士の関係はスコアが一定なので評価から外す
+        relations = [r for r in relations if movable & set(r.get("involved_assets", []))]
+        print(f'  [Solver] 前回のレイアウトからウォームスタートします (再最適化: {sorted(movable)})')
+
+    clusters = partition_clusters(asset_names, relations, max_cluster_size)
+    if len(clusters) <= 1:
+        return constraint_based_search(initial, lambda layout: evaluate_relations(layout, relations), max_iter, rng,
+                                       movable=movable, patience=patience, progress=progress, progress_interval=progress_interval)
+
+    # 各関係を、関与するアセットがすべて含まれるクラスタに振り分ける。残りはクラスタをまたぐ関係
+    cluster_of = {name: i for i, cluster in enumerate(clusters) for name in cluster}
+    cluster_relations: List[List[Dict]] = [[] for _ in clusters]
+    cross_relations = []
+    for relation in relations:
+        owners = {cluster_of[name] for name in relation.get("involved_assets", []) if name in cluster_of}
+        if len(owners) == 1:
+            cluster_relations[owners.pop()].append(relation)
+        else:
+            cross_relations.append(relation)
+
+    # シードはクラスタの順に決めるため、並列に解いても結果は変わらない
+    tasks = []
+    for cluster, cluster_rels in zip(clusters, cluster_relations):
+        cluster_seed = rng.randrange(2 ** 32)
+        cluster_movable = None if movable is None else sorted(movable & set(cluster))
+        if not cluster_rels or cluster_movable == []:
+            continue
+        tasks.append(({name: initial[name] for name in cluster}, cluster_rels, max_iter, cluster_seed, cluster_movable, patience))
+    layout = dict(initial)
+    for solved in _solve_clusters(tasks, workers):
+        layout.update(solved)
+    print(f'  [Solver] {len(asset_names)}アセットを{len(clusters)}クラスタに分割して解きました '
+          f'(最適化 {len(tasks)}クラスタ, クラスタをまたぐ関係 {len(cross_relations)}件)')
+    if progress:
+        progress(max_iter, evaluate_relations(layout, relations))
+    if not cross_relations:
+        print(f'  [Solver] 最適化後のスコア: {evaluate_relations(layout, relations):.4f}')
+        return layout
+
+    # 結合パス: クラスタをまたぐ関係に含まれるアセットだけを動かし、それらの関係すべてで評価する
+    coupling_assets = {name for r in cross_relations for name in r.get("involved_assets", []) if name in layout}
+    if movable is not None:
+        coupling_assets &= movable
+    coupling_relations = [r for r in relations if coupling_assets & set(r.get("involved_assets", []))]
+    print(f'  [Solver] 結合パス: {len(coupling_assets)}アセットを再最適化します')
+    coupling_progress = (lambda iteration, score: progress(max_iter + iteration, score)) if progress else None
+    layout = constraint_based_search(layout, lambda l: evaluate_relations(l, coupling_relations), max_iter, rng,
+                                     movable=coupling_assets, patience=patience, progress=coupling_progress,
+                                     progress_interval=progress_interval)
+    print(f'  [Solver] 最適化後のスコア (全リレーション): {evaluate_relations(layout, relations):.4f}')
+    return layout
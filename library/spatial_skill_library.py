@@ -80,6 +80,20 @@ SKILLS: Dict[str, callable] = {
     "symmetry": symmetry_score,
 }
 
+# exec で読み込んだ関数は inspect.getsource で取得できないため、学習済みスキルのソースコードはここに保持する
+LEARNED_SOURCES: Dict[str, str] = {}
+
+def _load_function(skill_name: str, source_code: str) -> callable:
+    """ソースコードを実行し、新たに定義されたスキルの関数 ("<スキル名>_score" または "<スキル名>") を取り出す。"""
+    # ヘルパー関数は参照できるよう、モジュールの名前空間の写しの中で実行する
+    namespace = dict(globals())
+    exec(source_code, namespace)
+    for function_name in (f"{skill_name}_score", skill_name):
+        function = namespace.get(function_name)
+        if callable(function) and function is not globals().get(function_name):
+            return function
+    raise KeyError(f"関数 '{skill_name}_score' が定義されていません")
+
 def initialize_skills():
     """
     【追加】プログラム起動時にデータベースから最新のスキルを読み込み、
@@ -88,41 +102,50 @@ def initialize_skills():
     learned_skills_code = skill_database.load_skills_from_db()
     if not learned_skills_code:
         return # データベースが空か、読み込めなかった場合は何もしない
+    load_learned_skills(learned_skills_code)
 
-    for skill_name, source_code in learned_skills_code.items():
+def load_learned_skills(sources: Dict[str, str], verbose: bool = True):
+    """
+    学習済みスキルのソースコードから関数を生成し、SKILLSを更新する。
+    ソルバーのワーカープロセスでは、親プロセスの LEARNED_SOURCES を渡して同じスキルをそろえる。
+    """
+    for skill_name, source_code in sources.items():
         try:
-            # 読み込んだ文字列のソースコードから、実行可能な関数オブジェクトを動的に生成
-            exec(source_code, globals())
-            # グローバルに生成された関数オブジェクトでSKILLSを更新
-            SKILLS[skill_name] = globals()[skill_name]
-            print(f"[Library] ℹ️ スキル '{skill_name}' が学習済みのバージョンに更新されました。")
+            # 読み込んだ文字列のソースコードから、実行可能な関数オブジェクトを動的に生成してSKILLSを更新
+            SKILLS[skill_name] = _load_function(skill_name, source_code)
+            LEARNED_SOURCES[skill_name] = source_code
+            if verbose:
+                print(f"[Library] ℹ️ スキル '{skill_name}' が学習済みのバージョンに更新されました。")
         except Exception as e:
             print(f"[Library] ❌ エラー: スキル '{skill_name}' の動的読み込みに失敗 - {e}")
 
 def get_skill_source(skill_name: str) -> str:
     """指定されたスキルのソースコードを取得する。(変更なし)"""
+    if skill_name in LEARNED_SOURCES:
+        return LEARNED_SOURCES[skill_name]
     if skill_name in SKILLS:
         return inspect.getsource(SKILLS[skill_name])
     return ""
 
-def update_skill(skill_name: str, new_function_code: str):
+def update_skill(skill_name: str, new_function_code: str) -> bool:
     """
     【修正】スキルライブラリの関数を動的に更新し、
-    その結果をデータベースに保存する。
+    その結果をデータベースに保存する。更新できたかどうかを返す。
     """
     try:
         # 1. メモリ上のスキルを更新
-        exec(new_function_code, globals())
-        new_func = globals()[skill_name]
-        SKILLS[skill_name] = new_func
+        SKILLS[skill_name] = _load_function(skill_name, new_function_code)
+        LEARNED_SOURCES[skill_name] = new_function_code
         print(f"[Library] ✔️ メモリ上のスキル '{skill_name}' が正常に更新されました。")
 
         # 2. データベースに保存
         # 現在の全スキルのソースコードを取得
-        current_skills_source = {name: inspect.getsource(func) for name, func in SKILLS.items()}
+        current_skills_source = {name: get_skill_source(name) for name in SKILLS}
         # データベースに保存
         skill_database.save_skills_to_db(current_skills_source)
+        return True
 
     except Exception as e:
         print(f"[Library] ❌ エラー: スキル '{skill_name}' の更新に失敗しました - {e}")
+        return False
 
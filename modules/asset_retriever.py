@@ -1,23 +1,21 @@
 # modules/asset_retriever.py
 import json
-import numpy as np
-from typing import Dict, List
+from typing import Dict, List, Optional
 from sentence_transformers import SentenceTransformer
 from utils.llm_utils import call_llm
 from utils.config import ASSET_MODEL
+from library.asset_index import AssetIndex
 
 # --- グローバル変数としてモデルとDBを一度だけロード ---
 print("[Asset Retriever] CLIPモデルとデータベースをロード中...")
 CLIP_MODEL = SentenceTransformer('clip-ViT-B-32')
 with open("library/asset_database.json", 'r', encoding='utf-8') as f:
     ASSET_DATABASE = json.load(f)
-# 高速な検索のために、ベクトルをNumpy配列に変換しておく
-for asset in ASSET_DATABASE:
-    asset['image_embedding'] = np.array(asset['image_embedding'])
-    asset['text_embedding'] = np.array(asset['text_embedding'])
+# 高速な検索のために、全アセットのベクトルをまとめてNumpyの行列に変換しておく
+ASSET_INDEX = AssetIndex.from_database(ASSET_DATABASE)
 print("[Asset Retriever] ✔️ ロード完了。")
 # ----------------------------------------------------
-def predict_asset_scales(assets_with_paths: Dict[str, str]) -> Dict[str, float]:
+def predict_asset_scales(assets_with_paths: Dict[str, Optional[str]]) -> Dict[str, float]:
     """
     【新規追加】LLMを使い、アセットの現実的な高さをメートル単位で予測する。
     """
@@ -59,34 +57,11 @@ def find_best_asset_with_reranking(query_description: str, top_k: int = 10) -> D
     """
     # 1. 検索クエリをベクトル化
     query_embedding = CLIP_MODEL.encode(query_description)
-    
-    # --- Stage 1: テキスト類似度による候補の絞り込み ---
-    text_scores = []
-    for asset in ASSET_DATABASE:
-        score = np.dot(query_embedding, asset['text_embedding'])
-        text_scores.append((score, asset))
-    
-    # スコアで降順にソートし、上位k件を取得
-    text_scores.sort(key=lambda x: x[0], reverse=True)
-    top_k_candidates = [asset for score, asset in text_scores[:top_k]]
 
-    if not top_k_candidates:
-        return None
-
-    # --- Stage 2: 画像類似度による再ランク付け (Re-ranking) ---
-    best_asset = None
-    highest_image_score = -1
-
-    print(f"    - テキスト検索で{len(top_k_candidates)}件の候補を発見。画像で再ランク付けを実行...")
-    for candidate_asset in top_k_candidates:
-        # 候補アセットの画像埋め込みとクエリのテキスト埋め込みで類似度を計算
-        image_score = np.dot(query_embedding, candidate_asset['image_embedding'])
-        
-        if image_score > highest_image_score:
-            highest_image_score = image_score
-            best_asset = candidate_asset
-            
-    return best_asset
+    # 2. テキスト類似度で上位k件に絞り込み、画像類似度で再ランク付け (library/asset_index.py)
+    print(f"    - テキスト検索で{min(top_k, len(ASSET_INDEX))}件の候補を発見。画像で再ランク付けを実行...")
+    best_index = ASSET_INDEX.search(query_embedding, top_k)
+    return ASSET_DATABASE[best_index] if best_index is not None else None
 
 def retrieve_assets(user_query: str) -> Dict[str, Dict]:
     """
@@ -107,17 +82,7 @@ def retrieve_assets(user_query: str) -> Dict[str, Dict]:
         print("  [Warning] LLMから有効なアセットリストを取得できませんでした。")
         return {}
 
-    retrieved_assets_paths = {}
-    print("✔️ 選定されたアセット:")
-    for asset_name, description in assets_to_find.items():
-        print(f"  - '{description}' を検索中...")
-        best_match = find_best_asset_with_reranking(description)
-        if best_match:
-            print(f"    ✅ 発見 (画像スコアで選定): {best_match['file_path']}")
-            retrieved_assets_paths[asset_name] = best_match['file_path']
-        else:
-            print(f"    ❌ 該当アセットが見つかりませんでした。")
-            retrieved_assets_paths[asset_name] = None
+    retrieved_assets_paths = search_assets(assets_to_find)
     
     # 取得したアセットのスケールを予測
     predicted_scales = predict_asset_scales(retrieved_assets_paths)
@@ -130,4 +95,19 @@ def retrieve_assets(user_query: str) -> Dict[str, Dict]:
             "height": predicted_scales.get(name, 1.0)
         }
         
-    return final_assets_info
\ No newline at end of file
+    return final_assets_info
+
+def search_assets(assets_to_find: Dict[str, str]) -> Dict[str, Optional[str]]:
+    """アセット名 -> 視覚的説明 から、データベースで最も一致するアセットのファイルパスを探す。見つからなければ None。"""
+    retrieved_assets_paths = {}
+    print("✔️ 選定されたアセット:")
+    for asset_name, description in assets_to_find.items():
+        print(f"  - '{description}' を検索中...")
+        best_match = find_best_asset_with_reranking(description)
+        if best_match:
+            print(f"    ✅ 発見 (画像スコアで選定): {best_match['file_path']}")
+            retrieved_assets_paths[asset_name] = best_match['file_path']
+        else:
+            print(f"    ❌ 該当アセットが見つかりませんでした。")
+            retrieved_assets_paths[asset_name] = None
+    return retrieved_assets_paths
\ No newline at end of file
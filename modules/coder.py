@@ -1,60 +1,39 @@
 # modules/coder.py
 from typing import List, Dict, Any
 
-def generate_evaluation_logic(scene_graph: Dict) -> str:
+from utils import asset_cache, config
+from library.layout import Layout
+
+def compile_relations(scene_graph: Dict) -> List[Dict]:
     """
-    シーングラフから、評価関数のロジック部分のみを生成する。
+    シーングラフから、Blender内の評価に使う関係のリストを作る。
+    スキル名は小文字にそろえ、関与するアセットと引数だけを残す (library/solver.score_relation の入力形式)。
     """
-    logic_parts = []
-    relations = scene_graph.get("relations", [])
-    if not relations:
-        return "    pass"
-
-    for relation in relations:
-        rel_type = relation.get("type", "").lower()
-        involved = relation.get('involved_assets', [])
-        args = relation.get("args", {})
-        
-        assets_to_pass = [f"current_assets['{name}']" for name in involved]
-        # 引数がない場合でも対応できるように修正
-        args_str = ", ".join([f"{k}='{v}'" if isinstance(v, str) else f"{k}={v}" for k, v in args.items()]) if args else ""
-
-        logic_parts.append(f"    # --- {rel_type} 関係の評価 ---")
-        func_call = ""
-        if len(assets_to_pass) > 1 and rel_type not in ["alignment", "parallelism", "symmetry"]:
-            func_call = f"SKILLS.get('{rel_type}')({assets_to_pass[0]}, {assets_to_pass[1]}, {args_str})"
-        else:
-            # 複数アセットの場合、args_strの前にカンマが必要かチェック
-            comma = ", " if args_str else ""
-            func_call = f"SKILLS.get('{rel_type}')([{', '.join(assets_to_pass)}]{comma}{args_str})"
-        
-        logic_parts.append(f"    if SKILLS.get('{rel_type}'):")
-        logic_parts.append(f"        total_score += {func_call}")
-        
-    return "\n".join(logic_parts)
-
-
-def generate_script_with_solver(scene_graph: Dict, assets_info: Dict[str, Dict], camera_settings: Dict[str, Any]) -> str:
+    return [
+        {"type": relation.get("type", "").lower(), "involved_assets": list(relation.get("involved_assets", [])),
+         "args": dict(relation.get("args") or {})}
+        for relation in scene_graph.get("relations", [])
+    ]
+
+def build_scene_payload(scene_graph: Dict, assets_info: Dict[str, Dict], camera_settings: Dict[str, Any],
+                        presolved_layout: Dict[str, Layout] = None) -> Dict[str, Any]:
     """
-    テンプレートを基に、最適化とレンダリングを行う完全なBlenderスクリプトを生成する。
+    Blenderのランナー (utils/blender_runner.py) に渡すシーンのペイロードを作る。
+    presolved_layout を渡した場合、Blender内では探索せずにそのレイアウトを適用する。
+    レンダリングの品質と出力先は、描画するたびに blender_env が付け加える。
     """
-    print("\n--- [Step 4] 💻 テンプレートベースのスクリプトを生成 ---")
-
-    try:
-        with open("templates/blender_script_template.py", "r", encoding="utf-8") as f:
-            template = f.read()
-    except FileNotFoundError:
-        print("❌ エラー: blender_script_template.py が templates/ ディレクトリに見つかりません。")
-        return ""
-
-    evaluation_logic = generate_evaluation_logic(scene_graph)
-
-    script = template.format(
-        asset_info=str(assets_info),
-        evaluation_logic=generate_evaluation_logic(scene_graph),
-        camera_location=str(camera_settings.get("location", [15, -20, 15])),
-        camera_look_at=f'"{camera_settings.get("look_at", "center")}"'
-    )
-    
-    print("✔️ テンプレートから完全なスクリプトが生成されました。")
-    return script
\ No newline at end of file
+    print("\n--- [Step 4] 💻 Blenderに渡すシーンのペイロードを作成 ---")
+
+    # キャッシュの保存先を付与し、Blender側で再インポートを省略できるようにする
+    assets_info = asset_cache.prepare_assets_info(assets_info)
+
+    payload = {
+        "assets": assets_info,
+        "relations": compile_relations(scene_graph),
+        "camera": {"location": list(camera_settings.get("location", [15, -20, 15])), "look_at": camera_settings.get("look_at", "center")},
+        "layout": {name: layout.to_dict() for name, layout in presolved_layout.items()} if presolved_layout else None,
+        "solver": {"max_iter": config.SOLVER_MAX_ITER, "seed": config.SOLVER_SEED,
+                   "progress_interval": config.BLENDER_SOLVER_PROGRESS_INTERVAL},
+    }
+    print(f"✔️ ペイロードを作成しました (アセット {len(assets_info)}件, 関係 {len(payload['relations'])}件)。")
+    return payload
@@ -0,0 +1,207 @@
+# modules/fused_planner.py
+"""
+Step 1-3 の統合: 1回の問い合わせによる計画 (Fused Planning)
+アセットのリストと高さ、シーンの分解、サブシーンごとのシーングラフを、スキーマで形式を指定した1回のLLM呼び出しで生成する。
+応答は項目ごとに検証し、不正な項目だけを従来の個別の問い合わせ (asset_retriever / decomposer / planner) で補う。
+"""
+from typing import Any, Dict, List, Optional
+
+from library.spatial_skill_library import SKILLS
+from modules import asset_retriever, decomposer
+from utils.llm_utils import call_llm
+from utils.config import FUSED_PLANNER_MODEL, FUSED_PLANNING_RESPONSE_FORMAT
+
+MAX_ASSET_HEIGHT = 1000.0 # これより高いアセットの高さ (m) は不正な値とみなす
+
+def response_schema(include_camera: bool) -> Dict[str, Any]:
+    """統合計画の応答のJSONスキーマ。"""
+    string_list = {"type": "array", "items": {"type": "string"}}
+    relation = {
+        "type": "object",
+        "properties": {"type": {"type": "string", "enum": list(SKILLS.keys())}, "involved_assets": string_list, "args": {"type": "object"}},
+        "required": ["type", "involved_assets", "args"],
+    }
+    properties = {
+        "assets": {"type": "array", "items": {
+            "type": "object",
+            "properties": {"name": {"type": "string"}, "description": {"type": "string"}, "height": {"type": "number"}},
+            "required": ["name", "description", "height"],
+        }},
+        "sub_scenes": {"type": "array", "items": {
+            "type": "object",
+            "properties": {"title": {"type": "string"}, "asset_list": string_list, "description": {"type": "string"},
+                           "relations": {"type": "array", "items": relation}},
+            "required": ["title", "asset_list", "description", "relations"],
+        }},
+    }
+    if include_camera:
+        properties["camera"] = {"type": "object", "properties": {"location": {"type": "array", "items": {"type": "number"}},
+                                                                 "look_at": {"type": "string"}}, "required": ["location", "look_at"]}
+    return {"type": "object", "properties": properties, "required": list(properties.keys())}
+
+def _response_format(include_camera: bool) -> Dict[str, Any]:
+    if FUSED_PLANNING_RESPONSE_FORMAT == "json_schema":
+        return {"type": "json_schema", "json_schema": {"name": "scene_plan", "schema": response_schema(include_camera)}}
+    return {"type": "json_object"}
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def validate_assets(raw: Any) -> Dict[str, Dict[str, Any]]:
+    """アセット名 -> {"description", "height"} を返す。説明のないアセットは捨て、不正な高さは None にする。"""
+    assets = {}
+    for item in raw if isinstance(raw, list) else []:
+        if not isinstance(item, dict) or not isinstance(item.get("name"), str) or not item["name"].strip():
+            continue
+        description = item.get("description")
+        if not isinstance(description, str) or not description.strip():
+            continue
+        height = item.get("height")
+        assets[item["name"]] = {"description": description,
+                                "height": float(height) if _is_number(height) and 0 < height <= MAX_ASSET_HEIGHT else None}
+    return assets
+
+def _relation_error(relation: Any, allowed: set) -> Optional[str]:
+    """関係が不正ならその理由を、正しければ None を返す。"""
+    if not isinstance(relation, dict) or not isinstance(relation.get("type"), str):
+        return "関係の形式が不正です"
+    if relation["type"].lower() not in SKILLS:
+        return f"未知の関係 '{relation['type']}'"
+    involved = relation.get("involved_assets")
+    if not isinstance(involved, list) or not involved:
+        return f"'{relation['type']}' に関与するアセットがありません"
+    unknown = [name for name in involved if not isinstance(name, str) or name not in allowed]
+    if unknown:
+        return f"'{relation['type']}' に使えないアセット {unknown} が含まれています"
+    if not isinstance(relation.get("args") or {}, dict):
+        return f"'{relation['type']}' の引数が不正です"
+    return None
+
+def validate_relations(raw: Any, allowed_assets: List[str]) -> Optional[List[Dict]]:
+    """
+    シーングラフの関係を検証する。
+    リストでない、または1つでも不正な関係がある場合は、不正な関係を表示して None を返す
+    (一部の関係だけを捨てると拘束の欠けたレイアウトになるため、そのサブシーンは個別に生成し直す)。
+    """
+    if not isinstance(raw, list):
+        return None
+    allowed = set(allowed_assets)
+    errors = [error for error in (_relation_error(relation, allowed) for relation in raw) if error]
+    if errors:
+        for error in errors:
+            print(f"  [FusedPlanner] [Warning] 不正な関係: {error}")
+        return None
+    return [{"type": relation["type"].lower(), "involved_assets": relation["involved_assets"], "args": relation.get("args") or {}}
+            for relation in raw]
+
+def validate_sub_scenes(raw: Any, asset_names: List[str], progressive: bool) -> Optional[List[Dict]]:
+    """
+    シーンの分解を検証する。分解そのものが不正 (リストでない、アセットを含まないステップがある) なら None。
+    シーングラフが不正なサブシーンは "relations" を持たない (planner で個別に生成する)。
+    progressive なら、前のステップまでのアセットを含む関係も正しいものとして扱う。
+    """
+    if not isinstance(raw, list) or not raw:
+        return None
+    known = set(asset_names)
+    sub_scenes, placed = [], []
+    for i, item in enumerate(raw):
+        if not isinstance(item, dict) or not isinstance(item.get("asset_list"), list):
+            return None
+        asset_list = [name for name in item["asset_list"] if isinstance(name, str) and name in known]
+        if not asset_list:
+            return None
+        title = item.get("title") if isinstance(item.get("title"), str) else f"Step {i+1}"
+        description = item.get("description") if isinstance(item.get("description"), str) else title
+        placed += [name for name in asset_list if name not in placed]
+        sub_scene = {"title": title, "asset_list": asset_list, "description": description}
+        relations = validate_relations(item.get("relations"), placed if progressive else asset_list)
+        if relations is None:
+            print(f"  [FusedPlanner] [Warning] ステップ {i+1} のシーングラフが不正なため、個別に生成します。")
+        else:
+            sub_scene["relations"] = relations
+        sub_scenes.append(sub_scene)
+    return sub_scenes
+
+def validate_camera(raw: Any) -> Optional[Dict[str, Any]]:
+    if (isinstance(raw, dict) and isinstance(raw.get("location"), list) and len(raw["location"]) == 3
+            and all(_is_number(c) for c in raw["location"]) and isinstance(raw.get("look_at"), str)):
+        return {"location": raw["location"], "look_at": raw["look_at"]}
+    return None
+
+def plan_query(user_query: str, progressive: bool, include_camera: bool = False) -> Dict[str, Any]:
+    """
+    1回の問い合わせでシーン全体を計画する。
+
+    Returns:
+        "assets": asset_retriever.retrieve_assets と同じ形式のアセット情報
+        "sub_scenes": decomposer.decompose_query と同じ形式のサブシーンのリスト。
+            シーングラフが正しく得られたサブシーンは "relations" を持つ。
+        "camera": include_camera の場合のカメラ設定 (不正なら None)
+        "fallback_calls": 不正な項目を補うために行った個別の問い合わせの数
+    """
+    print("\n--- [Step 1-3] 🧭 アセット選定・シーン分解・シーングラフを一括で計画 ---")
+    step_rule = ("各ステップの relations は、そのステップで追加するアセットが少なくとも1つ関与する関係だけにしてください。"
+                 "前のステップまでに配置したアセットとの関係を含めても構いません。" if progressive
+                 else "各ステップの relations は、そのステップの asset_list に含まれるアセットだけで構成してください。")
+    camera_rule = '''
+    - "camera": シーンを撮るカメラの設定。"location" はカメラの座標 [x, y, z]、"look_at" は注視するアセット名 (シーンの中心なら "center")。''' if include_camera else ""
+    prompt = f"""
+    以下のシーンを3Dで生成するための計画を、1つのJSONオブジェクトで出力してください。
+    シーン: "{user_query}"
+    利用可能な関係性の種類: {list(SKILLS.keys())}
+
+    JSONは以下のキーを持ちます:
+    - "assets": 必要なアセットのリスト。各要素は "name" (アセット名)、"description" (検索に使う詳細な視覚的説明)、
+      "height" (現実的な高さ、メートル単位。人間なら1.7、車なら1.5のような常識的な値) を持つ。
+    - "sub_scenes": 環境アセットから始め、徐々に詳細なアセットを追加する順序のステップのリスト。
+      各要素は "title" (ステップの概要)、"asset_list" (このステップで配置するアセット名のリスト)、
+      "description" (このステップ完了後の詳細な視覚的記述)、"relations" (アセット間の空間関係のリスト) を持つ。
+      {step_rule}{camera_rule}
+
+    出力形式の例:
+    ```json
+    {{
+        "assets": [{{ "name": "house1", "description": "...", "height": 8.0 }}, {{ "name": "lamp1", "description": "...", "height": 3.0 }}],
+        "sub_scenes": [
+            {{ "title": "...", "asset_list": ["house1"], "description": "...", "relations": [] }},
+            {{ "title": "...", "asset_list": ["lamp1"], "description": "...",
+               "relations": [{{ "type": "proximity", "involved_assets": ["lamp1", "house1"], "args": {{"min_dist": 1.0}} }}] }}
+        ]
+    }}
+    ```
+    """
+    response = call_llm(FUSED_PLANNER_MODEL, prompt, response_format=_response_format(include_camera))
+    response = response if isinstance(response, dict) else {}
+    fallback_calls = 0
+
+    # --- アセット: 説明が得られたものだけを検索し、高さが不正なものだけを予測し直す ---
+    assets = validate_assets(response.get("assets"))
+    if assets:
+        paths = asset_retriever.search_assets({name: asset["description"] for name, asset in assets.items()})
+        heights = {name: asset["height"] for name, asset in assets.items()}
+        missing_heights = [name for name, height in heights.items() if height is None]
+        if missing_heights:
+            print(f"  [FusedPlanner] [Warning] {len(missing_heights)}件のアセットの高さが不正なため、個別に予測します。")
+            predicted = asset_retriever.predict_asset_scales({name: paths[name] for name in missing_heights})
+            fallback_calls += 1
+            heights.update({name: predicted.get(name, 1.0) for name in missing_heights})
+        assets_info = {name: {"file_path": paths[name], "height": heights[name]} for name in assets}
+        sub_scenes = validate_sub_scenes(response.get("sub_scenes"), list(assets_info), progressive)
+    else:
+        # アセットの名前が変わるため、シーンの分解もやり直す
+        print("  [FusedPlanner] [Warning] アセットのリストが不正なため、アセット選定を個別に行います。")
+        assets_info = asset_retriever.retrieve_assets(user_query)
+        fallback_calls += 2
+        sub_scenes = None
+
+    # --- シーンの分解: 不正なら分解だけをやり直す (シーングラフはサブシーンごとに planner で生成する) ---
+    if sub_scenes is None:
+        print("  [FusedPlanner] [Warning] シーンの分解が不正なため、個別に分解します。")
+        sub_scenes = decomposer.decompose_query(user_query, list(assets_info.keys()))
+        fallback_calls += 1
+
+    camera = validate_camera(response.get("camera")) if include_camera else None
+    planned_graphs = sum(1 for sub_scene in sub_scenes if "relations" in sub_scene)
+    print(f"✔️ 一括計画が完了しました (アセット {len(assets_info)}件, ステップ {len(sub_scenes)}件, "
+          f"シーングラフ {planned_graphs}/{len(sub_scenes)}件, 補完の問い合わせ {fallback_calls}回)。")
+    return {"assets": assets_info, "sub_scenes": sub_scenes, "camera": camera, "fallback_calls": fallback_calls}
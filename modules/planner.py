@@ -3,21 +3,31 @@
 Step 3: シーングラフの構築 (Scene Graph Construction)
 論文の Section 2.2 に対応。
 """
-from typing import List, Dict
+from typing import List, Dict, Optional
 from utils.llm_utils import call_llm
 from utils.config import PLANNER_MODEL
 from library.spatial_skill_library import SKILLS
 
-def plan_scene_graph(sub_scene_description: str, asset_list: List[str]) -> Dict:
+def plan_scene_graph(sub_scene_description: str, asset_list: List[str], context_assets: Optional[List[str]] = None) -> Dict:
     """
     サブシーンの説明から、アセット間の空間関係を示すシーングラフを生成する。
+    context_assets を渡すと、それらは前のステップで配置済み (位置は固定) として扱い、
+    asset_list の新しいアセットが関与する関係だけを生成させる。
     """
     print("\n--- [Step 3] 🗺️ シーングラフ構築 ---")
     available_skills = list(SKILLS.keys())
+    context = ""
+    if context_assets:
+        context = f"""
+    配置済みのアセット (位置は固定): {context_assets}
+    新しいアセットが少なくとも1つ関与する関係だけを出力してください。配置済みのアセット同士の関係は不要です。
+    新しいアセットと配置済みのアセットの間の関係は含めて構いません。
+    """
     prompt = f"""
     以下の記述とアセットリストに基づき、3Dシーンのリレーショナル二部グラフをJSONで構築してください。
     シーン記述: "{sub_scene_description}"
     アセットリスト: {asset_list}
+    {context}
     
     利用可能な関係性の種類: {available_skills}
     
@@ -5,16 +5,26 @@ Step 5: レビューと修正 (Critic-and-Revise)
 """
 from utils.llm_utils import call_vision_llm, parse_llm_response_to_json
 from utils.config import REVIEWER_MODEL
-from typing import Dict, Any
+from utils.image_payload import ImagePayload
+from typing import Dict, Any, List
 
-def review_and_suggest_correction(sub_scene_description: str, base64_image: str, scene_graph: Dict) -> Dict[str, Any]:
+def review_and_suggest_correction(sub_scene_description: str, image: ImagePayload, scene_graph: Dict,
+                                  numeric_findings: List[str] = None, view_labels: List[str] = None) -> Dict[str, Any]:
     """
     レンダリング画像を評価し、問題点があればシーングラフの修正案をJSON形式で返す。
+    numeric_findings には数値検証 (verifier) で見つかった問題点を渡し、レビューの着眼点とする。
+    view_labels は画像が複数視点のコンタクトシートの場合の、各タイルの視点名 (左上から行ごとの順)。
     """
     print("\n--- [Step 5] 🧐 レビューと修正 (Inner-Loop) ---")
     
     # scene_graphをレビューしやすい形式に変換
     relations_str = "\n".join([f"- {r['type']} on {r['involved_assets']}" for r in scene_graph.get("relations", [])])
+    findings_str = "\n".join(f"- {finding}" for finding in numeric_findings) if numeric_findings else "- (なし)"
+    if view_labels and len(view_labels) > 1:
+        image_str = (f"提供された画像は、同じシーンを{len(view_labels)}つの視点から描画したタイルを並べたものです "
+                     f"(左上から順に: {', '.join(view_labels)})。すべての視点を見比べて、")
+    else:
+        image_str = "提供されたレンダリング画像が、"
 
     prompt = f"""
     あなたは3Dシーンのレビュアーです。
@@ -23,7 +33,10 @@ def review_and_suggest_correction(sub_scene_description: str, base64_image: str,
     現在のシーングラフの関係性:
     {relations_str}
 
-    提供されたレンダリング画像が、目的のシーンを正確に表現しているか評価してください。
+    数値検証で検出された問題の候補 (画像で確認してください):
+    {findings_str}
+
+    {image_str}目的のシーンを正確に表現しているか評価してください。
     もし問題があれば、シーングラフを修正するための**具体的な修正案を1つだけ**JSON形式で出力してください。
     問題がなければ、 "status": "OK" とだけ返してください。
 
@@ -55,9 +68,10 @@ def review_and_suggest_correction(sub_scene_description: str, base64_image: str,
       }}
     }}
     """
-    print("  GPT-4Vにレビューを依頼中...")
+    print(f"  GPT-4Vにレビューを依頼中... (画像 {image.width}x{image.height} {image.mime_type}, "
+          f"送信 {image.sent_bytes / 1024:.1f}KB / 元画像 {image.source_bytes / 1024:.1f}KB)")
     # VisionモデルはJSONモードを直接サポートしていない場合が多いため、レスポンスをパースする
-    response_text = call_vision_llm(REVIEWER_MODEL, prompt, base64_image) 
+    response_text = call_vision_llm(REVIEWER_MODEL, prompt, image.base64_data, image.mime_type)
     correction_suggestion = parse_llm_response_to_json(response_text)
 
     if correction_suggestion.get("status") == "revision_needed":
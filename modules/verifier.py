@@ -0,0 +1,121 @@
+# modules/verifier.py
+"""
+Step 5a: 数値による事前検証 (Numeric Pre-check)
+Visionモデルによるレビューの前に、解いたレイアウトをスキル関数と簡単な幾何チェックで採点する。
+シーングラフの関係をほぼ完全に満たし、重なり・画面外・浮遊のいずれもなければ
+Visionレビューを省略する。
+"""
+from typing import Any, Dict, List
+
+import numpy as np
+
+from library.layout import Layout
+from library.solver import score_relation
+from utils import config
+
+def _camera_target(layout: Dict[str, Layout], camera_settings: Dict[str, Any]) -> np.ndarray:
+    """ランナーと同じ規則で注視点を決める (look_at の座標かアセット、なければ最初のアセット)。"""
+    look_at = camera_settings.get("look_at")
+    if isinstance(look_at, (list, tuple)):
+        return np.array(look_at, dtype=float)
+    if look_at in layout:
+        return np.array(layout[look_at].location, dtype=float)
+    return np.array(next(iter(layout.values())).location, dtype=float)
+
+def find_out_of_frame(layout: Dict[str, Layout], heights: Dict[str, float], camera_settings: Dict[str, Any]) -> List[str]:
+    """カメラの視錐台に中心が入らないアセット名を返す。全アセットをまとめて射影する。"""
+    names = list(layout.keys())
+    camera = np.array(camera_settings.get("location", [15, -20, 15]), dtype=float)
+    forward = _camera_target(layout, camera_settings) - camera
+    if not np.linalg.norm(forward):
+        return []
+    forward /= np.linalg.norm(forward)
+    right = np.cross(forward, [0.0, 0.0, 1.0])
+    right = right / np.linalg.norm(right) if np.linalg.norm(right) else np.array([1.0, 0.0, 0.0])
+    up = np.cross(right, forward)
+
+    # Blenderの既定カメラ (センサー幅に合わせた画角) と最終レンダリングの縦横比
+    tier = config.RENDER_TIERS[config.FINAL_RENDER_TIER]
+    aspect = tier["resolution_y"] / tier["resolution_x"]
+    tan_half_x = (config.CAMERA_SENSOR_MM / 2) / config.CAMERA_LENS_MM
+    tan_half_y = tan_half_x * aspect
+
+    centers = np.array([layout[n].location for n in names], dtype=float)
+    centers[:, 2] += np.array([heights.get(n, 1.0) for n in names]) / 2
+    offsets = centers - camera
+    depth = offsets @ forward
+    safe_depth = np.where(depth > 1e-6, depth, 1e-6)
+    in_frame = (depth > 0) & (np.abs(offsets @ right) / safe_depth <= tan_half_x) & (np.abs(offsets @ up) / safe_depth <= tan_half_y)
+    return [n for n, ok in zip(names, in_frame) if not ok]
+
+def find_overlaps(layout: Dict[str, Layout], heights: Dict[str, float]) -> List[tuple]:
+    """高さから見積もった設置面の円同士が大きく重なっているアセットの組を返す。"""
+    names = list(layout.keys())
+    if len(names) < 2:
+        return []
+    xy = np.array([layout[n].location[:2] for n in names], dtype=float)
+    radii = np.array([heights.get(n, 1.0) for n in names]) * config.VERIFIER_FOOTPRINT_RATIO
+    distances = np.linalg.norm(xy[:, None, :] - xy[None, :, :], axis=-1)
+    limits = (radii[:, None] + radii[None, :]) * config.VERIFIER_OVERLAP_RATIO
+    i, j = np.where(np.triu(distances < limits, k=1))
+    return [(names[a], names[b]) for a, b in zip(i, j)]
+
+def find_floating(layout: Dict[str, Layout], heights: Dict[str, float]) -> List[str]:
+    """
+    浮いている、または埋まっているアセット名を返す。
+    各アセットの底面 (z) を、地面 (z=0) と、設置面の円が重なる他のアセットの上面のうち最も近いものと比べる
+    (他のアセットの上に載っているアセットは、そのアセットに支えられているとみなす)。
+    """
+    names = list(layout.keys())
+    if not names:
+        return []
+    locations = np.array([layout[n].location for n in names], dtype=float)
+    base = np.array([heights.get(n, 1.0) for n in names], dtype=float)
+    bottom = locations[:, 2]
+    top = bottom + base * np.array([layout[n].scale[2] for n in names], dtype=float)
+    radii = base * config.VERIFIER_FOOTPRINT_RATIO
+    distances = np.linalg.norm(locations[:, None, :2] - locations[None, :, :2], axis=-1)
+    supports = (distances < radii[:, None] + radii[None, :]) & ~np.eye(len(names), dtype=bool) # [i, j]: j が i の下にありうる
+    support_gap = np.where(supports, np.abs(bottom[:, None] - top[None, :]), np.inf).min(axis=1)
+    gap = np.minimum(np.abs(bottom), support_gap)
+    return [n for n, g in zip(names, gap) if g > config.VERIFIER_FLOAT_TOLERANCE]
+
+def verify_layout(scene_graph: Dict, layout: Dict[str, Layout], assets_info: Dict[str, Dict], camera_settings: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    解いたレイアウトを数値的に検証する。
+
+    Returns:
+        "verdict": "pass" (Visionレビュー不要) / "uncertain" / "fail"
+        "relation_scores": 各リレーションのスコア (0〜1)
+        "issues": 見つかった問題点の説明 (レビューのヒントとして使う)
+    """
+    print("\n--- [Step 5a] 📐 数値による事前検証 ---")
+    heights = {name: float(info.get("height", 1.0) or 1.0) for name, info in assets_info.items()}
+    issues = []
+
+    relation_scores = []
+    for relation in scene_graph.get("relations", []):
+        score = float(np.clip(score_relation(relation, layout), 0.0, 1.0))
+        relation_scores.append({"type": relation.get("type"), "involved_assets": relation.get("involved_assets", []), "score": round(score, 4)})
+        if score < config.VERIFIER_PASS_SCORE:
+            issues.append(f"Relation '{relation.get('type')}' on {relation.get('involved_assets')} is only satisfied at {score:.2f}.")
+    min_score = min((r["score"] for r in relation_scores), default=1.0)
+
+    geometric_issues = []
+    if layout:
+        geometric_issues += [f"'{a}' and '{b}' overlap." for a, b in find_overlaps(layout, heights)]
+        geometric_issues += [f"'{n}' is outside the camera frame." for n in find_out_of_frame(layout, heights, camera_settings)]
+        geometric_issues += [f"'{n}' is floating above or sunk into the ground or the asset below it." for n in find_floating(layout, heights)]
+    issues += geometric_issues
+
+    if geometric_issues or min_score < config.VERIFIER_PASS_SCORE - config.VERIFIER_UNCERTAINTY_BAND:
+        verdict = "fail"
+    elif min_score < config.VERIFIER_PASS_SCORE:
+        verdict = "uncertain"
+    else:
+        verdict = "pass"
+
+    print(f"  ✔️ 判定: {verdict} (最低リレーションスコア {min_score:.2f}, 幾何チェックの問題 {len(geometric_issues)}件)")
+    for issue in issues:
+        print(f"    - {issue}")
+    return {"verdict": verdict, "relation_scores": relation_scores, "min_relation_score": min_score, "issues": issues}
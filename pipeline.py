@@ -0,0 +1,406 @@
+# pipeline.py
+"""
+サブシーンの自己改善ループ (レンダリング→レビュー→修正) をパイプライン化して実行する。
+論文の Section 2.3 の Inner-Loop に対応。
+
+各サブシーンはスケジューラのジョブとして並列に進むため、あるサブシーンがレビュー待ちの間に
+別のサブシーンがレンダリングされる。さらにレビュー待ちの間は、空いているBlenderで
+「レビューがOKだった場合の最終レンダリング」と「最も起こりやすい修正後のシーン」を先回りして解き、
+レンダリングキャッシュに入れておく。予測が当たれば次のステップはBlenderを待たずに進む。
+"""
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from library import camera_solver, history_store, layout_store, solver
+from library.layout import Layout, save_layouts
+from modules import coder, reviewer, verifier
+from utils import blender_env, config, image_payload, profiling
+from utils.checkpoint import StageTimings
+from utils.render_cache import RenderCache, render_cache_key
+from utils.scheduler import JobContext, JobScheduler
+
+def apply_revision(scene_graph: Dict, correction: Dict) -> List[str]:
+    """
+    レビューの修正案をシーングラフに適用する。
+
+    Returns:
+        修正された関係に含まれるアセット名のリスト。適用できなかった場合は空のリスト。
+    """
+    change = correction.get("suggested_change") or {}
+    target = correction.get("target_relation") or {}
+    if change.get("action") == "update_args":
+        for relation in scene_graph.get("relations", []):
+            if relation["type"] == target.get("type") and \
+               set(relation["involved_assets"]) == set(target.get("involved_assets", [])):
+                print(f"    - Relation '{target['type']}' の引数を {relation.get('args', {})} から {change['new_args']} に更新。")
+                relation.setdefault("args", {}).update(change["new_args"]) # updateメソッドで引数を更新
+                return list(relation["involved_assets"])
+    return []
+
+class RefinementPipeline:
+    """
+    複数サブシーンの自己改善ループを、Blender (レンダースロット) とVision APIの両方が
+    遊ばないように進めるエンジン。
+    """
+    def __init__(self, scheduler: JobScheduler, cache: RenderCache, num_refinement_steps: int = 2):
+        self.scheduler = scheduler
+        self.cache = cache
+        self.num_refinement_steps = num_refinement_steps
+        # 投機的な処理用のワーカー。空きスロットがある時だけBlenderを使う
+        self._speculation = ThreadPoolExecutor(max_workers=scheduler.render_pool.capacity)
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {} # レンダリング中のキャッシュキー -> Future
+        self._speculated_keys = set() # 先回りでレンダリングしたキャッシュキー
+        self._solved: Dict[str, Dict[str, Layout]] = {} # シーングラフ -> 解いたレイアウト
+        self._speculated_graphs = set() # 先回りで解いたシーングラフ
+        self._revision_counts = Counter() # (関係の種類, 新しい引数) -> これまでの出現回数
+        self.stage_timings = StageTimings() # ホスト側の求解とBlender内の処理段階ごとの所要時間
+        self.stats = Counter()
+
+    # --- レイアウトの求解 ---
+    @staticmethod
+    def _graph_key(scene_graph: Dict, asset_names: List[str], previous_layout: Optional[Dict[str, Layout]] = None,
+                   changed_assets: Optional[List[str]] = None) -> str:
+        previous = {name: layout.to_dict() for name, layout in previous_layout.items()} if previous_layout else None
+        return json.dumps([scene_graph.get("relations", []), sorted(asset_names), previous, sorted(changed_assets or [])],
+                          sort_keys=True, default=str)
+
+    def solve(self, scene_graph: Dict, asset_names: List[str], previous_layout: Optional[Dict[str, Layout]] = None,
+              changed_assets: Optional[List[str]] = None) -> Dict[str, Layout]:
+        """
+        シーングラフを解く。先回りで同じグラフを解いていれば、その結果を再利用する。
+        previous_layout を渡した場合は、そこからウォームスタートして changed_assets だけを動かす。
+        """
+        key = self._graph_key(scene_graph, asset_names, previous_layout, changed_assets)
+        with self._lock:
+            if key in self._solved:
+                if key in self._speculated_graphs:
+                    self.stats["solve_reused"] += 1
+                return {name: layout.copy() for name, layout in self._solved[key].items()}
+        profile_path = None
+        if config.BLENDER_PROFILE_SOLVER:
+            profile_dir = os.path.join(config.JOB_SCRATCH_DIR, "solver_profiles")
+            os.makedirs(profile_dir, exist_ok=True)
+            profile_path = os.path.join(profile_dir, f"{hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]}.prof")
+        layout, metrics = profiling.run_measured(
+            lambda progress: self._solve_uncached(scene_graph, asset_names, previous_layout, changed_assets, progress),
+            "solve", profile_path)
+        self._record_metrics(metrics)
+        if metrics["solver_progress"]:
+            last = metrics["solver_progress"][-1]
+            print(f"  [Solver] ⏱️ {metrics['stages']['solve']:.2f}s, {last['iteration']}回の反復, {last['iterations_per_sec']} it/s")
+        if metrics["profile_path"]:
+            print(f"  [Solver] ソルバーのプロファイルを '{metrics['profile_path']}' に保存しました。")
+        with self._lock:
+            self._solved[key] = layout
+        return {name: l.copy() for name, l in layout.items()}
+
+    @staticmethod
+    def _solve_uncached(scene_graph: Dict, asset_names: List[str], previous_layout: Optional[Dict[str, Layout]],
+                        changed_assets: Optional[List[str]], progress: Callable[[int, float], None]) -> Dict[str, Layout]:
+        """レイアウトストアを参照してからソルバーを実行する。progress にはソルバーの進捗が渡される。"""
+        if previous_layout:
+            kind, layout = ("miss", None)
+            if config.LAYOUT_STORE_ENABLED:
+                kind, layout = layout_store.get_layout_store().lookup(scene_graph, asset_names, exact_only=True)
+            if kind != "exact":
+                layout = solver.solve_scene_graph(scene_graph, asset_names, seed=config.SOLVER_SEED,
+                                                  max_iter=config.SOLVER_WARM_START_MAX_ITER, previous_layout=previous_layout,
+                                                  changed_assets=changed_assets, patience=config.SOLVER_WARM_START_PATIENCE,
+                                                  max_cluster_size=config.SOLVER_MAX_CLUSTER_SIZE, workers=config.SOLVER_WORKERS,
+                                                  progress=progress, progress_interval=config.BLENDER_SOLVER_PROGRESS_INTERVAL)
+                if config.LAYOUT_STORE_ENABLED:
+                    layout_store.get_layout_store().put(scene_graph, asset_names, layout)
+        else:
+            layout = layout_store.solve_with_store(scene_graph, asset_names, seed=config.SOLVER_SEED, max_iter=config.SOLVER_MAX_ITER,
+                                                   warm_max_iter=config.SOLVER_WARM_START_MAX_ITER,
+                                                   warm_patience=config.SOLVER_WARM_START_PATIENCE, progress=progress,
+                                                   progress_interval=config.BLENDER_SOLVER_PROGRESS_INTERVAL)
+        return layout
+
+    @staticmethod
+    def _solve_inputs(sub_scene_data: Dict, changed_assets: Optional[List[str]]) -> Tuple[Optional[Dict[str, Layout]], Optional[List[str]]]:
+        """
+        再求解の開始点と動かすアセットを決める。
+        ウォームスタートが有効なら、サブシーンの現在のレイアウトを前回の最適解として使う。
+        前のステップから引き継いだアセット (frozen_assets) は、ウォームスタートの有無によらず動かさない。
+        """
+        previous_layout = sub_scene_data.get("layout") if config.SOLVER_WARM_START else None
+        frozen = set(sub_scene_data.get("frozen_assets", []))
+        if frozen:
+            if previous_layout is None:
+                previous_layout = {name: l for name, l in sub_scene_data["layout"].items() if name in frozen}
+            changed_assets = [name for name in changed_assets or [] if name not in frozen]
+        return previous_layout, changed_assets
+
+    def _prepare(self, sub_scene_data: Dict, scene_graph: Dict, changed_assets: Optional[List[str]] = None) -> Dict:
+        """シーングラフを解き、レイアウトとBlenderに渡すペイロードを持つサブシーンのスナップショットを作る。"""
+        previous_layout, changed_assets = self._solve_inputs(sub_scene_data, changed_assets)
+        layout = self.solve(scene_graph, sub_scene_data["asset_list"], previous_layout, changed_assets)
+        prepared = dict(sub_scene_data)
+        prepared["scene_graph"] = scene_graph
+        prepared["layout"] = layout
+        if config.CAMERA_SOLVER_ENABLED:
+            # 配置が変わったら、カメラも新しいレイアウトに合わせて決め直す
+            prepared["camera_settings"] = camera_solver.solve_camera(layout, sub_scene_data["assets_info"], sub_scene_data.get("camera_hint"))
+        prepared["payload"] = coder.build_scene_payload(scene_graph, sub_scene_data["assets_info"],
+                                                        prepared["camera_settings"], presolved_layout=layout)
+        return prepared
+
+    # --- レンダリング ---
+    @staticmethod
+    def _views(render_tier: str) -> Optional[List[Dict]]:
+        """レビュー用のレンダリングだけを複数視点のコンタクトシートにする。"""
+        if config.REVIEW_MULTI_VIEW and render_tier == config.REVIEW_RENDER_TIER:
+            return config.REVIEW_VIEWS
+        return None
+
+    def _render_key(self, sub_scene_data: Dict, render_tier: str) -> str:
+        return render_cache_key(sub_scene_data["layout"], sub_scene_data["assets_info"], sub_scene_data["camera_settings"], render_tier,
+                                self._views(render_tier))
+
+    def _record_metrics(self, metrics: Dict):
+        """処理段階ごとの所要時間 (profiling.parse_metrics / run_measured の計測記録) を集計に加える。"""
+        for stage, seconds in metrics.get("stages", {}).items():
+            self.stage_timings.record(stage, seconds)
+
+    def render(self, ctx: JobContext, sub_scene_data: Dict, render_tier: str, keep_path: Optional[str] = None) -> Optional[bytes]:
+        """
+        サブシーンの現在のペイロードをレンダリングする。
+        キャッシュにあればBlenderを起動せず、先回りのレンダリングが実行中ならその完了を待って使う。
+        """
+        key = self._render_key(sub_scene_data, render_tier)
+        with self._lock:
+            inflight = self._inflight.get(key)
+        if inflight:
+            print(f"  [Pipeline] ⏳ 先回りで実行中のレンダリング ({render_tier}) を待機します。")
+            inflight.result()
+
+        image_bytes = self.cache.get(key)
+        if image_bytes:
+            print(f"  [RenderCache] ⚡ キャッシュヒット ({render_tier})。レンダリングを省略します。")
+            with self._lock:
+                if key in self._speculated_keys:
+                    self._speculated_keys.discard(key)
+                    self.stats["render_used"] += 1
+        else:
+            metrics = {}
+            with ctx.render():
+                image_bytes = blender_env.render_to_bytes(sub_scene_data["payload"], "assets", render_tier=render_tier,
+                                                          scratch_dir=ctx.scratch_dir, threads=self.scheduler.render_threads,
+                                                          metrics=metrics, views=self._views(render_tier))
+            self._record_metrics(metrics)
+            self.cache.put(key, image_bytes)
+
+        if image_bytes and keep_path:
+            with open(keep_path, "wb") as f:
+                f.write(image_bytes)
+        return image_bytes
+
+    def _speculative_render(self, ctx: JobContext, sub_scene_data: Dict, render_tier: str):
+        """空きのレンダースロットがある場合のみ、結果をキャッシュに入れるためだけのレンダリングを行う。"""
+        key = self._render_key(sub_scene_data, render_tier)
+        scene_payload = sub_scene_data["payload"] # 後でサブシーンが更新されても、予約時点のペイロードを描画する
+        with self._lock:
+            if key in self._inflight:
+                return
+            future = Future()
+            self._inflight[key] = future
+
+        def task():
+            try:
+                if self.cache.contains(key):
+                    return
+                with self.scheduler.render_pool.try_acquire() as acquired:
+                    if not acquired:
+                        return # 本来のジョブを優先する
+                    with self._lock:
+                        self.stats["render_started"] += 1
+                    scratch_dir = os.path.join(ctx.scratch_dir, "speculative", key[:12])
+                    metrics = {}
+                    image_bytes = blender_env.render_to_bytes(scene_payload, "assets", render_tier=render_tier,
+                                                              scratch_dir=scratch_dir, threads=self.scheduler.render_threads,
+                                                              metrics=metrics, views=self._views(render_tier))
+                self._record_metrics(metrics)
+                self.cache.put(key, image_bytes)
+                if image_bytes:
+                    with self._lock:
+                        self._speculated_keys.add(key)
+            finally:
+                with self._lock:
+                    self._inflight.pop(key, None)
+                future.set_result(None)
+
+        self._speculation.submit(task)
+
+    def _predict_revision(self, scene_graph: Dict) -> Optional[Dict]:
+        """
+        これまでの修正履歴で最も多かった update_args を、現在のシーングラフの該当する関係に当てはめる。
+        """
+        with self._lock:
+            ranked = self._revision_counts.most_common()
+        for (rel_type, new_args_json), _ in ranked:
+            for relation in scene_graph.get("relations", []):
+                if relation.get("type") == rel_type:
+                    new_args = json.loads(new_args_json)
+                    if all(relation.get("args", {}).get(k) == v for k, v in new_args.items()):
+                        continue # 既にその引数になっている
+                    return {
+                        "target_relation": {"type": rel_type, "involved_assets": relation["involved_assets"]},
+                        "suggested_change": {"action": "update_args", "new_args": new_args},
+                    }
+        return None
+
+    def _speculate(self, ctx: JobContext, sub_scene_data: Dict):
+        """レビューの待ち時間を使い、次に必要になりそうなレンダリングを先に済ませておく。"""
+        if config.PIPELINE_SPECULATIVE_FINAL_RENDER:
+            self._speculative_render(ctx, sub_scene_data, config.FINAL_RENDER_TIER)
+        if config.PIPELINE_SPECULATIVE_REVISION:
+            predicted = self._predict_revision(sub_scene_data["scene_graph"])
+            if predicted:
+                # レビュー結果でサブシーンが書き換わる前の状態を渡す
+                base = dict(sub_scene_data)
+                scene_graph = copy.deepcopy(sub_scene_data["scene_graph"])
+
+                def task():
+                    changed_assets = apply_revision(scene_graph, predicted)
+                    if changed_assets:
+                        previous_layout, movable = self._solve_inputs(base, changed_assets)
+                        with self._lock:
+                            self.stats["solve_started"] += 1
+                            self._speculated_graphs.add(self._graph_key(scene_graph, base["asset_list"], previous_layout, movable))
+                        self._speculative_render(ctx, self._prepare(base, scene_graph, changed_assets), config.REVIEW_RENDER_TIER)
+                self._speculation.submit(task)
+
+    # --- 自己改善ループ ---
+    def refine(self, ctx: JobContext, sub_scene_data: Dict) -> List[Dict]:
+        """
+        1つのサブシーンについて、レンダリング→レビュー→修正の自己改善ループを実行する。
+
+        Returns:
+            このサブシーンで発生した修正履歴のリスト。
+        """
+        refinement_history = []
+        title = sub_scene_data["title"]
+
+        save_layouts(ctx.output_path("layout.json"), sub_scene_data["layout"], scene_graph=sub_scene_data["scene_graph"])
+        for step in range(self.num_refinement_steps):
+            print(f"\n>>> [{ctx.job_id}] サブシーン '{title}' の自己改善ループ {step + 1}/{self.num_refinement_steps}")
+            scene_graph = sub_scene_data["scene_graph"]
+
+            # 0. 数値検証で十分に制約を満たしていれば、レンダリングもVisionレビューも省略する
+            findings = None
+            if config.VERIFIER_ENABLED:
+                verification = verifier.verify_layout(scene_graph, sub_scene_data["layout"], sub_scene_data["assets_info"],
+                                                      sub_scene_data["camera_settings"])
+                sub_scene_data["verification"] = verification
+                if verification["verdict"] == "pass":
+                    with self._lock:
+                        self.stats["review_skipped"] += 1
+                    print("  [Verifier] 数値検証に合格したため、Visionレビューを省略してこのサブシーンの処理を完了します。")
+                    break
+                findings = verification["issues"]
+
+            # a. ペイロードをBlenderで処理してレンダリング (レビュー用の軽量ティア)
+            # 原寸画像は設定で指定された場合のみ残し、通常はメモリ上で縮小・再エンコードして送る
+            keep_path = ctx.output_path(f"rendered_image_step{step}.png") if config.REVIEW_KEEP_FULL_RESOLUTION else None
+            image_bytes = self.render(ctx, sub_scene_data, config.REVIEW_RENDER_TIER, keep_path)
+            if not image_bytes:
+                print("  [Warning] レンダリング画像を取得できなかったため、レビューをスキップします。")
+                continue
+            payload = image_payload.build_image_payload(image_bytes)
+            sub_scene_data.setdefault("review_bytes_sent", []).append(payload.sent_bytes)
+
+            # b. レビューと修正案の取得 (待っている間に先回りのレンダリングを進める)
+            self._speculate(ctx, sub_scene_data)
+            with ctx.review():
+                view_labels = [blender_env.view_label(view) for view in self._views(config.REVIEW_RENDER_TIER) or []]
+                correction = reviewer.review_and_suggest_correction(title, payload, scene_graph, findings, view_labels)
+            with self._lock:
+                self.stats["review_requested"] += 1
+
+            # c. 修正案に基づき、シーングラフを更新してペイロードを作り直す
+            if correction.get("status") == "revision_needed":
+                print("  [Planner] 修正案に基づき、シーングラフを更新します。")
+                revision = {
+                    "sub_scene": title,
+                    "timestamp": time.time(),
+                    "feedback": correction.get("feedback"),
+                    "original_graph": copy.deepcopy(scene_graph),
+                    "target_relation": correction.get("target_relation"),
+                    "change": correction.get("suggested_change"),
+                }
+                refinement_history.append(revision)
+                # Outer-Loop が実行をまたいで学習できるよう、修正はその場で履歴ストアに追記する
+                if config.HISTORY_STORE_ENABLED:
+                    history_store.get_history_store().record(revision)
+
+                # --- シーングラフの修正ロジック ---
+                new_graph = copy.deepcopy(scene_graph)
+                changed_assets = apply_revision(new_graph, correction)
+                if changed_assets:
+                    change = correction["suggested_change"]
+                    with self._lock:
+                        self._revision_counts[(correction["target_relation"]["type"], json.dumps(change["new_args"], sort_keys=True))] += 1
+                sub_scene_data.update(self._prepare(sub_scene_data, new_graph, changed_assets))
+                # 次の修正でウォームスタートできるよう、解いたレイアウトをサブシーンごとに保存する
+                save_layouts(ctx.output_path("layout.json"), sub_scene_data["layout"], scene_graph=new_graph)
+            else:
+                print("  [Reviewer] 修正は不要と判断されました。このサブシーンの処理を完了します。")
+                break
+
+        # d. 採用されたペイロードのみ最終品質でレンダリング
+        final_image_path = ctx.output_path("final.png")
+        self.render(ctx, sub_scene_data, config.FINAL_RENDER_TIER, keep_path=final_image_path)
+        sub_scene_data["final_image_path"] = final_image_path
+        return refinement_history
+
+    def run(self, processed_sub_scenes: List[Dict], job_prefix: str = "subscene") -> List[Dict]:
+        """全サブシーンの自己改善ループを並列に実行し、修正履歴をまとめて返す。"""
+        jobs = [
+            (f"{job_prefix}{i+1}", lambda ctx, data=sub_scene_data: self.refine(ctx, data))
+            for i, sub_scene_data in enumerate(processed_sub_scenes)
+        ]
+        refinement_history = []
+        for history in self.scheduler.run(jobs):
+            refinement_history.extend(history)
+        return refinement_history
+
+    def shutdown(self):
+        """実行中の先回り処理の完了を待つ。"""
+        self._speculation.shutdown(wait=True)
+
+    def report(self, processed_sub_scenes: List[Dict]):
+        review_bytes = [n for data in processed_sub_scenes for n in data.get("review_bytes_sent", [])]
+        if review_bytes:
+            print(f"  [Reviewer] 📦 レビュー {len(review_bytes)}回, 送信画像 合計 {sum(review_bytes) / 1024:.1f}KB "
+                  f"(平均 {sum(review_bytes) / len(review_bytes) / 1024:.1f}KB/回)")
+
+        cache_stats = self.cache.stats()
+        print(f"  [RenderCache] 📊 ヒット {cache_stats['hits']}/{cache_stats['hits'] + cache_stats['misses']} "
+              f"(ヒット率 {cache_stats['hit_rate'] * 100:.0f}%), 保存数 {cache_stats['entries']}")
+
+        stages = self.stage_timings.summary()
+        if stages:
+            print("  [Pipeline] ⏱️ 処理段階ごとの所要時間: " + ", ".join(
+                f"{stage} p50 {stats['p50']:.2f}s / p95 {stats['p95']:.2f}s" for stage, stats in stages.items()))
+
+        spec = self.stats
+        if config.LAYOUT_STORE_ENABLED:
+            store_stats = layout_store.get_layout_store().stats
+            near_detail = ""
+            if store_stats["near"]:
+                near_detail = (f" (平均類似度 {store_stats['near_similarity'] / store_stats['near']:.2f}, "
+                               f"配置を引き継いだアセット {store_stats['near_matched_slots']}/{store_stats['near_slots']})")
+            print(f"  [LayoutStore] 🗂️ 完全一致 {store_stats['exact']}回, 部分一致 {store_stats['near']}回{near_detail}, "
+                  f"該当なし {store_stats['miss']}回")
+        print(f"  [Verifier] 🧮 Visionレビュー {spec['review_requested']}回, 数値検証により省略 {spec['review_skipped']}回")
+        print(f"  [Pipeline] 🔮 先回りレンダリング {spec['render_started']}回 (採用 {spec['render_used']}回), "
+              f"先回りの求解 {spec['solve_started']}回 (採用 {spec['solve_reused']}回)")
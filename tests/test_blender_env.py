@@ -0,0 +1,68 @@
+import os
+import sys
+import textwrap
+
+import pytest
+
+from utils import blender_env, config, profiling
+
+# ランナーの代わりに起動する偽のBlender。ジョブの "mode" に応じて完了・停止・異常終了する
+FAKE_BLENDER = textwrap.dedent(f"""\
+    #!{sys.executable}
+    import json, sys, time
+
+    def run(job):
+        if job["mode"] == "hang":
+            time.sleep(60)
+        if job["mode"] == "crash":
+            sys.exit(1)
+        print("rendered", flush=True)
+
+    args = sys.argv[sys.argv.index("--") + 1:]
+    if args[0] == "--serve":
+        for line in sys.stdin:
+            run(json.loads(line))
+            print({profiling.METRIC_PREFIX!r} + json.dumps({{"type": "job_done", "ok": True}}), flush=True)
+    else:
+        with open(args[0]) as f:
+            run(json.load(f))
+""")
+
+@pytest.fixture
+def fake_blender(tmp_path, monkeypatch):
+    path = tmp_path / "blender"
+    path.write_text(FAKE_BLENDER)
+    os.chmod(path, 0o755)
+    monkeypatch.setattr(blender_env, "BLENDER_PATH", str(path))
+    monkeypatch.setattr(config, "BLENDER_TIMEOUT", 2)
+    return path
+
+def test_worker_processes_jobs_until_closed(fake_blender):
+    worker = blender_env.BlenderWorker(threads=1)
+    try:
+        for _ in range(2):
+            ok, output = worker.run({"mode": "ok"}, timeout=10)
+            assert ok and "rendered" in output
+        assert worker.alive
+    finally:
+        worker.close()
+    assert not worker.alive
+
+def test_worker_is_killed_when_a_job_times_out(fake_blender):
+    worker = blender_env.BlenderWorker(threads=1)
+    ok, output = worker.run({"mode": "hang"}, timeout=0.5)
+    assert not ok and "0.5秒" in output
+    assert not worker.alive
+    blender_env._release_worker(worker)
+    assert worker not in blender_env._idle_workers.get(1, [])
+
+def test_worker_reports_failure_when_blender_exits(fake_blender):
+    worker = blender_env.BlenderWorker(threads=1)
+    ok, output = worker.run({"mode": "crash"}, timeout=10)
+    assert not ok and "終了コード 1" in output
+    assert not worker.alive
+
+def test_run_job_once_times_out(fake_blender, tmp_path):
+    ok, output = blender_env._run_job_once({"mode": "hang"}, str(tmp_path), threads=1)
+    assert not ok and "2秒" in output
+    assert not (tmp_path / "blender_job.json").exists()
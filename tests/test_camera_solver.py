@@ -0,0 +1,36 @@
+import numpy as np
+
+from library.camera_solver import DEFAULT_CAMERA, candidate_poses, score_poses, solve_camera
+from library.layout import Layout
+from modules.verifier import find_out_of_frame
+
+def _layout(positions):
+    return {name: Layout(location=position, orientation=(0, 0, 0), scale=(1, 1, 1)) for name, position in positions.items()}
+
+def test_solve_camera_frames_every_asset():
+    layout = _layout({"house_1": (0, 0, 0), "tree_1": (12, 3, 0), "lamp_1": (-6, -8, 0), "car_1": (4, 10, 0)})
+    heights = {"house_1": 8.0, "tree_1": 6.0, "lamp_1": 3.0, "car_1": 1.5}
+    camera = solve_camera(layout, {name: {"height": h} for name, h in heights.items()})
+    assert len(camera["look_at"]) == 3
+    assert find_out_of_frame(layout, heights, camera) == []
+
+def test_solve_camera_without_assets_uses_default():
+    assert solve_camera({}, {}) == DEFAULT_CAMERA
+
+def test_score_poses_penalizes_candidates_that_cut_off_assets():
+    centers = np.array([[0.0, 0.0, 1.0], [10.0, 0.0, 1.0]])
+    half_extents = np.ones_like(centers)
+    target = centers.mean(axis=0)
+    near, far = candidate_poses(target, 30.0, 1, [30.0], [0.2, 1.0])
+    results = score_poses(np.stack([near, far]), target, centers, half_extents, 0.4, 0.3)
+    assert results["coverage"][1] == 1.0 and results["coverage"][0] < 1.0
+    assert results["score"][1] > results["score"][0]
+
+def test_score_poses_prefers_hint_direction():
+    centers = np.array([[0.0, 0.0, 1.0]])
+    half_extents = np.ones_like(centers)
+    target = centers[0]
+    cameras = candidate_poses(target, 20.0, 4, [30.0], [1.0])
+    hint = (cameras[1] - target) / np.linalg.norm(cameras[1] - target)
+    results = score_poses(cameras, target, centers, half_extents, 0.4, 0.3, preferred_direction=hint)
+    assert int(np.argmax(results["score"])) == 1
@@ -0,0 +1,42 @@
+from library.layout import Layout
+from utils.checkpoint import NullCheckpoint, StageCheckpoint, StageTimings
+
+def test_stage_resumes_from_saved_result(tmp_path):
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {"assets": ["house_1"]}
+
+    timings = StageTimings()
+    first = StageCheckpoint(str(tmp_path / "q1"), timings)
+    assert first.stage("retrieve", compute) == {"assets": ["house_1"]}
+    # 同じディレクトリで再開すると、保存済みのステージは計算し直さない
+    resumed = StageCheckpoint(str(tmp_path / "q1"), timings)
+    assert resumed.stage("retrieve", compute) == {"assets": ["house_1"]}
+    assert len(calls) == 1
+    assert timings.summary()["retrieve"]["count"] == 1
+    assert not list((tmp_path / "q1").glob("*.tmp"))
+
+def test_stage_encodes_values_that_are_not_json(tmp_path):
+    checkpoint = StageCheckpoint(str(tmp_path / "q1"))
+    encode = lambda layout: {name: l.to_dict() for name, l in layout.items()}
+    decode = lambda value: {name: Layout.from_dict(data) for name, data in value.items()}
+    layout = {"house_1": Layout(location=(1.0, 2.0, 0.0), orientation=(0, 0, 90), scale=(1, 1, 1))}
+    checkpoint.stage("layout_1", lambda: layout, encode, decode)
+    restored = checkpoint.stage("layout_1", lambda: {}, encode, decode)
+    assert restored["house_1"].to_dict() == layout["house_1"].to_dict()
+
+def test_stage_timings_group_numbered_stages():
+    timings = StageTimings()
+    for i, seconds in enumerate([1.0, 2.0, 3.0]):
+        timings.record(f"scene_graph_{i}", seconds)
+    summary = timings.summary()
+    assert list(summary) == ["scene_graph"] and summary["scene_graph"]["count"] == 3
+
+def test_null_checkpoint_always_recomputes():
+    calls = []
+    checkpoint = NullCheckpoint()
+    checkpoint.stage("retrieve", lambda: calls.append(1))
+    checkpoint.stage("retrieve", lambda: calls.append(1))
+    assert len(calls) == 2
@@ -0,0 +1,65 @@
+import pytest
+
+from library.history_store import HistoryStore
+
+def _revision(skill: str, action: str = "update_args", timestamp: float = 1000.0, assets=("house_1", "lamp_2"), feedback: str = "too far"):
+    return {"target_relation": {"type": skill, "involved_assets": list(assets), "args": {}},
+            "change": {"action": action, "new_args": {"max_dist": 2.0}},
+            "timestamp": timestamp, "sub_scene": "Step 1", "feedback": feedback}
+
+@pytest.fixture
+def store(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.sqlite3"))
+    yield store
+    store.close()
+
+def test_record_updates_counts_by_skill_role_and_period(store):
+    for t in range(3):
+        store.record(_revision("proximity", timestamp=1000.0 + t))
+    store.record(_revision("alignment", timestamp=2000.0, assets=("tree_1",)))
+    assert store.count_by_skill() == {"proximity": 3, "alignment": 1}
+    assert store.count_by_skill(role="house_9") == {"proximity": 3}
+    assert store.count_by_skill(since=1500.0) == {"alignment": 1}
+
+def test_iter_events_pages_in_insertion_order(store):
+    for t in range(5):
+        store.record(_revision("proximity", timestamp=1000.0 + t))
+    events = list(store.iter_events(skill="proximity", batch_size=2))
+    assert [e["timestamp"] for e in events] == [1000.0 + t for t in range(5)]
+    assert events[0]["change"]["new_args"] == {"max_dist": 2.0}
+
+def test_pending_skills_counts_only_events_since_last_learning(store):
+    for t in range(3):
+        store.record(_revision("proximity", timestamp=1000.0 + t))
+    store.record(_revision("alignment", timestamp=1100.0))
+    store.record(_revision("proximity", action="remove_relation", timestamp=1200.0))
+    pending = store.pending_skills("update_args", min_new_events=2, limit=10)
+    assert pending == [{"skill": "proximity", "total": 3, "pending": 3}]
+
+    store.mark_learned("proximity", "update_args")
+    assert store.pending_skills("update_args", min_new_events=1, limit=10) == [{"skill": "alignment", "total": 1, "pending": 1}]
+    store.record(_revision("proximity", timestamp=1300.0))
+    assert store.pending_skills("update_args", min_new_events=1, limit=1) == [{"skill": "proximity", "total": 4, "pending": 1}]
+
+def test_history_persists_across_connections(tmp_path):
+    path = str(tmp_path / "history.sqlite3")
+    store = HistoryStore(path)
+    store.record(_revision("proximity"))
+    store.close()
+    reopened = HistoryStore(path)
+    try:
+        assert reopened.count_by_skill() == {"proximity": 1}
+        assert reopened.recent_feedback("proximity", limit=5) == ["too far"]
+    finally:
+        reopened.close()
+
+def test_pending_skills_and_learning_ignore_other_actions(store):
+    for t in range(3):
+        store.record(_revision("symmetry", action="remove_relation", timestamp=1000.0 + t))
+        store.record(_revision("symmetry", action="add_relation", timestamp=1100.0 + t))
+    store.record(_revision("symmetry", timestamp=1200.0))
+    assert store.pending_skills("update_args", min_new_events=2, limit=10) == []
+    assert store.count_by_skill(action="update_args") == {"symmetry": 1}
+    # update_args を学習しても、他のアクションの未学習件数は変わらない
+    store.mark_learned("symmetry", "update_args")
+    assert store.pending_skills("remove_relation", min_new_events=3, limit=10) == [{"skill": "symmetry", "total": 3, "pending": 3}]
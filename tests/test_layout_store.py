@@ -0,0 +1,83 @@
+from library.layout import Layout
+from library.layout_store import LayoutStore, canonicalize
+
+NAMES = ["house_1", "house_2", "lamp_1"]
+GRAPH = {"relations": [
+    {"type": "parallelism", "involved_assets": ["house_1", "house_2"], "args": {}},
+    {"type": "proximity", "involved_assets": ["lamp_1", "house_1"], "args": {"min_dist": 1.0}},
+]}
+
+def _layout(names):
+    return {name: Layout((float(i), 0.0, 0.0), (0.0, 0.0, 0.0), (1.0, 1.0, 1.0)) for i, name in enumerate(names)}
+
+def test_canonicalize_is_invariant_under_renaming():
+    renamed = {"relations": [
+        {"type": "Parallelism", "involved_assets": ["House 7", "House 3"], "args": {}},
+        {"type": "proximity", "involved_assets": ["Lamp 9", "House 7"], "args": {"min_dist": 1.0}},
+    ]}
+    key, order, roles, tokens, colors = canonicalize(GRAPH, NAMES)
+    renamed_key, renamed_order, renamed_roles, renamed_tokens, renamed_colors = canonicalize(renamed, ["Lamp 9", "House 3", "House 7"])
+    assert key == renamed_key
+    assert roles == renamed_roles
+    assert tokens == renamed_tokens
+    assert colors == renamed_colors
+    # 対応するアセットが同じスロットに並ぶ
+    mapping = {"house_1": "House 7", "house_2": "House 3", "lamp_1": "Lamp 9"}
+    assert [mapping[name] for name in order] == renamed_order
+
+def test_canonicalize_distinguishes_ordered_skill_direction():
+    reversed_graph = {"relations": [
+        {"type": "parallelism", "involved_assets": ["house_2", "house_1"], "args": {}},
+        GRAPH["relations"][1],
+    ]}
+    assert canonicalize(GRAPH, NAMES)[0] != canonicalize(reversed_graph, NAMES)[0]
+
+def test_exact_lookup_maps_layout_through_renaming(tmp_path):
+    store = LayoutStore(str(tmp_path / "store.json"), max_entries=10, min_similarity=0.5)
+    store.put(GRAPH, NAMES, _layout(NAMES))
+    renamed = {"relations": [
+        {"type": "parallelism", "involved_assets": ["house_5", "house_6"], "args": {}},
+        {"type": "proximity", "involved_assets": ["lamp_5", "house_5"], "args": {"min_dist": 1.0}},
+    ]}
+    kind, layout = store.lookup(renamed, ["house_5", "house_6", "lamp_5"])
+    assert kind == "exact"
+    assert layout["house_5"].location == (0.0, 0.0, 0.0)
+    assert layout["house_6"].location == (1.0, 0.0, 0.0)
+    assert layout["lamp_5"].location == (2.0, 0.0, 0.0)
+
+def test_near_lookup_pairs_slots_by_relation_structure(tmp_path, capsys):
+    store = LayoutStore(str(tmp_path / "store.json"), max_entries=10, min_similarity=0.5)
+    store.put(GRAPH, NAMES, _layout(NAMES))
+    # parallelism の向きだけが違うグラフ: ランプの近くの家には、保存時にランプの近くにあった家の配置を渡す
+    reversed_graph = {"relations": [
+        {"type": "parallelism", "involved_assets": ["house_2", "house_1"], "args": {}},
+        GRAPH["relations"][1],
+    ]}
+    kind, warm = store.lookup(reversed_graph, NAMES)
+    assert kind == "near"
+    assert warm["house_1"].location == (0.0, 0.0, 0.0)
+    assert warm["house_2"].location == (1.0, 0.0, 0.0)
+    assert warm["lamp_1"].location == (2.0, 0.0, 0.0)
+    # 部分一致の内訳は標準出力ではなく stats に集計する
+    assert store.stats["near"] == 1 and store.stats["near_similarity"] >= 0.5
+    assert (store.stats["near_matched_slots"], store.stats["near_slots"]) == (3, 3)
+    assert "@@SCENECRAFT_METRIC" not in capsys.readouterr().out
+
+def test_lookup_misses_below_similarity_and_when_exact_only(tmp_path):
+    store = LayoutStore(str(tmp_path / "store.json"), max_entries=10, min_similarity=0.5)
+    store.put(GRAPH, NAMES, _layout(NAMES))
+    unrelated = {"relations": [{"type": "alignment", "involved_assets": ["tree_1", "tree_2"], "args": {"axis": "x"}}]}
+    assert store.lookup(unrelated, ["tree_1", "tree_2"]) == ("miss", None)
+    near_graph = {"relations": GRAPH["relations"][:1]}
+    assert store.lookup(near_graph, NAMES, exact_only=True) == ("miss", None)
+
+def test_store_evicts_least_recently_used_and_persists(tmp_path):
+    path = str(tmp_path / "store.json")
+    store = LayoutStore(path, max_entries=1, min_similarity=0.5)
+    store.put(GRAPH, NAMES, _layout(NAMES))
+    other = {"relations": [{"type": "alignment", "involved_assets": ["tree_1", "tree_2"], "args": {"axis": "x"}}]}
+    store.put(other, ["tree_1", "tree_2"], _layout(["tree_1", "tree_2"]))
+    assert store.lookup(GRAPH, NAMES, exact_only=True)[0] == "miss"
+    store.flush()
+    reloaded = LayoutStore(path, max_entries=1, min_similarity=0.5)
+    assert reloaded.lookup(other, ["tree_1", "tree_2"])[0] == "exact"
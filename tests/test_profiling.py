@@ -0,0 +1,42 @@
+from library.solver import solve_scene_graph
+from utils import profiling
+
+def _chain_graph(count: int):
+    names = [f"lamp_{i}" for i in range(count)]
+    relations = [{"type": "proximity", "involved_assets": [names[i], names[i + 1]], "args": {"max_dist": 2.0}}
+                 for i in range(count - 1)]
+    return names, {"relations": relations}
+
+def test_parse_metrics_matches_host_records():
+    stdout = "\n".join([
+        "Blender 4.1",
+        profiling.METRIC_PREFIX + '{"type": "stage", "name": "render", "seconds": 1.5}',
+        profiling.METRIC_PREFIX + '{"type": "stage", "name": "render", "seconds": 0.5}',
+        profiling.METRIC_PREFIX + '{"type": "solver_progress", "iteration": 10, "score": -1.0, "iterations_per_sec": 100.0}',
+        profiling.METRIC_PREFIX + "{broken",
+    ])
+    metrics = profiling.parse_metrics(stdout)
+    assert metrics["stages"] == {"render": 2.0}
+    assert metrics["solver_progress"][0]["iteration"] == 10
+    assert metrics["profile_path"] is None
+
+def test_run_measured_records_host_solve(tmp_path, capsys):
+    names, graph = _chain_graph(4)
+    profile_path = str(tmp_path / "solver.prof")
+    layout, metrics = profiling.run_measured(
+        lambda progress: solve_scene_graph(graph, names, seed=0, max_iter=25, progress=progress, progress_interval=10),
+        "solve", profile_path)
+    assert set(layout) == set(names)
+    assert "solve" in metrics["stages"]
+    assert [p["iteration"] for p in metrics["solver_progress"]] == [10, 20, 25]
+    assert metrics["profile_path"] == profile_path and (tmp_path / "solver.prof").exists()
+    # ホスト側の記録は標準出力に書き出さない
+    assert profiling.METRIC_PREFIX not in capsys.readouterr().out
+
+def test_clustered_solve_reports_progress_after_clusters():
+    names, graph = _chain_graph(6)
+    graph["relations"] = graph["relations"][:2] + graph["relations"][3:] # 2つのクラスタに分かれる
+    iterations = []
+    solve_scene_graph(graph, names, seed=0, max_iter=20, max_cluster_size=3,
+                      progress=lambda iteration, score: iterations.append(iteration), progress_interval=10)
+    assert iterations == [20]
@@ -0,0 +1,64 @@
+import random
+
+from library import solver, spatial_skill_library
+from library.layout import Layout
+from library.solver import _solve_clusters, connected_components, evaluate_relations, partition_clusters, solve_scene_graph
+
+def _chain_graph(count: int):
+    names = [f"lamp_{i}" for i in range(count)]
+    relations = [{"type": "proximity", "involved_assets": [names[i], names[i + 1]], "args": {"min_dist": 1.0, "max_dist": 3.0}}
+                 for i in range(count - 1)]
+    return names, {"relations": relations}
+
+def _cluster_tasks(clusters: int, size: int):
+    tasks = []
+    for c in range(clusters):
+        names, graph = _chain_graph(size)
+        names = [f"{name}_c{c}" for name in names]
+        relations = [{"type": r["type"], "involved_assets": [f"{n}_c{c}" for n in r["involved_assets"]], "args": r["args"]}
+                     for r in graph["relations"]]
+        initial = solver.random_initial_layout(names, random.Random(c))
+        tasks.append((initial, relations, 50, c, None, None))
+    return tasks
+
+def test_connected_components_groups_related_assets():
+    components = connected_components(["a", "b", "c", "d"], [{"involved_assets": ["a", "b"]}, {"involved_assets": ["c"]}])
+    assert sorted(sorted(c) for c in components) == [["a", "b"], ["c"], ["d"]]
+
+def test_partition_clusters_respects_max_size_and_covers_all_assets():
+    names, graph = _chain_graph(25)
+    clusters = partition_clusters(names, graph["relations"], max_cluster_size=6)
+    assert all(len(cluster) <= 6 for cluster in clusters)
+    assert sorted(name for cluster in clusters for name in cluster) == sorted(names)
+
+def test_solve_scene_graph_is_deterministic_for_a_seed():
+    names, graph = _chain_graph(30)
+    first = solve_scene_graph(graph, names, seed=3, max_iter=30, max_cluster_size=8)
+    second = solve_scene_graph(graph, names, seed=3, max_iter=30, max_cluster_size=8)
+    assert {n: l.to_dict() for n, l in first.items()} == {n: l.to_dict() for n, l in second.items()}
+
+def test_warm_start_moves_only_changed_and_new_assets():
+    names, graph = _chain_graph(6)
+    previous = {name: Layout((float(i), 0.0, 0.0), (0.0, 0.0, 0.0), (1.0, 1.0, 1.0)) for i, name in enumerate(names[:-1])}
+    layout = solve_scene_graph(graph, names, seed=0, max_iter=40, previous_layout=previous, changed_assets=[names[0]])
+    for name in names[1:-1]:
+        assert layout[name].to_dict() == previous[name].to_dict()
+    assert set(layout) == set(names)
+
+def test_parallel_and_serial_cluster_solving_agree(monkeypatch):
+    monkeypatch.setattr(solver, "PARALLEL_MIN_ASSETS", 0)
+    # 学習済みスキルもワーカープロセスに渡る
+    spatial_skill_library.load_learned_skills({"proximity": "def proximity_score(obj1, obj2, min_dist=1.0, max_dist=5.0):\n"
+                                                             "    return -abs(obj1.location[0] - obj2.location[0])\n"}, verbose=False)
+    try:
+        tasks = _cluster_tasks(clusters=4, size=5)
+        serial = _solve_clusters(tasks, workers=1)
+        parallel = _solve_clusters(tasks, workers=2)
+        for task, serial_layout, parallel_layout in zip(tasks, serial, parallel):
+            relations = task[1]
+            assert evaluate_relations(serial_layout, relations) == evaluate_relations(parallel_layout, relations)
+            assert {n: l.to_dict() for n, l in serial_layout.items()} == {n: l.to_dict() for n, l in parallel_layout.items()}
+    finally:
+        solver.shutdown_executor()
+        spatial_skill_library.SKILLS["proximity"] = spatial_skill_library.proximity_score
+        spatial_skill_library.LEARNED_SOURCES.pop("proximity", None)
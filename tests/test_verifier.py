@@ -0,0 +1,26 @@
+from library.camera_solver import solve_camera
+from library.layout import Layout
+from library.solver import solve_scene_graph
+from modules.verifier import find_floating, verify_layout
+
+def _layout(locations):
+    return {name: Layout(location=location, orientation=(0, 0, 0), scale=(1, 1, 1)) for name, location in locations.items()}
+
+def test_solved_layout_passes_without_vision_review():
+    names = ["house_1", "tree_1", "lamp_1"]
+    scene_graph = {"relations": [
+        {"type": "proximity", "involved_assets": ["house_1", "tree_1"], "args": {"min_dist": 4.0, "max_dist": 12.0}},
+        {"type": "proximity", "involved_assets": ["lamp_1", "house_1"], "args": {"min_dist": 4.0, "max_dist": 12.0}},
+    ]}
+    assets_info = {"house_1": {"height": 3.0}, "tree_1": {"height": 2.0}, "lamp_1": {"height": 1.5}}
+    layout = solve_scene_graph(scene_graph, names, seed=0, max_iter=200)
+    assert all(l.location[2] == 0 for l in layout.values())
+    result = verify_layout(scene_graph, layout, assets_info, solve_camera(layout, assets_info))
+    assert result["verdict"] == "pass", result["issues"]
+
+def test_find_floating_measures_against_supporting_asset():
+    heights = {"table_1": 1.0, "vase_1": 0.3, "lamp_1": 1.5, "bird_1": 0.2}
+    layout = _layout({"table_1": (0, 0, 0), "vase_1": (0.1, 0, 1.0), "lamp_1": (5, 0, 0), "bird_1": (5, 5, 2.0)})
+    assert find_floating(layout, heights) == ["bird_1"]
+    layout["vase_1"].location = (0.1, 0, 0.6) # 机に埋まっている
+    assert find_floating(layout, heights) == ["vase_1", "bird_1"]
@@ -0,0 +1,158 @@
+"""
+インポート済みアセットのキャッシュを管理するモジュール
+各アセットファイルをファイル内容のハッシュで識別し、Blender側で一度だけ
+.blendライブラリに変換する。以降のレンダリングではインポートの代わりに
+そのライブラリからappendするだけで済む。
+"""
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Tuple
+
+from . import config
+
+# インポート処理（テンプレート側）の互換性が変わったら値を上げ、既存キャッシュを無効化する
+CACHE_FORMAT_VERSION = 1
+
+INDEX_FILENAME = "index.json"
+
+_index_lock = threading.Lock()
+# (絶対パス, サイズ, 更新時刻) -> ダイジェスト。巨大なメッシュを毎回ハッシュし直さないためのメモ
+_digest_memo: Dict[Tuple[str, int, float], str] = {}
+
+
+def compute_file_digest(path: str) -> str:
+    """ファイル内容のSHA-256ダイジェストを返す。サイズと更新時刻が同じ間はメモを再利用する。"""
+    abs_path = os.path.abspath(path)
+    stat = os.stat(abs_path)
+    memo_key = (abs_path, stat.st_size, stat.st_mtime)
+    if memo_key in _digest_memo:
+        return _digest_memo[memo_key]
+
+    hasher = hashlib.sha256()
+    with open(abs_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            hasher.update(chunk)
+    digest = hasher.hexdigest()
+    _digest_memo[memo_key] = digest
+    return digest
+
+
+def _cache_key(digest: str) -> str:
+    return f"{digest[:32]}_v{CACHE_FORMAT_VERSION}"
+
+
+def _index_path() -> str:
+    return os.path.join(config.ASSET_CACHE_DIR, INDEX_FILENAME)
+
+
+def _load_index() -> Dict[str, Dict]:
+    try:
+        with open(_index_path(), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _save_index(index: Dict[str, Dict]):
+    os.makedirs(config.ASSET_CACHE_DIR, exist_ok=True)
+    tmp_path = _index_path() + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=4, ensure_ascii=False)
+    os.replace(tmp_path, _index_path())
+
+
+def _sync_index(index: Dict[str, Dict]) -> Dict[str, Dict]:
+    """
+    インデックスとディスク上の.blendファイルを突き合わせる。
+    Blenderが新たに書き出したファイルを登録し、消えたファイルや古い形式のエントリを取り除く。
+    """
+    now = time.time()
+    on_disk = {}
+    if os.path.isdir(config.ASSET_CACHE_DIR):
+        for filename in os.listdir(config.ASSET_CACHE_DIR):
+            if filename.endswith(".blend"):
+                on_disk[filename[:-len(".blend")]] = os.path.join(config.ASSET_CACHE_DIR, filename)
+
+    synced = {}
+    for key, blend_path in on_disk.items():
+        if not key.endswith(f"_v{CACHE_FORMAT_VERSION}"):
+            # 形式が古いキャッシュは読み込まずに削除する
+            os.remove(blend_path)
+            continue
+        entry = index.get(key, {"created_at": now, "last_used": now})
+        entry["size"] = os.path.getsize(blend_path)
+        synced[key] = entry
+    return synced
+
+
+def _enforce_limits(index: Dict[str, Dict]) -> Dict[str, Dict]:
+    """最終利用日時が古すぎるエントリを削除し、合計サイズが上限に収まるまでLRU順に削除する。"""
+    now = time.time()
+    max_age = config.ASSET_CACHE_MAX_AGE_DAYS * 24 * 3600
+    evicted = []
+
+    for key, entry in list(index.items()):
+        if now - entry.get("last_used", 0) > max_age:
+            evicted.append(key)
+            del index[key]
+
+    total_size = sum(entry["size"] for entry in index.values())
+    for key, entry in sorted(index.items(), key=lambda item: item[1].get("last_used", 0)):
+        if total_size <= config.ASSET_CACHE_MAX_BYTES:
+            break
+        total_size -= entry["size"]
+        evicted.append(key)
+        del index[key]
+
+    for key in evicted:
+        blend_path = os.path.join(config.ASSET_CACHE_DIR, f"{key}.blend")
+        if os.path.exists(blend_path):
+            os.remove(blend_path)
+    if evicted:
+        print(f"  [AssetCache] 🧹 {len(evicted)}件のキャッシュを削除しました。")
+    return index
+
+
+def refresh_index():
+    """Blenderの実行後に呼び出し、新しく書き出されたキャッシュをインデックスへ反映する。"""
+    if not config.ASSET_CACHE_ENABLED:
+        return
+    with _index_lock:
+        index = _enforce_limits(_sync_index(_load_index()))
+        _save_index(index)
+
+
+def prepare_assets_info(assets_info: Dict[str, Dict]) -> Dict[str, Dict]:
+    """
+    Blenderに渡す前のアセット情報に、キャッシュの保存先を付与する。
+
+    Returns:
+        各アセットに "cache_path" (絶対パス) と "cache_hit" を追加したコピー。
+        キャッシュが無効、またはファイルが存在しないアセットはそのまま返す。
+    """
+    prepared = copy.deepcopy(assets_info)
+    if not config.ASSET_CACHE_ENABLED:
+        return prepared
+
+    with _index_lock:
+        index = _enforce_limits(_sync_index(_load_index()))
+        now = time.time()
+        hits = 0
+        for info in prepared.values():
+            path = info.get("file_path")
+            if not path or not os.path.exists(path):
+                continue
+            key = _cache_key(compute_file_digest(path))
+            info["cache_path"] = os.path.abspath(os.path.join(config.ASSET_CACHE_DIR, f"{key}.blend"))
+            info["cache_hit"] = key in index
+            if info["cache_hit"]:
+                index[key]["last_used"] = now
+                hits += 1
+        _save_index(index)
+
+    print(f"  [AssetCache] キャッシュヒット: {hits}/{len(prepared)}")
+    return prepared
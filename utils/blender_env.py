@@ -2,10 +2,19 @@
 """
 Blender環境との連携を行うモジュール
 """
+import atexit
 import os
 import base64
+import json
+import queue
 import subprocess # subprocessモジュールを追加
 import sys # sysモジュールを追加
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import asset_cache, config, image_payload, profiling
 
 # --- Blenderのパス設定 ---
 # 環境に合わせてBlenderの実行可能ファイルへのパスを設定してください。
@@ -25,60 +34,254 @@ def find_blender_executable():
     # Linuxや、PATHが通っている場合は'blender'でOK
     return "blender"
 
-def execute_blender_script(script: str, output_image_path: str, asset_library_path: str) -> bool:
+def view_label(view: Dict[str, Any]) -> str:
+    """コンタクトシートとレビューのプロンプトに使う視点名。"""
+    if view.get("type") == "orbit":
+        return f"orbit {view.get('azimuth', 0):+g}deg"
+    return view.get("type", "hero")
+
+def view_output_paths(output_image_path: str, views: Optional[List[Dict[str, Any]]]) -> List[str]:
+    """視点ごとの出力先。視点が1つなら output_image_path そのもの。"""
+    if not views or len(views) == 1:
+        return [output_image_path]
+    root, ext = os.path.splitext(output_image_path)
+    return [f"{root}_view{i}{ext}" for i in range(len(views))]
+
+RUNNER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "blender_runner.py")
+
+def _blender_command(threads: int, *runner_args: str) -> List[str]:
     """
-    生成されたPythonスクリプトをバックグラウンドでBlenderに実行させ、画像をレンダリングする
+    ランナーを実行するBlenderのコマンド。
+    --background: GUIなしで実行
+    --python-exit-code: ランナーで例外が起きたらBlenderを0以外の終了コードで終わらせる
     """
     global BLENDER_PATH
     if BLENDER_PATH == "blender": # パスがデフォルトのままなら探査
         BLENDER_PATH = find_blender_executable()
+    return [BLENDER_PATH, "--background", "--threads", str(threads), "--python-exit-code", "1",
+            "--python", RUNNER_PATH, "--", *runner_args]
+
+class BlenderWorker:
+    """
+    ランナーを --serve で起動したままにしておくBlenderプロセス。
+    ジョブは1行のJSONとして標準入力に送り、完了の記録 (job_done) までの出力をそのジョブのログとして読む。
+    標準出力は別スレッドで読み、ジョブの完了を期限付きで待つ。
+    """
+    def __init__(self, threads: int):
+        self.threads = threads
+        self.process = subprocess.Popen(_blender_command(threads, "--serve"), stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        stderr=subprocess.STDOUT, text=True, encoding="utf-8", bufsize=1)
+        self._lines: "queue.Queue[Optional[str]]" = queue.Queue()
+        threading.Thread(target=self._read_stdout, daemon=True).start()
+
+    def _read_stdout(self):
+        for line in self.process.stdout:
+            self._lines.put(line)
+        self._lines.put(None) # Blenderが終了した
+
+    @property
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def run(self, job: Dict[str, Any], timeout: Optional[float] = None) -> Tuple[bool, str]:
+        """
+        ジョブを1つ処理し、(成功したか, 出力) を返す。
+        timeout 秒以内に終わらない場合や途中でBlenderが終了した場合は、プロセスを終了させて失敗を返す
+        (終了したワーカーはプールに戻らず、次のジョブでは新しいワーカーが起動する)。
+        """
+        try:
+            self.process.stdin.write(json.dumps(job, ensure_ascii=False) + "\n")
+            self.process.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            self.kill()
+            return False, f"常駐ワーカーにジョブを送れませんでした - {e}"
+        deadline = time.monotonic() + timeout if timeout else None
+        lines = []
+        while True:
+            try:
+                line = self._lines.get(timeout=None if deadline is None else max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                self.kill()
+                return False, "".join(lines) + f"\n常駐ワーカーが {timeout}秒以内にジョブを終えなかったため、終了させました。"
+            if line is None:
+                self.kill()
+                return False, "".join(lines) + f"\n常駐ワーカーが終了しました (終了コード {self.process.returncode})。"
+            lines.append(line)
+            if line.startswith(profiling.METRIC_PREFIX) and '"job_done"' in line:
+                return json.loads(line[len(profiling.METRIC_PREFIX):]).get("ok", False), "".join(lines)
+
+    def kill(self):
+        if self.alive:
+            self.process.kill()
+        self.process.wait()
+
+    def close(self):
+        if self.alive:
+            self.process.stdin.close()
+            try:
+                self.process.wait(timeout=config.BLENDER_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                self.kill()
+
+_idle_workers: Dict[int, List[BlenderWorker]] = {}
+_workers_lock = threading.Lock()
+
+def _acquire_worker(threads: int) -> BlenderWorker:
+    """空いているワーカーを返す。なければ起動する。同時に使われる数はスケジューラのレンダースロットで制限される。"""
+    with _workers_lock:
+        idle = _idle_workers.setdefault(threads, [])
+        while idle:
+            worker = idle.pop()
+            if worker.alive:
+                return worker
+    print(f"[Blender] 常駐ワーカーを起動します (threads={threads})。")
+    return BlenderWorker(threads)
+
+def _release_worker(worker: BlenderWorker):
+    if worker.alive:
+        with _workers_lock:
+            _idle_workers.setdefault(worker.threads, []).append(worker)
+
+@atexit.register
+def shutdown_workers():
+    """常駐ワーカーをすべて終了させる。"""
+    with _workers_lock:
+        workers = [worker for idle in _idle_workers.values() for worker in idle]
+        _idle_workers.clear()
+    for worker in workers:
+        worker.close()
 
-    print(f"\n[Blender] Blenderスクリプトを実行中 (using: {BLENDER_PATH})...")
-
-    # 一時的なスクリプトファイルを作成
-    script_path = "temp_blender_script.py"
-    with open(script_path, "w", encoding="utf-8") as f:
-        # スクリプトの先頭で、ライブラリへのパスを追加する
-        # これにより、BlenderのPython環境がプロジェクトのモジュールをインポートできるようになる
-        f.write("import sys\n")
-        f.write(f"sys.path.append('{os.path.abspath('.')}')\n\n")
-        # アセットのパスを渡すためのグローバル変数を設定
-        f.write(f"ASSET_PATH = '{os.path.abspath(asset_library_path)}'\n\n")
-        f.write(script)
-
-    # Blenderをバックグラウンドモードで実行するコマンド
-    # --background: GUIなしで実行
-    # --python: 指定したPythonスクリプトを実行
-    # -o: レンダリング結果の出力先
-    # -f 1: 1フレーム目のみをレンダリング
-    command = [
-        BLENDER_PATH,
-        "--background",
-        "--python", script_path,
-        "-o", os.path.abspath(output_image_path),
-        "-f", "1"
-    ]
+def _run_job_once(job: Dict[str, Any], scratch_dir: str, threads: int) -> Tuple[bool, str]:
+    """ジョブをファイルに書き出し、そのジョブだけを処理するBlenderを起動する。"""
+    job_path = os.path.join(scratch_dir, "blender_job.json")
+    with open(job_path, "w", encoding="utf-8") as f:
+        json.dump(job, f, ensure_ascii=False)
+    try:
+        process = subprocess.run(_blender_command(threads, job_path), capture_output=True, text=True, timeout=config.BLENDER_TIMEOUT)
+        return process.returncode == 0, process.stdout + process.stderr
+    except subprocess.TimeoutExpired as e:
+        output = "".join(part.decode("utf-8", "replace") if isinstance(part, bytes) else part for part in (e.stdout, e.stderr) if part)
+        return False, output + f"\nBlenderが {config.BLENDER_TIMEOUT}秒以内にジョブを終えなかったため、終了させました。"
+    finally:
+        if os.path.exists(job_path):
+            os.remove(job_path)
+
+def execute_blender_job(payload: Dict[str, Any], output_image_path: str, asset_library_path: str, render_tier: str = config.FINAL_RENDER_TIER,
+                        scratch_dir: str = ".", threads: int = 0, metrics: Optional[Dict[str, Any]] = None,
+                        views: Optional[List[Dict[str, Any]]] = None) -> bool:
+    """
+    シーンのペイロード (coder.build_scene_payload の結果) をBlenderのランナーで処理し、画像をレンダリングする
+
+    Args:
+        render_tier: config.RENDER_TIERS のキー。レビュー途中は "preview"、採用時は "final" を指定する。
+        scratch_dir: ジョブファイルとプロファイルの置き場所。並列実行時はジョブごとに分ける。
+        threads: Blenderが使うCPUスレッド数。0ならBlenderが自動で決める。
+        metrics: 辞書を渡すと、ランナーが書き出した計測記録 (profiling.parse_metrics の結果) で更新する。
+        views: 描画する視点のリスト (config.REVIEW_VIEWS の形式)。省略時は決定したカメラからの1枚だけ。
+            複数指定すると、アセットを1度だけ読み込んだまま各視点を view_output_paths の各パスに描画する。
+    """
+    mode = "常駐ワーカー" if config.BLENDER_PERSISTENT_WORKERS else "単発"
+    print(f"\n[Blender] ジョブを実行中 ({mode}, tier: {render_tier})...")
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_image_path)), exist_ok=True)
+    os.makedirs(scratch_dir, exist_ok=True)
+    views = views or [{"type": "hero"}]
+    job = dict(payload)
+    job["asset_path"] = os.path.abspath(asset_library_path)
+    job["render"] = {
+        "settings": config.RENDER_TIERS[render_tier],
+        "views": views,
+        "output_paths": [os.path.abspath(p) for p in view_output_paths(output_image_path, views)],
+    }
+    # Blender内でソルバーを実行する場合のcProfileの出力先
+    job["profile_path"] = os.path.abspath(os.path.join(scratch_dir, "solver_profile.prof")) if config.BLENDER_PROFILE_SOLVER else None
 
     try:
-        # コマンドを実行
-        process = subprocess.run(command, check=True, capture_output=True, text=True)
-        print(f"[Blender] ✔️ レンダリングが完了し、画像を '{output_image_path}' に保存しました。")
-        # print("[Blender Log]\n", process.stdout) # Blenderのログを出力
-        return True
+        if config.BLENDER_PERSISTENT_WORKERS:
+            worker = _acquire_worker(threads)
+            try:
+                ok, output = worker.run(job, config.BLENDER_TIMEOUT)
+            finally:
+                _release_worker(worker)
+            if not ok and not worker.alive:
+                # ワーカーが落ちた、または応答しなくなった場合は、ジョブ単体のBlenderで1度だけやり直す
+                reason = output.strip().splitlines()[-1] if output.strip() else ""
+                print(f"[Blender] [Warning] 常駐ワーカーでの実行に失敗したため、ジョブ単体のBlenderでやり直します - {reason}")
+                ok, output = _run_job_once(job, scratch_dir, threads)
+        else:
+            ok, output = _run_job_once(job, scratch_dir, threads)
     except FileNotFoundError:
         print(f"[Blender] ❌ エラー: Blenderの実行可能ファイルが見つかりません。")
         print(f"  '{BLENDER_PATH}' が正しいパスか確認するか、環境変数 BLENDER_PATH を設定してください。")
         return False
-    except subprocess.CalledProcessError as e:
-        print(f"[Blender] ❌ エラー: Blenderスクリプトの実行に失敗しました。")
-        print(f"  Return Code: {e.returncode}")
-        print(f"  --- STDOUT ---\n{e.stdout}")
-        print(f"  --- STDERR ---\n{e.stderr}")
+
+    if not ok:
+        print(f"[Blender] ❌ エラー: Blenderでのジョブの実行に失敗しました。")
+        print(f"  --- OUTPUT ---\n{output}")
         return False
+
+    print(f"[Blender] ✔️ レンダリングが完了し、画像を '{output_image_path}' に保存しました。")
+    run_metrics = profiling.parse_metrics(output)
+    if run_metrics["stages"]:
+        print("[Blender] ⏱️ " + ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in run_metrics["stages"].items()))
+    if run_metrics["solver_progress"]:
+        last = run_metrics["solver_progress"][-1]
+        print(f"[Blender] ソルバー: {last['iteration']}回の反復, スコア {last['score']:.4f}, {last['iterations_per_sec']} it/s")
+    if run_metrics["profile_path"]:
+        print(f"[Blender] ソルバーのプロファイルを '{run_metrics['profile_path']}' に保存しました。")
+    if metrics is not None:
+        metrics.update(run_metrics)
+    asset_cache.refresh_index() # 新たに書き出されたアセットキャッシュを登録
+    return True
+
+def _render_tmp_dir() -> Optional[str]:
+    """レンダリング結果の受け渡しに使う一時ディレクトリ。Linuxではメモリ上のtmpfsを優先する。"""
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return "/dev/shm"
+    return None # tempfileの既定のディレクトリを使う
+
+def render_to_bytes(payload: Dict[str, Any], asset_library_path: str, render_tier: str = config.FINAL_RENDER_TIER,
+                    scratch_dir: str = ".", threads: int = 0, keep_path: Optional[str] = None,
+                    metrics: Optional[Dict[str, Any]] = None, views: Optional[List[Dict[str, Any]]] = None) -> Optional[bytes]:
+    """
+    ペイロードをBlenderで処理し、レンダリング結果を出力フォルダに残さずバイト列として受け取る。
+
+    Args:
+        keep_path: 指定した場合のみ、原寸の画像をこのパスに保存したままにする。
+        metrics: execute_blender_job と同じく、計測記録で更新する辞書。
+        views: 複数の視点を指定すると、各視点の画像をラベル付きで並べたコンタクトシートを返す。
+    Returns:
+        レンダリング画像 (PNG) のバイト列。失敗した場合は None。
+    """
+    if keep_path:
+        output_path = keep_path
+    else:
+        fd, output_path = tempfile.mkstemp(suffix=".png", dir=_render_tmp_dir())
+        os.close(fd)
+    view_paths = view_output_paths(output_path, views)
+    try:
+        if not execute_blender_job(payload, output_path, asset_library_path, render_tier, scratch_dir, threads, metrics, views):
+            return None
+        if len(view_paths) == 1:
+            with open(output_path, "rb") as f:
+                return f.read()
+        view_images = []
+        for path in view_paths:
+            with open(path, "rb") as f:
+                view_images.append(f.read())
+        sheet = image_payload.build_contact_sheet(view_images, [view_label(view) for view in views], config.REVIEW_CONTACT_SHEET_COLUMNS)
+        if keep_path:
+            with open(keep_path, "wb") as f:
+                f.write(sheet)
+        return sheet
     finally:
-        # 一時ファイルを削除
-        if os.path.exists(script_path):
-            os.remove(script_path)
+        # 視点ごとの画像は常に削除し、keep_path に残すのはコンタクトシート (視点が1つならその画像) だけにする
+        leftovers = [path for path in view_paths if path != keep_path]
+        if not keep_path:
+            leftovers.append(output_path)
+        for path in set(leftovers):
+            if os.path.exists(path):
+                os.remove(path)
 
 def get_base64_image(image_path: str) -> str:
     """
@@ -0,0 +1,288 @@
+# utils/blender_runner.py
+"""
+Blender内で実行する静的なランナー
+シーンごとにスクリプトを生成する代わりに、このモジュールを1度だけ読み込み、
+ジョブ (アセット・関係のリスト・カメラ・レンダリング設定・事前に解いたレイアウトを持つJSON) を処理する。
+
+使い方 (blender_env が起動する):
+    blender --background --python utils/blender_runner.py -- job.json
+    blender --background --python utils/blender_runner.py -- --serve
+--serve では標準入力から1行1ジョブのJSONを受け取り続け、ジョブごとに完了の記録 (job_done) を書き出す。
+その際、前のジョブで読み込んだアセットのうち次のジョブでも使うものはシーンに残すため、
+前のステップのアセットを引き継ぐサブシーンでは、追加されたアセットだけを読み込めばよい。
+"""
+import json
+import os
+import random
+import sys
+import traceback
+from typing import Dict, List, Tuple
+
+import bpy
+import numpy as np
+from mathutils import Matrix, Vector
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from library import spatial_skill_library
+from library.layout import Layout
+from library.solver import constraint_based_search, evaluate_relations, random_initial_layout
+from utils import profiling # 処理段階ごとの計測記録を標準出力に書き出す
+
+# 読み込み済みのアセット: アセット名 -> (読み込み元, 代表オブジェクト, 正規化後のスケール)
+_loaded_assets: Dict[str, Tuple] = {}
+
+# --- 1. アセットの読み込みと初期化 ---
+def import_asset_file(path: str) -> List:
+    """拡張子に応じたインポーターでアセットを読み込み、新たに追加されたオブジェクトを返す。"""
+    existing = set(bpy.data.objects)
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.obj':
+        if hasattr(bpy.ops.wm, 'obj_import'):
+            bpy.ops.wm.obj_import(filepath=path)
+        else:
+            bpy.ops.import_scene.obj(filepath=path)
+    elif ext == '.fbx':
+        bpy.ops.import_scene.fbx(filepath=path)
+    elif ext in ('.glb', '.gltf'):
+        bpy.ops.import_scene.gltf(filepath=path)
+    else:
+        print(f'    ❌ 未対応の形式です: {path}')
+    return [obj for obj in bpy.data.objects if obj not in existing]
+
+def append_cached_asset(cache_path: str) -> List:
+    """キャッシュ済みの.blendライブラリからオブジェクトをappendし、シーンにリンクする。"""
+    with bpy.data.libraries.load(cache_path, link=False) as (data_from, data_to):
+        data_to.objects = data_from.objects
+    for obj in data_to.objects:
+        bpy.context.scene.collection.objects.link(obj)
+    return list(data_to.objects)
+
+def write_asset_cache(cache_path: str, objects: List):
+    """インポート直後のオブジェクトを.blendライブラリとして書き出す。並行実行に備えて一時ファイル経由で置き換える。"""
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp_path = f'{cache_path}.{os.getpid()}.tmp'
+    bpy.data.libraries.write(tmp_path, set(objects), fake_user=True)
+    os.replace(tmp_path, cache_path)
+
+def measure_height(objects: List) -> float:
+    """メッシュのワールド座標でのバウンディングボックスから、アセット全体の高さを求める。"""
+    zs = [(obj.matrix_world @ Vector(corner)).z for obj in objects if obj.type == 'MESH' for corner in obj.bound_box]
+    return max(zs) - min(zs) if zs else 0.0
+
+def _asset_source(info: Dict) -> Tuple:
+    return (info.get("file_path"), info.get("height", 1.0), info.get("cache_path"))
+
+def reuse_assets(assets_info: Dict[str, Dict]) -> Dict:
+    """
+    前のジョブで読み込んだアセットのうち、今回も同じ読み込み元で使うものを残し、それ以外のオブジェクトをすべて削除する。
+    残したアセット名 -> 代表オブジェクトを返す。残すものがなければシーンを空の状態から作り直す。
+    """
+    keep = {name for name, (source, _, _) in _loaded_assets.items()
+            if name in assets_info and source == _asset_source(assets_info[name])}
+    if not keep:
+        bpy.ops.wm.read_homefile(use_empty=True)
+        _loaded_assets.clear()
+        return {}
+
+    keep_objects = set()
+    for name in keep:
+        obj = _loaded_assets[name][1]
+        keep_objects.add(obj)
+        keep_objects.update(obj.children_recursive)
+    for obj in list(bpy.data.objects): # 地面・カメラ・ライトも作り直す
+        if obj not in keep_objects:
+            bpy.data.objects.remove(obj, do_unlink=True)
+    for name in list(_loaded_assets):
+        if name not in keep:
+            del _loaded_assets[name]
+    bpy.data.orphans_purge(do_recursive=True)
+    print(f'  [Blender] ⚡ 前のジョブで読み込んだ{len(keep)}アセットを再利用します。')
+    return {name: _loaded_assets[name][1] for name in keep}
+
+def import_assets(assets_info: Dict[str, Dict]) -> Dict:
+    """アセットを読み込み、高さを正規化する。アセット名 -> 代表オブジェクトを返す。"""
+    print('  [Blender] 3Dアセットをインポートし、スケールを正規化中...')
+    blender_objects = {}
+    for name, info in assets_info.items():
+        path = info.get("file_path")
+        target_height = info.get("height", 1.0)
+        cache_path = info.get("cache_path")
+        if not path or not os.path.exists(path):
+            continue
+
+        if cache_path and os.path.exists(cache_path):
+            imported_objects = append_cached_asset(cache_path)
+            print(f'    ⚡ {name} をキャッシュから読み込みました。')
+        else:
+            imported_objects = import_asset_file(path)
+            if cache_path and imported_objects:
+                write_asset_cache(cache_path, imported_objects)
+        if not imported_objects:
+            continue
+
+        # 階層の最上位オブジェクトを代表とし、複数ある場合は空のオブジェクトにまとめる
+        roots = [obj for obj in imported_objects if obj.parent is None]
+        if len(roots) == 1:
+            imported_obj = roots[0]
+        else:
+            imported_obj = bpy.data.objects.new(name, None)
+            bpy.context.scene.collection.objects.link(imported_obj)
+            for root in roots:
+                root.parent = imported_obj
+        imported_obj.name = name
+        bpy.context.view_layer.update()
+
+        # 高さを target_height に正規化する (メッシュ全体のバウンディングボックス)
+        current_height = measure_height(imported_objects)
+        if current_height > 0:
+            scale_factor = target_height / current_height
+            imported_obj.scale = (scale_factor, scale_factor, scale_factor)
+            bpy.context.view_layer.update() # スケール変更を確定
+            print(f'    ✅ {name} をインポートし、高さを {target_height}m に調整しました。')
+
+        blender_objects[name] = imported_obj
+        _loaded_assets[name] = (_asset_source(info), imported_obj, tuple(imported_obj.scale))
+    return blender_objects
+
+# --- 2-4. レイアウトの決定 ---
+def solve_layout(job: Dict) -> Dict[str, Layout]:
+    """事前に解いたレイアウトがあればそれを使い、なければ関係のリストを評価関数としてBlender内で探索する (library/solver.py)。"""
+    if job.get("layout"):
+        print('  [Solver] ✔️ 事前に求めたレイアウトを使用します。')
+        return {name: Layout.from_dict(data) for name, data in job["layout"].items()}
+
+    relations = job.get("relations", [])
+    solver_options = job.get("solver", {})
+    assets_layout = random_initial_layout(list(job["assets"].keys()), random.Random(solver_options.get("seed")))
+    # profile_path は blender_env が指定する (計測しない場合は None)
+    layout = profiling.run_profiled(
+        lambda: constraint_based_search(assets_layout, lambda l: evaluate_relations(l, relations), solver_options.get("max_iter", 100),
+                                        random.Random(solver_options.get("seed")), progress=profiling.solver_progress_reporter(),
+                                        progress_interval=solver_options.get("progress_interval", 10)),
+        job.get("profile_path"))
+    print('  [Solver] ✔️ 最適化されたレイアウトが決定しました。')
+    return layout
+
+# --- 5. Blenderシーンへの最終レイアウト適用 ---
+def apply_layout(blender_objects: Dict, layout: Dict[str, Layout]):
+    print('  [Blender] ✔️ 最終レイアウトをBlenderシーンに適用します。')
+    for name, l in layout.items():
+        if name in blender_objects:
+            obj = blender_objects[name]
+            obj.location = l.location
+            obj.rotation_euler = [np.radians(angle) for angle in l.orientation]
+            obj.scale = [s * base for s, base in zip(l.scale, _loaded_assets[name][2])] # 正規化済みのスケールに掛け合わせる
+
+# --- 6. レンダリングのためのシーン設定 ---
+class CameraRig:
+    """カメラと注視点。視点ごとにカメラだけを動かす。"""
+    def __init__(self, camera_settings: Dict, asset_names: List[str], ground):
+        self.hero_location = Vector(camera_settings.get("location", [15, -20, 15]))
+        bpy.ops.object.camera_add(location=self.hero_location)
+        self.camera = bpy.context.active_object
+        bpy.context.scene.camera = self.camera
+        look_at = camera_settings.get("look_at", "center")
+        if isinstance(look_at, list): # カメラソルバーが決めた注視点の座標
+            self.target = bpy.data.objects.new('CameraTarget', None)
+            bpy.context.scene.collection.objects.link(self.target)
+            self.target.location = Vector(look_at)
+        else:
+            self.target = bpy.data.objects.get(look_at)
+        if not self.target:
+            self.target = bpy.data.objects.get(asset_names[0]) if asset_names else ground
+        self.point(self.hero_location)
+
+    def point(self, location: Vector):
+        """カメラを location に置き、注視点の方へ向ける。"""
+        self.camera.location = location
+        direction = self.target.location - self.camera.location
+        self.camera.rotation_euler = direction.to_track_quat('-Z', 'Y').to_euler()
+
+    def view_location(self, view: Dict) -> Vector:
+        """視点の種類 ("hero" / "orbit" / "top") から、カメラの位置を決める。"""
+        offset = self.hero_location - self.target.location
+        if view.get('type') == 'orbit':
+            offset.rotate(Matrix.Rotation(np.radians(view.get('azimuth', 0)), 3, 'Z'))
+        elif view.get('type') == 'top':
+            offset = Vector((0.0, -0.01, offset.length)) # 真下を向くとカメラの上方向が定まらないため、わずかにずらす
+        return self.target.location + offset
+
+def setup_scene(camera_settings: Dict, asset_names: List[str]) -> CameraRig:
+    print('  [Blender] カメラとライトを設定します。')
+    bpy.ops.mesh.primitive_plane_add(size=100, location=(0, 0, 0))
+    ground = bpy.context.active_object
+    ground.name = 'Ground'
+    rig = CameraRig(camera_settings, asset_names, ground)
+
+    bpy.ops.object.light_add(type='SUN', location=(10, 10, 20))
+    light = bpy.context.active_object
+    light.data.energy = 3
+    light.data.angle = np.radians(15)
+    return rig
+
+# --- 7. レンダリング実行 ---
+def configure_render(settings: Dict):
+    print(f"  [Blender] レンダリングを開始します (engine={settings['engine']}, {settings['resolution_x']}x{settings['resolution_y']})。")
+    scene = bpy.context.scene
+    scene.render.engine = settings['engine']
+    if settings['engine'] == 'CYCLES':
+        scene.cycles.samples = settings['samples']
+    elif settings['engine'].startswith('BLENDER_EEVEE'):
+        scene.eevee.taa_render_samples = settings['samples']
+    elif settings['engine'] == 'BLENDER_WORKBENCH':
+        scene.display.shading.light = 'STUDIO'
+        scene.display.shading.color_type = 'MATERIAL'
+    scene.render.image_settings.file_format = 'PNG'
+    scene.render.resolution_x = settings['resolution_x']
+    scene.render.resolution_y = settings['resolution_y']
+    scene.render.resolution_percentage = 100
+
+def run_job(job: Dict):
+    """1つのジョブを処理する。前のジョブのオブジェクトは、今回も使うアセット以外は残さない。"""
+    clock = profiling.StageClock()
+
+    blender_objects = reuse_assets(job["assets"])
+    blender_objects.update(import_assets({name: info for name, info in job["assets"].items() if name not in blender_objects}))
+    clock.lap('import_assets')
+    layout = solve_layout(job)
+    # 事前に解いたレイアウトを読み込んだだけなら、ホスト側の求解 (solve) と区別する
+    clock.lap('load_layout' if job.get("layout") else 'solve')
+    apply_layout(blender_objects, layout)
+    clock.lap('apply_layout')
+    rig = setup_scene(job.get("camera", {}), list(job["assets"].keys()))
+    clock.lap('scene_setup')
+
+    render = job["render"]
+    configure_render(render["settings"])
+    # 読み込んだシーンはそのまま、カメラだけを動かして視点ごとに描画する
+    for view, image_path in zip(render["views"], render["output_paths"]):
+        rig.point(rig.view_location(view))
+        bpy.context.scene.render.filepath = image_path
+        bpy.ops.render.render(write_still=True)
+        clock.lap('render')
+    print(f'  [Blender] ✔️ レンダリングが完了しました ({len(render["views"])}視点)。')
+
+def serve():
+    """標準入力からジョブを1行ずつ受け取り、標準入力が閉じられるまで処理し続ける。"""
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        try:
+            run_job(json.loads(line))
+            profiling.emit({"type": "job_done", "ok": True})
+        except Exception as e:
+            traceback.print_exc(file=sys.stdout)
+            profiling.emit({"type": "job_done", "ok": False, "error": str(e)})
+
+def main():
+    args = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+    # 学習済みのスキルはBlender内で探索する場合にも使う
+    spatial_skill_library.initialize_skills()
+    if args and args[0] == "--serve":
+        serve()
+        return
+    with open(args[0], "r", encoding="utf-8") as f:
+        run_job(json.load(f))
+
+if __name__ == "__main__":
+    main()
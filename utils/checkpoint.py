@@ -0,0 +1,98 @@
+"""
+クエリごとの処理段階 (ステージ) の出力を保存し、中断したバッチを途中から再開するためのモジュール
+各ステージの結果はJSONファイルとして保存され、既に保存済みのステージはLLM呼び出しや
+レンダリングをやり直さずにファイルから読み込む。あわせてステージごとの所要時間を記録する。
+"""
+import json
+import math
+import os
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+
+def percentile(values: List[float], q: float) -> float:
+    """最近傍順位法によるパーセンタイル (q は 0〜100)。"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class StageTimings:
+    """ステージ名ごとの所要時間を集計する。複数のワーカースレッドから同時に記録できる。"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seconds: Dict[str, List[float]] = {}
+
+    def record(self, stage: str, seconds: float):
+        # "scene_graph_3" のようなサブシーン番号付きの名前は同じステージとして集計する
+        stage = re.sub(r"_\d+$", "", stage)
+        with self._lock:
+            self._seconds.setdefault(stage, []).append(seconds)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                stage: {"count": len(values), "p50": round(percentile(values, 50), 3), "p95": round(percentile(values, 95), 3)}
+                for stage, values in self._seconds.items()
+            }
+
+
+class StageCheckpoint:
+    """1つのクエリのステージ出力を directory 以下に保存する。"""
+    def __init__(self, directory: str, timings: Optional[StageTimings] = None):
+        self.directory = directory
+        self.timings = timings
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, f"{name}.json")
+
+    def has(self, name: str) -> bool:
+        return os.path.exists(self._path(name))
+
+    def load(self, name: str) -> Any:
+        with open(self._path(name), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def save(self, name: str, value: Any):
+        # 書き込み途中で落ちても壊れたファイルが残らないよう、一時ファイルから置き換える
+        tmp_path = self._path(name) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(value, f, indent=4, ensure_ascii=False)
+        os.replace(tmp_path, self._path(name))
+
+    def stage(self, name: str, fn: Callable[[], Any], encode: Callable[[Any], Any] = None, decode: Callable[[Any], Any] = None) -> Any:
+        """
+        保存済みならその結果を返し、なければ fn() を実行して結果を保存する。
+        encode / decode はJSONにそのまま保存できない値 (Layoutなど) の変換に使う。
+        """
+        if self.has(name):
+            value = self.load(name)
+            print(f"  [Checkpoint] ♻️ ステージ '{name}' を保存済みの結果から再開します。")
+            return decode(value) if decode else value
+        started = time.monotonic()
+        result = fn()
+        if self.timings:
+            self.timings.record(name, time.monotonic() - started)
+        self.save(name, encode(result) if encode else result)
+        return result
+
+
+class NullCheckpoint(StageCheckpoint):
+    """何も保存しないチェックポイント。単発実行 (main.py) で使う。"""
+    def __init__(self):
+        self.directory = None
+        self.timings = None
+
+    def has(self, name: str) -> bool:
+        return False
+
+    def save(self, name: str, value: Any):
+        pass
+
+    def stage(self, name: str, fn: Callable[[], Any], encode: Callable[[Any], Any] = None, decode: Callable[[Any], Any] = None) -> Any:
+        return fn()
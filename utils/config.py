@@ -14,4 +14,146 @@ DECOMPOSER_MODEL = "gpt-4-turbo"
 PLANNER_MODEL = "gpt-4-turbo"
 CODER_MODEL = "gpt-4-turbo"
 REVIEWER_MODEL = "gpt-4-vision-preview" # Visionモデル
+FUSED_PLANNER_MODEL = "gpt-4-turbo" # アセット選定からシーングラフまでを1回で計画するモデル
 LEARNER_MODEL = "gpt-4-turbo" # 自己進化のための高度な推論モデル
+
+# --- アセットキャッシュ設定 ---
+# インポート済みのアセットを.blendライブラリとして保存し、次回以降はappendで読み込む
+ASSET_CACHE_ENABLED = True
+ASSET_CACHE_DIR = "cache/assets"
+ASSET_CACHE_MAX_BYTES = 2 * 1024 ** 3 # キャッシュ全体の上限 (2GB)。超過分は最終利用が古い順に削除
+ASSET_CACHE_MAX_AGE_DAYS = 30 # この日数以上使われていないエントリは無効化する
+
+# --- レンダリング品質ティア ---
+# レビュー途中のステップは配置の確認ができれば十分なため、軽量な preview ティアで描画する。
+# 採用されたシーンのみ final ティアで描画する。
+RENDER_TIERS = {
+    "preview": {
+        "engine": "BLENDER_WORKBENCH",
+        "samples": 1,
+        "resolution_x": 640,
+        "resolution_y": 360,
+    },
+    "final": {
+        "engine": "CYCLES",
+        "samples": 128,
+        "resolution_x": 1920,
+        "resolution_y": 1080,
+    },
+}
+REVIEW_RENDER_TIER = "preview" # 自己改善ループ中のレンダリングに使うティア
+FINAL_RENDER_TIER = "final" # 採用されたシーンのレンダリングに使うティア
+
+# 従来の設定名 (finalティアと同じ値)
+RENDER_ENGINE = RENDER_TIERS[FINAL_RENDER_TIER]["engine"]
+RENDER_SAMPLES = RENDER_TIERS[FINAL_RENDER_TIER]["samples"]
+RENDER_RESOLUTION_X = RENDER_TIERS[FINAL_RENDER_TIER]["resolution_x"]
+RENDER_RESOLUTION_Y = RENDER_TIERS[FINAL_RENDER_TIER]["resolution_y"]
+
+# --- 並列実行 (サブシーンのジョブスケジューラ) ---
+RENDER_MAX_PARALLEL = None # 同時に実行するBlenderプロセス数。Noneならコア数とメモリから自動決定
+RENDER_MIN_THREADS_PER_JOB = 2 # Blender1プロセスに最低限割り当てるCPUスレッド数
+RENDER_MEMORY_PER_JOB_BYTES = 4 * 1024 ** 3 # Blender1プロセスが使うメモリの見積もり
+VISION_MAX_CONCURRENCY = 4 # 同時に送信するVisionレビューの数
+VISION_REQUESTS_PER_MINUTE = 30 # Vision APIのレート制限
+SCHEDULER_REPORT_INTERVAL = 30.0 # 実行中に利用状況を表示する間隔 (秒)
+JOB_SCRATCH_DIR = "output/jobs" # ジョブごとの作業ディレクトリの置き場所
+
+# --- Blenderの実行 ---
+# Trueならランナー (utils/blender_runner.py) を読み込んだBlenderを起動したままにし、ジョブごとの起動を省く
+BLENDER_PERSISTENT_WORKERS = False
+BLENDER_TIMEOUT = 600 # 1つのジョブを待つ上限 (秒)。超えたらBlenderを終了させて失敗とする (None なら無制限)
+
+# --- ソルバーとBlender内の計測 ---
+# ランナーは処理段階ごとの所要時間とソルバーの進捗を標準出力に書き出し、blender_env が集計する
+# ホスト側で解く場合 (事前の求解) は、pipeline が同じ形式の記録を集めて同じ集計に加える
+BLENDER_SOLVER_PROGRESS_INTERVAL = 10 # ソルバー (ホスト側・Blender内) の進捗を記録する反復間隔
+# Trueならソルバーを cProfile で計測する (Blender内はジョブの作業ディレクトリ、ホスト側は JOB_SCRATCH_DIR/solver_profiles に書き出す)
+BLENDER_PROFILE_SOLVER = False
+
+# --- Visionレビューに送る画像 ---
+REVIEW_IMAGE_MAX_EDGE = 1024 # 長辺をこのピクセル数まで縮小して送る (複数視点のコンタクトシートはこの中に並ぶ)
+REVIEW_IMAGE_FORMAT = "JPEG" # "JPEG" または "WEBP"
+REVIEW_IMAGE_QUALITY = 80 # 再エンコード時の品質 (1-100)
+REVIEW_KEEP_FULL_RESOLUTION = False # Trueならレビュー用レンダリングの原寸PNGをジョブの出力フォルダに残す
+# 1回のBlender起動で複数の視点から描画し、1枚のコンタクトシートにまとめてレビューに送る
+# "hero": 決定したカメラ位置, "orbit": 注視点の周りに azimuth 度回した位置, "top": 真上からの見下ろし
+REVIEW_MULTI_VIEW = False
+REVIEW_VIEWS = [{"type": "hero"}, {"type": "orbit", "azimuth": 120}, {"type": "orbit", "azimuth": 240}, {"type": "top"}]
+REVIEW_CONTACT_SHEET_COLUMNS = 2
+
+# --- レイアウトソルバー ---
+SOLVER_MAX_ITER = 100 # 山登り法の反復回数
+SOLVER_SEED = 0 # 固定すると同じシーングラフから同じレイアウトが得られる (Noneで毎回ランダム)
+# レビュー後の再求解は前回の最適解から始め、修正された関係のアセットだけを動かす
+SOLVER_WARM_START = True
+SOLVER_WARM_START_MAX_ITER = 40 # ウォームスタート時の反復回数の上限
+SOLVER_WARM_START_PATIENCE = 15 # ウォームスタート時、この回数続けて改善しなければ打ち切る
+# 関係のグラフを密なクラスタに分けて独立に解き、クラスタをまたぐ関係だけを最後にまとめて解く
+SOLVER_MAX_CLUSTER_SIZE = 12 # 1クラスタのアセット数の上限
+SOLVER_WORKERS = max(1, (os.cpu_count() or 1) // 2) # クラスタを並列に解くプロセス数
+
+# --- LLMの計画ステージの統合 ---
+# Trueならアセットのリスト・高さ・シーン分解・サブシーンごとのシーングラフを1回の問い合わせでまとめて生成する
+# 応答は項目ごとに検証し、不正な項目だけを従来の個別の問い合わせで補う
+FUSED_PLANNING = False
+# "json_object": JSONであることだけをAPI側で保証する / "json_schema": スキーマまで保証する (Structured Outputs対応モデルのみ)
+FUSED_PLANNING_RESPONSE_FORMAT = "json_object"
+
+# --- サブシーンの段階的な構成 ---
+# Trueなら各ステップのサブシーンは前のステップまでのアセットを引き継ぎ、その配置は固定する
+# 新しいステップで解くのは追加されたアセットと、それらが関与する関係だけになる
+PROGRESSIVE_COMPOSITION = False
+
+# --- レンダリング結果のキャッシュ ---
+# レイアウト・アセット・カメラ・品質ティアが同じシーンは、Blenderを起動せずに保存済みの画像を返す
+RENDER_CACHE_ENABLED = True
+RENDER_CACHE_DIR = "cache/renders"
+RENDER_CACHE_MAX_ENTRIES = 500
+RENDER_CACHE_MAX_BYTES = 1024 ** 3 # 1GB
+
+# --- パイプライン化した自己改善ループ ---
+# レビュー待ちの間に、空いているBlenderで先回りのレンダリングを行う
+PIPELINE_SPECULATIVE_FINAL_RENDER = True # レビュー中に現在のシーンを最終品質で描画しておく (OKならそのまま採用)
+PIPELINE_SPECULATIVE_REVISION = True # 過去の修正履歴から最も起こりやすい修正を先に解いて描画しておく
+
+# --- 数値による事前検証 (Visionレビューの省略) ---
+VERIFIER_ENABLED = True
+VERIFIER_PASS_SCORE = 0.9 # 全リレーションのスコアがこの値以上で幾何チェックも問題なければ、Visionレビューを省略する
+VERIFIER_UNCERTAINTY_BAND = 0.15 # PASS_SCOREをこの幅だけ下回るまでは「不確か」、それ未満は「失敗」と判定する (いずれもレビュー対象)
+VERIFIER_FOOTPRINT_RATIO = 0.3 # アセットの設置面の半径を高さの何倍と見積もるか
+VERIFIER_OVERLAP_RATIO = 0.5 # 設置面の半径の和にこの比率を掛けた距離より近いアセット同士を「重なり」とみなす
+VERIFIER_FLOAT_TOLERANCE = 0.05 # 地面または支えるアセットの上面からこの高さ (m) 以上ずれていれば浮遊・埋没とみなす
+CAMERA_LENS_MM = 50.0 # Blenderの既定カメラの焦点距離
+CAMERA_SENSOR_MM = 36.0 # Blenderの既定カメラのセンサー幅
+
+# --- カメラの配置 (library/camera_solver.py) ---
+# Trueならレイアウトを解いた後に、アセットの配置からカメラの位置と注視点を計算する (LLMには問い合わせない)
+CAMERA_SOLVER_ENABLED = True
+# Trueなら従来のLLMによるカメラの提案も行い、撮る方向と注視するアセットのヒントとして使う
+CAMERA_LLM_HINTS = False
+CAMERA_SOLVER_AZIMUTHS = 24 # 注視点の周りに並べる方位角の数
+CAMERA_SOLVER_ELEVATIONS = [15, 25, 35, 50] # 候補の仰角 (度)
+CAMERA_SOLVER_DISTANCE_SCALES = [0.8, 1.0, 1.25] # 全アセットが画角に収まる距離に対する倍率
+CAMERA_SOLVER_TARGET_FILL = 0.5 # 全アセットが画面に占める範囲の目標値 (画面全体に対する割合)
+CAMERA_SOLVER_WEIGHTS = {"coverage": 1.0, "fill": 0.5, "occlusion": 1.0, "hint": 0.3}
+
+# --- バッチ実行 (batch.py) ---
+BATCH_MAX_WORKERS = 4 # 同時に処理するクエリ数
+BATCH_CHECKPOINT_DIR = "checkpoints" # クエリごとのステージ出力の保存先
+
+# --- 解いたレイアウトのストア ---
+# 正規化したシーングラフが一致すれば保存済みのレイアウトを再利用し、似ていればウォームスタートに使う
+LAYOUT_STORE_ENABLED = True
+LAYOUT_STORE_PATH = "cache/layout_store.json"
+LAYOUT_STORE_MAX_ENTRIES = 10000 # 上限を超えると最終利用が古い順に削除する
+LAYOUT_STORE_NEAR_MATCH_MIN_SIMILARITY = 0.5 # 部分一致とみなすトークンのJaccard係数の下限
+
+# --- 修正履歴のストアとOuter-Loopの学習 ---
+# 自己改善ループの修正はSQLiteに追記され、実行をまたいで集計される
+HISTORY_STORE_ENABLED = True
+HISTORY_STORE_PATH = "library/refinement_history.db"
+LEARNING_MAX_SKILLS_PER_RUN = 3 # 1回のOuter-Loopで改善するスキル数の上限 (= LLM呼び出し回数の上限)
+LEARNING_MAX_PARALLEL = 3 # スキル改善のLLM呼び出しを同時に送る数
+LEARNING_MIN_NEW_FIXES = 1 # 前回の学習以降にこの件数以上修正されたスキルだけを学習対象にする (増やすと偶発的な修正で学習しなくなる)
+LEARNING_FEEDBACK_EXAMPLES = 5 # 学習プロンプトに含める最近のレビューコメントの件数
@@ -0,0 +1,91 @@
+"""
+Visionレビューに送る画像ペイロードを作成するモジュール
+レンダリング結果のバイト列を受け取り、長辺を縮小した上で実際のJPEG/WebPへ再エンコードする。
+複数視点のレンダリングは、ラベル付きのタイルを並べた1枚のコンタクトシートにまとめる。
+"""
+import base64
+import io
+import math
+from dataclasses import dataclass
+from typing import List
+
+from PIL import Image, ImageDraw
+
+from . import config
+
+MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+
+
+@dataclass
+class ImagePayload:
+    """Vision LLMに送信する画像データ。"""
+    base64_data: str
+    mime_type: str
+    width: int
+    height: int
+    source_bytes: int # 元のレンダリング画像のサイズ
+    sent_bytes: int # 実際に送信するBase64文字列のサイズ
+
+    @property
+    def data_url(self) -> str:
+        return f"data:{self.mime_type};base64,{self.base64_data}"
+
+
+def build_image_payload(image_bytes: bytes, max_edge: int = None, image_format: str = None, quality: int = None) -> ImagePayload:
+    """
+    画像のバイト列を縮小・再エンコードし、Base64化したペイロードを返す。
+
+    Args:
+        image_bytes: レンダリング結果 (PNGなど、Pillowが読める形式)
+        max_edge: 長辺の最大ピクセル数。省略時は config.REVIEW_IMAGE_MAX_EDGE
+        image_format: "JPEG" / "WEBP" / "PNG"。省略時は config.REVIEW_IMAGE_FORMAT
+        quality: 再エンコードの品質。省略時は config.REVIEW_IMAGE_QUALITY
+    """
+    max_edge = max_edge or config.REVIEW_IMAGE_MAX_EDGE
+    image_format = (image_format or config.REVIEW_IMAGE_FORMAT).upper()
+    quality = quality or config.REVIEW_IMAGE_QUALITY
+
+    image = Image.open(io.BytesIO(image_bytes))
+    image.thumbnail((max_edge, max_edge), Image.LANCZOS) # アスペクト比を保ったまま縮小 (拡大はしない)
+    if image_format == "JPEG" and image.mode != "RGB":
+        image = image.convert("RGB") # JPEGはアルファチャンネルを持てない
+
+    buffer = io.BytesIO()
+    if image_format == "PNG":
+        image.save(buffer, format="PNG", optimize=True)
+    else:
+        image.save(buffer, format=image_format, quality=quality)
+
+    encoded = base64.b64encode(buffer.getvalue()).decode("utf-8")
+    return ImagePayload(
+        base64_data=encoded,
+        mime_type=MIME_TYPES[image_format],
+        width=image.width,
+        height=image.height,
+        source_bytes=len(image_bytes),
+        sent_bytes=len(encoded),
+    )
+
+
+def build_contact_sheet(images: List[bytes], labels: List[str], columns: int = 2) -> bytes:
+    """
+    複数の画像を格子状に並べ、左上に視点名を書き込んだ1枚のPNGにする。
+    タイルの大きさは最初の画像に合わせる。
+    """
+    tiles = [Image.open(io.BytesIO(image_bytes)).convert("RGB") for image_bytes in images]
+    tile_width, tile_height = tiles[0].size
+    columns = max(1, min(columns, len(tiles)))
+    rows = math.ceil(len(tiles) / columns)
+    sheet = Image.new("RGB", (tile_width * columns, tile_height * rows), "black")
+    draw = ImageDraw.Draw(sheet)
+    for i, (tile, label) in enumerate(zip(tiles, labels)):
+        x, y = (i % columns) * tile_width, (i // columns) * tile_height
+        if tile.size != (tile_width, tile_height):
+            tile = tile.resize((tile_width, tile_height), Image.LANCZOS)
+        sheet.paste(tile, (x, y))
+        draw.rectangle((x, y, x + 8 * len(label) + 12, y + 20), fill="black")
+        draw.text((x + 6, y + 4), label, fill="white")
+
+    buffer = io.BytesIO()
+    sheet.save(buffer, format="PNG")
+    return buffer.getvalue()
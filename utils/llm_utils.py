@@ -5,19 +5,24 @@ OpenAI APIとの通信やレスポンス処理を補助するモジュール
 from openai import OpenAI
 import json
 import re
-from typing import Any
+from typing import Any, Dict, Optional
 
 from .config import OPENAI_API_KEY
 
 # クライアントを初期化
 client = OpenAI(api_key=OPENAI_API_KEY)
 
-def call_llm(model: str, prompt: str, is_json: bool = True) -> Any:
-    """汎用的なLLM呼び出し関数"""
+def call_llm(model: str, prompt: str, is_json: bool = True, response_format: Optional[Dict[str, Any]] = None) -> Any:
+    """
+    汎用的なLLM呼び出し関数
+    response_format を渡すと、応答の形式 (JSONオブジェクト、またはJSONスキーマ) をAPI側で制約する。
+    """
     try:
+        options = {"response_format": response_format} if response_format else {}
         response = client.chat.completions.create(
             model=model,
-            messages=[{"role": "user", "content": prompt}]
+            messages=[{"role": "user", "content": prompt}],
+            **options
         )
         content = response.choices[0].message.content
         return parse_llm_response_to_json(content) if is_json else content
@@ -25,15 +30,15 @@ def call_llm(model: str, prompt: str, is_json: bool = True) -> Any:
         print(f"Error calling LLM: {e}")
         return {} if is_json else ""
 
-def call_vision_llm(model: str, prompt: str, base64_image: str) -> str:
-    """Visionモデルを呼び出す関数"""
+def call_vision_llm(model: str, prompt: str, base64_image: str, mime_type: str = "image/png") -> str:
+    """Visionモデルを呼び出す関数。mime_type は base64_image の実際の形式に合わせる。"""
     try:
         response = client.chat.completions.create(
             model=model,
             messages=[
                 {"role": "user", "content": [
                     {"type": "text", "text": prompt},
-                    {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}}
+                    {"type": "image_url", "image_url": {"url": f"data:{mime_type};base64,{base64_image}"}}
                 ]}
             ],
             max_tokens=4096
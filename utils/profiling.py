@@ -0,0 +1,94 @@
+"""
+Blender内で実行されるランナー (utils/blender_runner.py) の計測記録をホスト側に渡すためのモジュール
+ランナーは各処理段階の所要時間とソルバーの進捗を、接頭辞付きのJSON行として標準出力に書き出す。
+blender_env は捕捉した標準出力からこの行だけを取り出して集計する。
+ホスト側でソルバーを実行する場合も、同じ形式の記録を集めて同じ集計に加える (run_measured)。
+Blender内からもインポートされるため、標準ライブラリだけに依存する。
+"""
+import cProfile
+import json
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Blenderのログと区別するための接頭辞
+METRIC_PREFIX = "@@SCENECRAFT_METRIC "
+
+def emit(record: Dict[str, Any]):
+    """計測記録を1行のJSONとして書き出す。"""
+    print(METRIC_PREFIX + json.dumps(record, ensure_ascii=False), flush=True)
+
+class StageClock:
+    """前回の lap からの経過時間を、処理段階の所要時間として記録する。"""
+    def __init__(self):
+        self._last = time.perf_counter()
+
+    def lap(self, stage: str):
+        now = time.perf_counter()
+        emit({"type": "stage", "name": stage, "seconds": round(now - self._last, 4)})
+        self._last = now
+
+def solver_progress_reporter(sink: Callable[[Dict[str, Any]], None] = emit) -> Callable[[int, float], None]:
+    """constraint_based_search の progress に渡す関数を返す。反復数・スコア・反復速度を sink に記録する。"""
+    started = time.perf_counter()
+
+    def report(iteration: int, score: float):
+        elapsed = time.perf_counter() - started
+        sink({"type": "solver_progress", "iteration": iteration, "score": round(float(score), 6),
+              "iterations_per_sec": round(iteration / elapsed, 1) if elapsed > 0 else None})
+    return report
+
+def run_profiled(fn: Callable[[], Any], profile_path: Optional[str], sink: Callable[[Dict[str, Any]], None] = emit) -> Any:
+    """profile_path が指定されていれば fn をcProfileで計測し、結果をそのパスに書き出す。"""
+    if not profile_path:
+        return fn()
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        return fn()
+    finally:
+        profiler.disable()
+        profiler.dump_stats(profile_path)
+        sink({"type": "profile", "path": profile_path})
+
+def run_measured(fn: Callable[[Callable[[int, float], None]], Any], stage: str,
+                 profile_path: Optional[str] = None) -> Tuple[Any, Dict[str, Any]]:
+    """
+    ホスト側で fn を実行し、その結果と parse_metrics と同じ形式の計測記録を返す。
+    fn には進捗を記録する関数 (constraint_based_search の progress) を渡し、所要時間は stage の段階として記録する。
+    """
+    records: List[Dict[str, Any]] = []
+    started = time.perf_counter()
+    result = run_profiled(lambda: fn(solver_progress_reporter(records.append)), profile_path, records.append)
+    records.append({"type": "stage", "name": stage, "seconds": round(time.perf_counter() - started, 4)})
+    return result, aggregate_metrics(records)
+
+def aggregate_metrics(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    計測記録をまとめる。
+
+    Returns:
+        "stages": 処理段階名 -> 所要時間 (秒)
+        "solver_progress": ソルバーの進捗記録のリスト (反復数・スコア・反復速度)
+        "profile_path": cProfileの結果を書き出したパス (計測していなければ None)
+    """
+    metrics = {"stages": {}, "solver_progress": [], "profile_path": None}
+    for record in records:
+        if record.get("type") == "stage":
+            metrics["stages"][record["name"]] = metrics["stages"].get(record["name"], 0.0) + record["seconds"]
+        elif record.get("type") == "solver_progress":
+            metrics["solver_progress"].append({k: v for k, v in record.items() if k != "type"})
+        elif record.get("type") == "profile":
+            metrics["profile_path"] = record["path"]
+    return metrics
+
+def parse_metrics(stdout: str) -> Dict[str, Any]:
+    """Blenderの標準出力から計測記録を取り出し、aggregate_metrics でまとめる。"""
+    records = []
+    for line in (stdout or "").splitlines():
+        if not line.startswith(METRIC_PREFIX):
+            continue
+        try:
+            records.append(json.loads(line[len(METRIC_PREFIX):]))
+        except json.JSONDecodeError:
+            continue
+    return aggregate_metrics(records)
@@ -0,0 +1,148 @@
+"""
+レンダリング結果をシーン内容のハッシュで再利用するキャッシュ
+最終レイアウト・アセットファイルのダイジェスト・カメラ設定・品質ティアが
+すべて一致するシーンは同じ画像になるため、Blenderを起動せずに保存済みの画像を返す。
+"""
+import atexit
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from library.layout import Layout
+from . import asset_cache, config
+
+INDEX_FILENAME = "index.json"
+
+
+def _rounded(values, digits: int = 6):
+    return [round(float(v), digits) for v in values]
+
+
+def render_cache_key(layout: Dict[str, Layout], assets_info: Dict[str, Dict], camera_settings: Dict[str, Any], render_tier: str,
+                     views: Optional[List[Dict[str, Any]]] = None) -> str:
+    """シーンの内容から、レンダリング結果を一意に決めるキーを計算する。views は複数視点で描画する場合の視点のリスト。"""
+    assets = {}
+    for name, info in assets_info.items():
+        path = info.get("file_path")
+        assets[name] = {
+            "digest": asset_cache.compute_file_digest(path) if path and os.path.exists(path) else None,
+            "height": info.get("height", 1.0),
+        }
+    payload = {
+        "layout": {name: {"location": _rounded(l.location), "orientation": _rounded(l.orientation), "scale": _rounded(l.scale)}
+                   for name, l in layout.items()},
+        "assets": assets,
+        "camera": camera_settings,
+        "tier": render_tier,
+        "render_settings": config.RENDER_TIERS[render_tier],
+    }
+    if views:
+        payload["views"] = views
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class RenderCache:
+    """
+    レンダリング画像をディスクに保存するLRUキャッシュ。
+    エントリ数と合計サイズの上限を超えると、最終利用が古い順に削除する。
+    """
+    def __init__(self, cache_dir: str = None, max_entries: int = None, max_bytes: int = None):
+        self.cache_dir = cache_dir or config.RENDER_CACHE_DIR
+        self.max_entries = max_entries or config.RENDER_CACHE_MAX_ENTRIES
+        self.max_bytes = max_bytes or config.RENDER_CACHE_MAX_BYTES
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._index = self._load_index()
+        self._dirty = False # ヒット時の最終利用時刻の更新は、put / 終了時にまとめて書き出す
+        atexit.register(self.flush)
+
+    def _index_path(self) -> str:
+        return os.path.join(self.cache_dir, INDEX_FILENAME)
+
+    def _image_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.png")
+
+    def _load_index(self) -> Dict[str, Dict]:
+        try:
+            with open(self._index_path(), "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+        # 画像ファイルが消えているエントリは捨てる
+        return {key: entry for key, entry in index.items() if os.path.exists(self._image_path(key))}
+
+    def _save_index(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = self._index_path() + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._index, f, indent=4)
+        os.replace(tmp_path, self._index_path())
+        self._dirty = False
+
+    def flush(self):
+        """未保存の変更があればインデックスを書き出す。"""
+        with self._lock:
+            if self._dirty:
+                self._save_index()
+
+    def _evict(self):
+        total_size = sum(entry["size"] for entry in self._index.values())
+        for key, entry in sorted(self._index.items(), key=lambda item: item[1]["last_used"]):
+            if len(self._index) <= self.max_entries and total_size <= self.max_bytes:
+                break
+            total_size -= entry["size"]
+            del self._index[key]
+            if os.path.exists(self._image_path(key)):
+                os.remove(self._image_path(key))
+
+    def contains(self, key: str) -> bool:
+        """ヒット率の集計に影響を与えずに、キーが保存済みかどうかを調べる。"""
+        with self._lock:
+            return config.RENDER_CACHE_ENABLED and key in self._index
+
+    def get(self, key: str) -> Optional[bytes]:
+        if not config.RENDER_CACHE_ENABLED:
+            return None
+        with self._lock:
+            if key not in self._index:
+                self.misses += 1
+                return None
+            try:
+                with open(self._image_path(key), "rb") as f:
+                    image_bytes = f.read()
+            except FileNotFoundError:
+                del self._index[key]
+                self._dirty = True
+                self.misses += 1
+                return None
+            self._index[key]["last_used"] = time.time()
+            self._dirty = True
+            self.hits += 1
+            return image_bytes
+
+    def put(self, key: str, image_bytes: bytes):
+        if not config.RENDER_CACHE_ENABLED or not image_bytes:
+            return
+        with self._lock:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(self._image_path(key), "wb") as f:
+                f.write(image_bytes)
+            self._index[key] = {"size": len(image_bytes), "last_used": time.time()}
+            self._evict()
+            self._save_index()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "entries": len(self._index),
+                "bytes": sum(entry["size"] for entry in self._index.values()),
+            }
@@ -0,0 +1,214 @@
+"""
+サブシーンの自己改善ループを並列に実行するジョブスケジューラ
+各サブシーンのループは互いに独立しているため、ジョブとして同時に走らせる。
+ただしBlenderのレンダリングはCPUコア数とメモリで、Visionレビューは
+LLMのレート制限で上限を設け、それぞれの使用率と待ち行列を計測する。
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from . import config
+
+
+def _available_memory_bytes() -> Optional[int]:
+    """利用可能な物理メモリ量を返す。取得できない環境では None。"""
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def default_render_slots() -> int:
+    """CPUコア数と空きメモリから、同時に実行できるBlenderプロセス数を決める。"""
+    if config.RENDER_MAX_PARALLEL:
+        return config.RENDER_MAX_PARALLEL
+    cores = os.cpu_count() or 1
+    slots = max(1, cores // config.RENDER_MIN_THREADS_PER_JOB)
+    memory = _available_memory_bytes()
+    if memory is not None:
+        slots = min(slots, max(1, memory // config.RENDER_MEMORY_PER_JOB_BYTES))
+    return slots
+
+
+class ResourcePool:
+    """
+    同時利用数に上限のある共有リソース。
+    rate_per_minute を指定すると、取得の間隔も一定以上に保つ（APIのレート制限用）。
+    """
+    def __init__(self, name: str, capacity: int, rate_per_minute: Optional[float] = None):
+        self.name = name
+        self.capacity = capacity
+        self._semaphore = threading.BoundedSemaphore(capacity)
+        self._min_interval = 60.0 / rate_per_minute if rate_per_minute else 0.0
+        self._lock = threading.Lock()
+        self._next_start = 0.0
+        self._in_use = 0
+        self._waiting = 0
+        self._busy_seconds = 0.0
+        self._acquisitions = 0
+
+    @contextmanager
+    def acquire(self):
+        with self._lock:
+            self._waiting += 1
+        self._semaphore.acquire()
+        try:
+            if self._min_interval:
+                with self._lock:
+                    start_at = max(time.monotonic(), self._next_start)
+                    self._next_start = start_at + self._min_interval
+                time.sleep(max(0.0, start_at - time.monotonic()))
+            with self._lock:
+                self._waiting -= 1
+                self._in_use += 1
+                self._acquisitions += 1
+            started = time.monotonic()
+            try:
+                yield
+            finally:
+                with self._lock:
+                    self._in_use -= 1
+                    self._busy_seconds += time.monotonic() - started
+        finally:
+            self._semaphore.release()
+
+    @contextmanager
+    def try_acquire(self):
+        """
+        空きがある場合のみ即座に確保する。確保できたかどうかを返す。
+        投機的な処理が本来のジョブを待たせないようにするために使う。
+        """
+        if not self._semaphore.acquire(blocking=False):
+            yield False
+            return
+        with self._lock:
+            self._in_use += 1
+            self._acquisitions += 1
+        started = time.monotonic()
+        try:
+            yield True
+        finally:
+            with self._lock:
+                self._in_use -= 1
+                self._busy_seconds += time.monotonic() - started
+            self._semaphore.release()
+
+    def stats(self, elapsed: float) -> Dict[str, Any]:
+        with self._lock:
+            utilisation = self._busy_seconds / (self.capacity * elapsed) if elapsed > 0 else 0.0
+            return {
+                "capacity": self.capacity,
+                "in_use": self._in_use,
+                "waiting": self._waiting,
+                "acquisitions": self._acquisitions,
+                "busy_seconds": round(self._busy_seconds, 2),
+                "utilisation": round(utilisation, 3),
+            }
+
+
+@dataclass
+class JobContext:
+    """ジョブごとに渡される実行コンテキスト。出力や一時ファイルは scratch_dir 以下に置く。"""
+    job_id: str
+    scratch_dir: str
+    scheduler: "JobScheduler"
+
+    def output_path(self, filename: str) -> str:
+        return os.path.join(self.scratch_dir, filename)
+
+    def render(self):
+        """Blenderのレンダースロットを確保するコンテキストマネージャ。"""
+        return self.scheduler.render_pool.acquire()
+
+    def review(self):
+        """Visionレビューの実行枠を確保するコンテキストマネージャ。"""
+        return self.scheduler.vision_pool.acquire()
+
+
+class JobScheduler:
+    """独立したジョブ群を並列に実行し、レンダーとVisionの各リソースの利用状況を報告する。"""
+    def __init__(self, render_slots: Optional[int] = None, vision_slots: Optional[int] = None,
+                 vision_requests_per_minute: Optional[float] = None, scratch_root: Optional[str] = None):
+        self.render_pool = ResourcePool("render", render_slots or default_render_slots())
+        self.vision_pool = ResourcePool(
+            "vision",
+            vision_slots or config.VISION_MAX_CONCURRENCY,
+            vision_requests_per_minute or config.VISION_REQUESTS_PER_MINUTE,
+        )
+        self.scratch_root = scratch_root or config.JOB_SCRATCH_DIR
+        # 同時に走るBlenderがコアを奪い合わないよう、1プロセスあたりのスレッド数を割り当てる
+        self.render_threads = max(1, (os.cpu_count() or 1) // self.render_pool.capacity)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self._started_at = time.monotonic()
+
+    def _run_job(self, job_id: str, fn: Callable[[JobContext], Any]) -> Any:
+        with self._lock:
+            self._pending -= 1
+            self._running += 1
+        scratch_dir = os.path.join(self.scratch_root, job_id)
+        os.makedirs(scratch_dir, exist_ok=True)
+        try:
+            return fn(JobContext(job_id, scratch_dir, self))
+        finally:
+            with self._lock:
+                self._running -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        elapsed = time.monotonic() - self._started_at
+        render = self.render_pool.stats(elapsed)
+        vision = self.vision_pool.stats(elapsed)
+        with self._lock:
+            return {
+                "elapsed_seconds": round(elapsed, 2),
+                "jobs_pending": self._pending,
+                "jobs_running": self._running,
+                "queue_depth": self._pending + render["waiting"] + vision["waiting"],
+                "render": render,
+                "vision": vision,
+            }
+
+    def report(self):
+        stats = self.stats()
+        print(f"  [Scheduler] 📊 経過 {stats['elapsed_seconds']}s | 待ち行列 {stats['queue_depth']} "
+              f"(未開始 {stats['jobs_pending']}, 実行中 {stats['jobs_running']})")
+        for name in ("render", "vision"):
+            pool = stats[name]
+            print(f"    - {name}: 使用中 {pool['in_use']}/{pool['capacity']}, 待機 {pool['waiting']}, "
+                  f"使用率 {pool['utilisation'] * 100:.0f}%")
+
+    def run(self, jobs: List[Tuple[str, Callable[[JobContext], Any]]], monitor: bool = True) -> List[Any]:
+        """
+        (job_id, fn) のリストを並列に実行し、入力と同じ順序で結果を返す。
+        複数のスレッドから同時に呼んでも、リソースの上限はスケジューラ全体で共有される。
+        monitor が True の間は config.SCHEDULER_REPORT_INTERVAL 秒ごとに利用状況を表示する。
+        """
+        if not jobs:
+            return []
+        with self._lock:
+            self._pending += len(jobs)
+
+        finished = threading.Event()
+
+        def report_periodically():
+            while not finished.wait(config.SCHEDULER_REPORT_INTERVAL):
+                self.report()
+
+        monitor_thread = threading.Thread(target=report_periodically, daemon=True)
+        if monitor:
+            monitor_thread.start()
+        try:
+            with ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+                futures = [executor.submit(self._run_job, job_id, fn) for job_id, fn in jobs]
+                return [future.result() for future in futures]
+        finally:
+            finished.set()
+            if monitor:
+                monitor_thread.join()
+                self.report()